@@ -1,19 +1,42 @@
 
 from flask import Flask, request, jsonify
 import os
-from src.utils.chatbot_utils import BuildChatbot
-from src.utils.logger import logging
+import time
+from contextlib import nullcontext
+from src.utils.chatbot_utils import BuildChatbot, ServingRelease
+from src.utils.admission import INTERACTIVE, Overloaded, request_priority, get_admission_controller
+from src.utils.resilience import DeadlineConfig, DeadlineExceeded, CircuitOpen, request_deadline, breaker_states
+from src.utils.profiling import is_admin, list_profiles, profile_dir, profile_request, should_profile
+from src.utils.logger import logging, request_context, payload, safe_request_id, stage_timings, NonBlockingQueueHandler
+from src.utils.traffic_capture import get_traffic_recorder
+from src.utils.micro_batching import batching_stats
+from src.utils.hot_reload import ChainReloader, ReleaseConfig
+from src.utils.kafka_bridge import get_kafka_bridge
 from src.utils.exception import Custom_exception
 from flask_cors import CORS
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, send_from_directory
 
 
 # initializing flask app
 app = Flask(__name__)
 
-# setting up the chatbot(retriever)
+# setting up the chatbot(retriever), catalog aggregates and recommendation tables. With hot reload
+# they follow the published release pointer and are swapped together between requests,
+# sessions in utils.store are kept
 utils = BuildChatbot()
-chatbot = utils.initialize_chatbot()
+
+# with CHAT_BACKEND=kafka the LLM chain runs in separate workers and this tier only relays
+# chat, the release then only carries what /recommend serves
+kafka_bridge = get_kafka_bridge()
+build_release = utils.build_release if kafka_bridge is None else lambda release: (ServingRelease(release), None)
+chain_reloader = ChainReloader(build_release) if ReleaseConfig.enabled else None
+serving = None if chain_reloader else build_release(None)[0]
+
+# end to end budget for a /chat request, split into per-stage budgets inside the chain
+deadline_config = DeadlineConfig()
+
+# anonymized /chat records for load replay, only when TRAFFIC_CAPTURE=true
+traffic_recorder = get_traffic_recorder()
 
 
 app = Flask(__name__)
@@ -24,31 +47,145 @@ def home():
     return render_template('home_page.html')
 
 
+def serving_release():
+    # a request keeps the release it started on even if a reload swaps in a new one meanwhile
+    return chain_reloader.use() if chain_reloader else nullcontext(serving)
+
+
+def optional_float(value, name: str):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
-    data = request.json
-    query = data.get("query","")
-    response = f"[AI Engine] Generated recommendation for: {query}"
-    return jsonify({"ai_result": response})
+    try:
+        data = request.get_json(silent=True) or {}
+        query = data.get("query", "")
+
+        if not (query or data.get("product_id") or data.get("product_name")):
+            return jsonify({"error": "one of query, product_id or product_name is required"}), 400
+
+        try:
+            k = int(data.get("k", 5))
+            if not 1 <= k <= 50:
+                raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({"error": "k must be an integer between 1 and 50"}), 400
+        try:
+            min_price = optional_float(data.get("min_price"), "min_price")
+            max_price = optional_float(data.get("max_price"), "max_price")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        with serving_release() as current:
+            current_recommender = current.recommender() if current is not None else None
+            if current_recommender is None:
+                logging.error("Recommendation tables are not built.")
+                return jsonify({"error": "recommendations not available"}), 503
+
+            result = current_recommender.recommend(query=query,
+                                                   product_id=data.get("product_id"),
+                                                   product_name=data.get("product_name"),
+                                                   k=k,
+                                                   min_price=min_price,
+                                                   max_price=max_price,
+                                                   category=data.get("category"))
+
+        source = result["source"]["name"] if result["source"] else query
+        lines = [f"Recommendations for: {source}"]
+        lines += [f"{i}. {p['brand']} - {p['name']}" for i, p in enumerate(result["products"], start=1)]
+
+        return jsonify({"ai_result": "\n".join(lines), **result})
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except (DeadlineExceeded, CircuitOpen) as e:
+        logging.error(f"Recommendation query could not be embedded in time: {str(e)}")
+        return jsonify({"error": "service temporarily unavailable, please retry"}), 503
+    except Exception as e:
+        logging.exception("Error in /recommend endpoint")
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/chat', methods=["GET", "POST"])
 def chat():
+    request_id = safe_request_id(request.headers.get("X-Request-ID"))
+    data = request.get_json(silent=True) or {}
+    question = data.get('input', '')
+    session_id = data.get('session_id') or data.get('sessionId') or "chat_1"
+
+    started, started_at = time.perf_counter(), time.time()
+    with request_context(request_id):
+        body, status = handle_chat(request_id, question, session_id)
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        # one structured line per request, stage timings come from call_upstream
+        logging.info("chat request completed", extra={"endpoint": "chat",
+                                                      "status": status,
+                                                      "duration_ms": duration_ms,
+                                                      "stage_timings": stage_timings()})
+        if traffic_recorder is not None:
+            traffic_recorder.record(session_id, question, status, duration_ms, stage_timings(),
+                                    started=started_at)
+    return body, status, {"X-Request-ID": request_id}
+
+
+def handle_chat(request_id: str, question: str, session_id: str):
     try:
-        data = request.get_json() or {}
-        question = data.get('input', '')
-        logging.info(f"User Input: {question}")
-
-        if chatbot is None:
-            logging.error("Chatbot is not initialized.")
-            return jsonify({"error": "chatbot not initialized"}), 500
-
-        config = {"configurable": {"session_id": "chat_1"}}
-
-        response = chatbot.invoke({"input": question}, config=config)
+        logging.info(f"User Input: {payload(question)}")
+
+        if kafka_bridge is not None:
+            # the worker owns the session history, catalog aggregates included
+            reply = kafka_bridge.ask(session_id, question, requestId=request_id)
+            if reply.get("error"):
+                logging.error(f"Chat worker failed ({reply.get('errorType')}): {reply['error']}")
+                if reply.get("errorType") == "overloaded":
+                    return jsonify({"error": "service overloaded, please retry"}), 503
+                if reply.get("errorType") in ("deadline", "unavailable"):
+                    return jsonify({"error": "service temporarily unavailable, please retry"}), 503
+                return jsonify({"error": reply["error"]}), 500
+            logging.info(f"Chatbot Response: {payload(reply.get('answer'))}")
+            return jsonify({"response": reply.get("answer"), "degraded": reply.get("degraded", False)}), 200
+
+        config = {"configurable": {"session_id": session_id}}
+        inputs = {"input": question}
+
+        with serving_release() as current:
+            if current is None or current.chatbot is None:
+                logging.error("Chatbot is not initialized.")
+                return jsonify({"error": "chatbot not initialized"}), 500
+
+            if current.catalog_aggregates is not None:
+                history = utils.get_session_id(config["configurable"]["session_id"])
+                # only a plain superlative opening a conversation is answered from the precomputed lists,
+                # follow-ups and qualified questions go to the LLM with the ranking as extra context
+                aggregate_answer = None if history.messages else current.catalog_aggregates.answer(question)
+                if aggregate_answer is not None:
+                    logging.info("Answered from catalog aggregates")
+                    # kept in the history so follow-ups ("which of these ...") can refer to the list
+                    history.add_user_message(question)
+                    history.add_ai_message(aggregate_answer)
+                    return jsonify({"response": aggregate_answer}), 200
+                catalog_facts = current.catalog_aggregates.context(question)
+                if catalog_facts is not None:
+                    inputs["catalog_facts"] = catalog_facts
+
+            with request_deadline(deadline_config.request_seconds), request_priority(INTERACTIVE), \
+                    profile_request(request_id, should_profile(request.headers)):
+                response = current.chatbot.invoke(inputs, config=config)
         answer = response.get('answer') if isinstance(response, dict) else str(response)
-
-        logging.info(f"Chatbot Response: {answer}")
-        return jsonify({"response": answer})
+        degraded = response.get('degraded', False) if isinstance(response, dict) else False
+
+        logging.info(f"Chatbot Response: {payload(answer)}")
+        return jsonify({"response": answer, "degraded": degraded}), 200
+    except Overloaded as e:
+        logging.error(f"Chat request shed by admission control: {str(e)}")
+        return jsonify({"error": "service overloaded, please retry"}), 503
+    except (DeadlineExceeded, CircuitOpen) as e:
+        logging.error(f"Chat request could not be served in time: {str(e)}")
+        return jsonify({"error": "service temporarily unavailable, please retry"}), 503
     except Exception as e:
         logging.exception("Error in /chat endpoint")
         return jsonify({"error": str(e)}), 500
@@ -59,6 +196,50 @@ def health():
     return jsonify({"status": "ok"})
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    stats = {}
+    if utils.single_flight is not None:
+        stats["coalescing"] = utils.single_flight.stats()
+    stats["circuit_breakers"] = breaker_states()
+    stats["llm_admission"] = get_admission_controller().stats()
+    stats["log_records_dropped"] = NonBlockingQueueHandler.dropped
+    stats["micro_batching"] = batching_stats()
+    if chain_reloader is not None:
+        stats["release"] = chain_reloader.stats()
+    if kafka_bridge is not None:
+        stats["kafka_bridge"] = kafka_bridge.stats()
+    if traffic_recorder is not None:
+        stats["traffic_capture"] = traffic_recorder.stats()
+    return jsonify(stats)
+
+
+
+@app.route('/debug/reload', methods=['POST'])
+def debug_reload():
+    # rebuilds from the release pointer now instead of at the next poll
+    if chain_reloader is None or not is_admin(request.headers):
+        return jsonify({"error": "not found"}), 404
+    swapped = chain_reloader.reload(force=request.args.get("force") == "true")
+    return jsonify({"swapped": swapped, **chain_reloader.stats()})
+
+
+
+@app.route('/debug/profiles', methods=['GET'])
+def debug_profiles():
+    # hidden unless PROFILING_ADMIN_TOKEN is set and sent back in X-Admin-Token
+    if not is_admin(request.headers):
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"profiles": list_profiles()})
+
+
+@app.route('/debug/profiles/<path:file_name>', methods=['GET'])
+def debug_profile(file_name):
+    if not is_admin(request.headers):
+        return jsonify({"error": "not found"}), 404
+    return send_from_directory(profile_dir(), file_name, mimetype="application/json")
+
+
 
 if __name__ == "__main__":
     # for local development 
@@ -0,0 +1,389 @@
+import os
+import sys
+import json
+import time
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.components.catalog_store import CompactCatalog
+from src.utils.micro_batching import MicroBatcher, QueryBatchingConfig
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IVFQuantizedIndex:
+    """
+    Inverted file (IVF) index over cosine similarity.
+
+    Vectors are clustered with spherical k-means and stored per cluster as int8
+    codes (symmetric per-dimension scalar quantization). A query scans the
+    `nprobe` closest clusters on the int8 codes and rescores the best
+    `rescore_k` candidates exactly against the float32 vectors, which are kept
+    on disk and memory mapped so only the int8 codes stay resident.
+    """
+
+    def __init__(self, nlist: int = None, nprobe: int = 16, rescore_k: int = 100,
+                 kmeans_iters: int = 20, train_size: int = 100_000, seed: int = 42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rescore_k = rescore_k
+        self.kmeans_iters = kmeans_iters
+        self.train_size = train_size
+        self.seed = seed
+
+        self.centroids = None   # (nlist, dim) float32
+        self.scales = None      # (dim,) float32, int8 code * scale ~ original value
+        self.codes = None       # (n, dim) int8, rows grouped by cluster
+        self.ids = None         # (n,) int64, row position -> original vector id
+        self.offsets = None     # (nlist + 1,) int64, cluster c owns rows offsets[c]:offsets[c+1]
+        self.vectors = None     # (n, dim) float32, same order as codes, memory mapped after load
+        self.recall = {}
+
+
+    @property
+    def size(self) -> int:
+        return 0 if self.ids is None else len(self.ids)
+
+
+    def _assign(self, vectors: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            chunk = vectors[start:start + batch_size]
+            labels[start:start + batch_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+
+    def _train(self, vectors: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        sample = vectors
+        if len(vectors) > self.train_size:
+            sample = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+
+        self.centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            labels = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.nlist)
+
+            # re-seed empty clusters with random points so every list stays usable
+            empty = np.where(counts == 0)[0]
+            if len(empty):
+                sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+            self.centroids = _normalize(sums)
+
+
+    def build(self, vectors: np.ndarray):
+        vectors = _normalize(vectors)
+        n, _ = vectors.shape
+        if self.nlist is None:
+            self.nlist = max(1, int(4 * np.sqrt(n)))
+        self.nlist = min(self.nlist, n)
+        self.nprobe = min(self.nprobe, self.nlist)
+
+        self._train(vectors)
+        labels = self._assign(vectors)
+
+        order = np.argsort(labels, kind="stable")
+        self.ids = order.astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.nlist))]).astype(np.int64)
+        self.vectors = vectors[order]
+
+        self.scales = np.maximum(np.abs(vectors).max(axis=0), 1e-12).astype(np.float32) / 127.0
+        self.codes = np.clip(np.round(self.vectors / self.scales), -127, 127).astype(np.int8)
+        return self
+
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, cosine similarities) of the k nearest vectors, best first."""
+        query = _normalize(query).reshape(-1)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # approximate scores on int8 codes: fold the per-dimension scale into the query
+        approx = self.codes[rows].astype(np.float32) @ (query * self.scales)
+
+        rescore_k = min(max(self.rescore_k, k), len(rows))
+        top = rows[np.argpartition(-approx, rescore_k - 1)[:rescore_k]]
+        top.sort()  # sequential reads from the memory mapped float32 vectors
+
+        exact = np.asarray(self.vectors[top]) @ query
+        best = np.argsort(-exact)[:k]
+        return self.ids[top[best]], exact[best]
+
+
+    def search_batch(self, queries: np.ndarray, k: int = 5, nprobe: int = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        `search` for several queries at once. Every probed cluster is decoded
+        from int8 once and scored against all the queries probing it in one
+        matrix product, instead of once per query.
+        """
+        queries = _normalize(queries).reshape(len(queries), -1)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        scaled = queries * self.scales
+        candidates = [[] for _ in queries]
+        candidate_scores = [[] for _ in queries]
+
+        # (query, cluster) pairs grouped by cluster
+        clusters = probes.reshape(-1)
+        order = np.argsort(clusters, kind="stable")
+        query_ids, clusters = np.repeat(np.arange(len(queries)), nprobe)[order], clusters[order]
+
+        for group in np.split(np.arange(len(clusters)), np.flatnonzero(np.diff(clusters)) + 1):
+            c = clusters[group[0]]
+            start, end = self.offsets[c], self.offsets[c + 1]
+            if start == end:
+                continue
+            members = query_ids[group]
+            approx = self.codes[start:end].astype(np.float32) @ scaled[members].T
+            rows = np.arange(start, end)
+            for column, j in enumerate(members):
+                candidates[j].append(rows)
+                candidate_scores[j].append(approx[:, column])
+
+        results = []
+        for j, query in enumerate(queries):
+            if not candidates[j]:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            rows, approx = np.concatenate(candidates[j]), np.concatenate(candidate_scores[j])
+
+            rescore_k = min(max(self.rescore_k, k), len(rows))
+            top = rows[np.argpartition(-approx, rescore_k - 1)[:rescore_k]]
+            top.sort()
+
+            exact = np.asarray(self.vectors[top]) @ query
+            best = np.argsort(-exact)[:k]
+            results.append((self.ids[top[best]], exact[best]))
+        return results
+
+
+    def measure_recall(self, vectors: np.ndarray, k: int = 5, num_queries: int = 200, noise: float = 0.5) -> dict:
+        """
+        Recall@k of the index against exact brute force search. Queries are
+        stored vectors with gaussian noise of norm ~`noise` added, so a query
+        does not trivially find itself and the recall reflects unseen queries.
+        """
+        vectors = _normalize(vectors)
+        rng = np.random.default_rng(self.seed)
+        picked = rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+        queries = _normalize(vectors[picked] + rng.normal(scale=noise / np.sqrt(vectors.shape[1]),
+                                                           size=(len(picked), vectors.shape[1])))
+
+        hits, latencies = 0, []
+        for q in queries:
+            exact = np.argpartition(-(vectors @ q), min(k, len(vectors) - 1))[:k]
+            start = time.perf_counter()
+            approx, _ = self.search(q, k=k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(set(exact.tolist()) & set(approx.tolist()))
+
+        self.recall = {
+            f"recall@{k}": round(hits / (len(queries) * k), 4),
+            "avg_search_ms": round(1000 * float(np.mean(latencies)), 3),
+            "p99_search_ms": round(1000 * float(np.percentile(latencies, 99)), 3),
+            "num_queries": int(len(queries)),
+        }
+        return self.recall
+
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """
+        Append vectors under the given ids: each goes to its nearest centroid and
+        is quantized with the trained scales (values outside the trained range
+        are clipped). Centroids and scales are not retrained, so large additions
+        still call for a rebuild. Rows are regrouped by cluster into new arrays,
+        which loads the memory mapped float32 vectors, and are not swapped in
+        atomically: do not add while the index serves searches.
+        """
+        vectors = _normalize(vectors).reshape(len(ids), -1)
+        labels = np.concatenate([np.repeat(np.arange(self.nlist), np.diff(self.offsets)), self._assign(vectors)])
+        order = np.argsort(labels, kind="stable")
+
+        codes = np.clip(np.round(vectors / self.scales), -127, 127).astype(np.int8)
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.vectors = np.concatenate([np.asarray(self.vectors, dtype=np.float32), vectors])[order]
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.nlist))]).astype(np.int64)
+        return self
+
+
+    def memory_bytes(self) -> dict:
+        return {"int8_codes": int(self.codes.nbytes),
+                "float32_equivalent": int(self.size * self.codes.shape[1] * 4)}
+
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "scales.npy"), self.scales)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+
+        with open(os.path.join(path, "index_meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"nlist": self.nlist,
+                       "nprobe": self.nprobe,
+                       "rescore_k": self.rescore_k,
+                       "size": self.size,
+                       "dimension": int(self.codes.shape[1]),
+                       "recall": self.recall}, f, indent=2)
+
+
+    @classmethod
+    def load(cls, path: str) -> "IVFQuantizedIndex":
+        with open(os.path.join(path, "index_meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        index = cls(nlist=meta["nlist"], nprobe=meta["nprobe"], rescore_k=meta["rescore_k"])
+        index.centroids = np.load(os.path.join(path, "centroids.npy"))
+        index.scales = np.load(os.path.join(path, "scales.npy"))
+        index.codes = np.load(os.path.join(path, "codes.npy"))
+        index.ids = np.load(os.path.join(path, "ids.npy"))
+        index.offsets = np.load(os.path.join(path, "offsets.npy"))
+        # full precision vectors are only touched for rescoring, leave them on disk
+        index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        index.recall = meta.get("recall", {})
+        return index
+
+
+
+class LocalANNVectorStore(VectorStore):
+    """
+    LangChain vector store backed by a saved IVFQuantizedIndex, usable as a
+    drop-in replacement for the Pinecone store in the retrieval chain. Product
+    texts are kept in a CompactCatalog, Documents are only built for the hits.
+    """
+
+    def __init__(self, index: IVFQuantizedIndex, catalog: Union[CompactCatalog, List[Document]], embedding: Embeddings):
+        self.index = index
+        self.catalog = catalog if isinstance(catalog, CompactCatalog) else CompactCatalog.from_documents(catalog)
+        self._embedding = embedding
+        self.batcher = None
+
+
+    def enable_batching(self, config: QueryBatchingConfig = None, name: str = "ann-search"):
+        """Route single-vector searches of concurrent requests through one `search_batch` call."""
+        config = config or QueryBatchingConfig()
+        self.batcher = MicroBatcher(self._search_batch,
+                                    max_batch_size=config.max_batch_size,
+                                    max_wait_ms=config.max_wait_ms,
+                                    num_workers=config.num_workers,
+                                    name=name)
+        return self
+
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+
+
+    def _search_batch(self, items: List[Tuple[List[float], int]]) -> List[List[Tuple[Document, float]]]:
+        k = max(item_k for _, item_k in items)
+        results = self.index.search_batch(np.asarray([vector for vector, _ in items], dtype=np.float32), k=k)
+        return [[(self.catalog.document(int(i)), float(s)) for i, s in zip(ids[:item_k], scores[:item_k])]
+                for (_, item_k), (ids, scores) in zip(items, results)]
+
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embed and append texts; returns their catalog positions as ids. Meant for
+        small additions to a store that is not serving yet, the vectorstore
+        pipeline rebuilds the index for catalog refreshes.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{}] * len(texts)
+        start = len(self.catalog)
+        ids = np.arange(start, start + len(texts), dtype=np.int64)
+
+        self.index.add(np.asarray(self._embedding.embed_documents(texts), dtype=np.float32), ids)
+        self.catalog = self.catalog.extend(Document(page_content=text, metadata={"row": int(i), **metadata})
+                                           for i, text, metadata in zip(ids, texts, metadatas))
+        return [str(i) for i in ids]
+
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        if self.batcher is not None:
+            return self.batcher((embedding, k))
+        ids, scores = self.index.search(np.asarray(embedding, dtype=np.float32), k=k)
+        return [(self.catalog.document(int(i)), float(s)) for i, s in zip(ids, scores)]
+
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k)
+
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+
+    def _select_relevance_score_fn(self):
+        # same scale as the Pinecone cosine store, so the retriever score_threshold keeps its meaning
+        return lambda score: (score + 1) / 2
+
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        documents = [Document(page_content=t, metadata=(metadatas or [{}] * len(texts))[i]) for i, t in enumerate(texts)]
+        index = IVFQuantizedIndex(**kwargs).build(np.asarray(embedding.embed_documents(texts), dtype=np.float32))
+        return cls(index, documents, embedding)
+
+
+    def save(self, path: str):
+        try:
+            self.index.save(path)
+            self.catalog.save(path)
+            logging.info(f"Saved local ANN index with {len(self.catalog)} documents "
+                         f"({self.catalog.memory_bytes()} catalog bytes) to {path}")
+
+        except Exception as e:
+            logging.error(f"Error saving local ANN index: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "LocalANNVectorStore":
+        try:
+            index = IVFQuantizedIndex.load(path)
+            if CompactCatalog.exists(path):
+                catalog = CompactCatalog.load(path)
+            else:
+                # indexes saved before the compact catalog
+                with open(os.path.join(path, "documents.jsonl"), "r", encoding="utf-8") as f:
+                    catalog = CompactCatalog.from_documents(Document(**json.loads(line)) for line in f)
+            logging.info(f"Loaded local ANN index with {len(catalog)} documents from {path}")
+            return cls(index, catalog, embedding)
+
+        except Exception as e:
+            logging.error(f"Error loading local ANN index: {str(e)}")
+            raise Custom_exception(e, sys)
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+from src.utils.catalog_utils import CATEGORY_COLUMN, CATEGORY_PATTERNS, numeric_catalog, normalize_question
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+@dataclass
+class CatalogAggregatesConfig:
+    is_airflow = os.getenv("IS_AIRFLOW", "false").lower() == "true"
+
+    if is_airflow:
+        input_path = "/opt/airflow/artifacts/data_cleaned.csv"
+        output_path = "/opt/airflow/artifacts/catalog_aggregates.json"
+    else:
+        _current_dir = Path(__file__).parent.parent.parent
+        input_path = str(_current_dir / "artifacts" / "data_cleaned.csv")
+        output_path = str(_current_dir / "artifacts" / "catalog_aggregates.json")
+
+    top_n = 10
+
+
+# ranking name -> (column, descending, tie breaker column)
+RANKINGS = {
+    "cheapest": ("price", False, "rating"),
+    "most_expensive": ("price", True, "rating"),
+    "best_rated": ("rating", True, "rating_count"),
+    "most_reviewed": ("rating_count", True, "rating"),
+    "biggest_discount": ("discount", True, "rating"),
+}
+
+# phrases in a question that map onto a precomputed ranking
+RANKING_PATTERNS = [
+    ("cheapest", r"\b(cheapest|lowest price[sd]?|least expensive|most affordable|lowest cost)\b"),
+    ("most_expensive", r"\b(most expensive|costliest|highest price[sd]?|priciest|most premium)\b"),
+    ("best_rated", r"\b(highest rated|best rated|top rated|best rating|highest rating)\b"),
+    ("most_reviewed", r"\b(most reviewed|most popular|most ratings|most reviews|best ?selling)\b"),
+    ("biggest_discount", r"\b(biggest|highest|largest|best|maximum|max) (discount|offer|deal)s?\b"),
+]
+
+# words that leave a superlative question unqualified; anything else (a brand, a
+# material, a price bound, "these") narrows it beyond what the precomputed lists cover
+FILLER_WORDS = {
+    "what", "whats", "which", "who", "is", "are", "the", "a", "an", "your", "you", "do", "does", "have",
+    "has", "show", "me", "list", "give", "tell", "find", "get", "i", "want", "to", "see", "of", "in",
+    "on", "at", "our", "store", "shop", "catalog", "catalogue", "product", "products", "item", "items",
+    "one", "ones", "all", "please", "can", "could", "would", "available", "currently", "right", "now",
+}
+
+RANKING_TITLES = {
+    "cheapest": "Cheapest",
+    "most_expensive": "Most expensive",
+    "best_rated": "Highest rated",
+    "most_reviewed": "Most reviewed",
+    "biggest_discount": "Biggest discount on",
+}
+
+
+class CatalogAggregatesBuilder:
+    """
+    Precompute per-category summary statistics and sorted top-N product lists
+    (price, rating, rating count, discount) from the cleaned catalog
+    """
+
+    def __init__(self):
+        self.catalog_aggregates_config = CatalogAggregatesConfig()
+
+
+    def load_data(self, path: str) -> DataFrame:
+        try:
+            logging.info(f"Loading cleaned catalog from {path}")
+            df = pd.read_csv(path, index_col=0)
+            if CATEGORY_COLUMN not in df.columns:
+                logging.warning(f"{path} has no {CATEGORY_COLUMN} column, only the 'all' aggregates are built")
+                df[CATEGORY_COLUMN] = "all"
+            return df
+
+        except Exception as e:
+            logging.error(f"Error loading cleaned catalog: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    @staticmethod
+    def product_record(row) -> dict:
+        record = {"brand": row["Brand Name"], "name": row["Product Name"]}
+        for col in ("price", "mrp", "rating", "rating_count", "discount"):
+            value = row[col]
+            record[col] = None if pd.isna(value) else float(value)
+        return record
+
+
+    def compute_aggregates(self, df: DataFrame, top_n: int) -> Dict[str, dict]:
+        try:
+            logging.info("Computing catalog aggregates")
+            catalog = pd.concat([df[["Brand Name", "Product Name", CATEGORY_COLUMN]], numeric_catalog(df)], axis=1)
+
+            groups = [("all", catalog)] + list(catalog.groupby(CATEGORY_COLUMN))
+            aggregates = {}
+            for category, group in groups:
+                summary = {
+                    "count": int(len(group)),
+                    "min_price": float(group["price"].min()),
+                    "max_price": float(group["price"].max()),
+                    "avg_price": round(float(group["price"].mean()), 2),
+                    "avg_rating": round(float(group["rating"].mean()), 2),
+                    "avg_discount": round(float(group["discount"].mean()), 2),
+                }
+
+                top = {}
+                for name, (column, descending, tie_breaker) in RANKINGS.items():
+                    ranked = group.dropna(subset=[column]).sort_values(
+                        [column, tie_breaker], ascending=[not descending, False], na_position="last")
+                    top[name] = [self.product_record(row) for _, row in ranked.head(top_n).iterrows()]
+
+                aggregates[str(category)] = {"summary": summary, "top": top}
+
+            logging.info(f"Computed aggregates for categories: {list(aggregates)}")
+            return aggregates
+
+        except Exception as e:
+            logging.error(f"Error computing catalog aggregates: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def run_pipeline(self) -> Dict[str, dict]:
+        try:
+            config = self.catalog_aggregates_config
+            df = self.load_data(config.input_path)
+            aggregates = self.compute_aggregates(df, config.top_n)
+
+            os.makedirs(os.path.dirname(config.output_path), exist_ok=True)
+            with open(config.output_path, "w", encoding="utf-8") as f:
+                json.dump(aggregates, f, ensure_ascii=False, indent=2)
+
+            logging.info(f"Saved catalog aggregates to {config.output_path}")
+            return aggregates
+
+        except Exception as e:
+            logging.error(f"Error in catalog aggregates pipeline: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+class CatalogAggregates:
+    """
+    In-process lookup table over the precomputed aggregates. Answers plain
+    superlative questions ("cheapest saree", "highest rated watch") directly,
+    without retrieval or an LLM call, and gives the LLM the ranking as
+    context for the qualified ones.
+    """
+
+    def __init__(self, aggregates: Dict[str, dict], answer_size: int = 3):
+        self.aggregates = aggregates
+        self.answer_size = answer_size
+        self._ranking_patterns = [(name, re.compile(p)) for name, p in RANKING_PATTERNS]
+        self._category_patterns = {c: re.compile(p) for c, p in CATEGORY_PATTERNS.items() if c in aggregates}
+
+
+    @classmethod
+    def load(cls, path: str = None) -> Optional["CatalogAggregates"]:
+        path = path or CatalogAggregatesConfig.output_path
+        if not os.path.exists(path):
+            logging.info(f"No catalog aggregates found at {path}")
+            return None
+
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+    def match(self, question: str):
+        """Return (ranking, category) when the question is a superlative over the catalog, otherwise None."""
+        text = normalize_question(question)
+        ranking = next((name for name, pattern in self._ranking_patterns if pattern.search(text)), None)
+        if ranking is None:
+            return None
+
+        categories = [c for c, pattern in self._category_patterns.items() if pattern.search(text)]
+        if len(categories) > 1:
+            # comparisons across categories are left to the LLM
+            return None
+        return ranking, (categories[0] if categories else "all")
+
+
+    def qualifiers(self, question: str) -> List[str]:
+        """Words of the question besides the superlative, the category and filler words."""
+        text = normalize_question(question)
+        for pattern in [p for _, p in self._ranking_patterns] + list(self._category_patterns.values()):
+            text = pattern.sub(" ", text)
+        return [word for word in text.split() if word not in FILLER_WORDS]
+
+
+    def top(self, ranking: str, category: str = "all", n: int = None) -> List[dict]:
+        return self.aggregates[category]["top"][ranking][:n or self.answer_size]
+
+
+    @staticmethod
+    def format_product(product: dict) -> str:
+        parts = [f"{product['brand']} - {product['name']}"]
+        if product["price"] is not None:
+            parts.append(f"₹{product['price']:,.0f}")
+        if product["rating"] is not None:
+            count = f" from {product['rating_count']:,.0f} ratings" if product["rating_count"] is not None else ""
+            parts.append(f"rated {product['rating']:.1f}/5{count}")
+        if product["discount"] is not None:
+            parts.append(f"{product['discount']:.0f}% off")
+        return ", ".join(parts)
+
+
+    def format_ranking(self, ranking: str, category: str) -> str:
+        label = "products" if category == "all" else category
+        lines = [f"{RANKING_TITLES[ranking]} {label} in our catalog:"]
+        for i, product in enumerate(self.top(ranking, category), start=1):
+            lines.append(f"{i}. {self.format_product(product)}")
+        return "\n".join(lines)
+
+
+    def answer(self, question: str) -> Optional[str]:
+        """
+        The precomputed list as the full answer, only for a plain superlative
+        ("cheapest saree", "highest rated watches"). Qualified questions
+        ("cheapest Titan watch", "cheapest silk saree under 500") get None.
+        """
+        matched = self.match(question)
+        if matched is None or self.qualifiers(question):
+            return None
+        return self.format_ranking(*matched)
+
+
+    def context(self, question: str) -> Optional[str]:
+        """
+        The precomputed list as extra context for the LLM when the question is
+        superlative but qualified or part of a conversation, otherwise None.
+        """
+        matched = self.match(question)
+        if matched is None:
+            return None
+        ranking, category = matched
+        return (f"Precomputed ranking over the whole {'catalog' if category == 'all' else category + ' catalog'}, "
+                f"not filtered by any brand, price or other constraint in the question:\n"
+                + self.format_ranking(ranking, category))
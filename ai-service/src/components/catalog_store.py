@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import zlib
+import itertools
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+
+from src.utils.catalog_utils import CATEGORY_COLUMN, numeric_catalog
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+# page_content fields kept as numeric columns (parsed like catalog_aggregates does)
+_NUMERIC_SOURCE_FIELDS = ["Selling Price", "MRP", "Rating", "Rating Count", "Offer"]
+_NUMERIC_COLUMNS = ["price", "mrp", "rating", "rating_count", "discount"]
+_ARRAYS = ("block_offsets", "row_ends", "rows", "category_codes", "brand_codes", "source_codes", "numeric")
+
+
+class _Interner:
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values = list(values or [""])      # code 0 is "missing"
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+
+    def code(self, value) -> int:
+        if value is None:
+            return 0
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+
+class _CatalogWriter:
+    """Accumulates rows into compressed text blocks and typed arrays."""
+
+    __slots__ = ("block_size", "text", "block_offsets", "row_ends", "pending", "pending_bytes",
+                 "rows", "category_codes", "brand_codes", "source_codes")
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.text = bytearray()
+        self.block_offsets = array("q", [0])
+        self.row_ends = array("i")
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.rows, self.category_codes = array("i"), array("H")
+        self.brand_codes, self.source_codes = array("i"), array("H")
+
+
+    def add(self, content: str, row: int, category_code: int, brand_code: int, source_code: int):
+        encoded = content.encode("utf-8")
+        self.pending.append(encoded)
+        self.pending_bytes += len(encoded)
+        self.row_ends.append(self.pending_bytes)
+        self.rows.append(row)
+        self.category_codes.append(category_code)
+        self.brand_codes.append(brand_code)
+        self.source_codes.append(source_code)
+        if len(self.pending) == self.block_size:
+            self.flush()
+
+
+    def flush(self):
+        if self.pending:
+            self.text += zlib.compress(b"".join(self.pending), 6)
+            self.block_offsets.append(len(self.text))
+            self.pending, self.pending_bytes = [], 0
+
+
+    def finish(self, categories, brands, sources, numeric: np.ndarray) -> "CompactCatalog":
+        self.flush()
+        return CompactCatalog(np.frombuffer(bytes(self.text), dtype=np.uint8),
+                              np.frombuffer(self.block_offsets, dtype=np.int64),
+                              np.frombuffer(self.row_ends, dtype=np.int32),
+                              np.frombuffer(self.rows, dtype=np.int32),
+                              np.frombuffer(self.category_codes, dtype=np.uint16),
+                              np.frombuffer(self.brand_codes, dtype=np.int32),
+                              np.frombuffer(self.source_codes, dtype=np.uint16),
+                              categories, brands, sources,
+                              numeric.reshape(len(self.rows), len(_NUMERIC_COLUMNS)).astype(np.float32),
+                              list(_NUMERIC_COLUMNS), self.block_size)
+
+
+
+class CompactCatalog:
+    """
+    Column oriented, read-only catalog for the local index.
+
+    Product texts are stored in one contiguous buffer of zlib compressed blocks
+    (`block_size` rows each) addressed by block offsets. Brand, category and
+    source strings are interned to small integer codes. Price, mrp, rating,
+    rating count and discount are float32 columns. A LangChain `Document` is
+    only built, and its block only decompressed, when a row is returned
+    (`document(i)`). Saved catalogs are memory mapped, so gunicorn workers on
+    the same host share one copy through the page cache.
+    """
+
+    __slots__ = ("text", "block_offsets", "row_ends", "rows", "category_codes", "brand_codes", "source_codes",
+                 "categories", "brands", "sources", "numeric", "numeric_columns", "block_size")
+
+    def __init__(self, text: np.ndarray, block_offsets: np.ndarray, row_ends: np.ndarray, rows: np.ndarray,
+                 category_codes: np.ndarray, brand_codes: np.ndarray, source_codes: np.ndarray,
+                 categories: List[str], brands: List[str], sources: List[str],
+                 numeric: np.ndarray, numeric_columns: List[str], block_size: int = 64):
+        self.text = text                        # uint8, compressed blocks back to back
+        self.block_offsets = block_offsets      # int64, number of blocks + 1
+        self.row_ends = row_ends                # int32, end of each row inside its decompressed block
+        self.rows = rows                        # int32, the CSVLoader "row" metadata
+        self.category_codes = category_codes    # uint16
+        self.brand_codes = brand_codes          # int32
+        self.source_codes = source_codes        # uint16
+        self.categories = categories
+        self.brands = brands
+        self.sources = sources
+        self.numeric = numeric                  # float32, (len(catalog), len(numeric_columns))
+        self.numeric_columns = numeric_columns
+        self.block_size = block_size
+
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+    def _block(self, block: int) -> bytes:
+        return zlib.decompress(self.text[self.block_offsets[block]:self.block_offsets[block + 1]].tobytes())
+
+
+    def _slice(self, data: bytes, i: int) -> str:
+        start = 0 if i % self.block_size == 0 else self.row_ends[i - 1]
+        return data[start:self.row_ends[i]].decode("utf-8")
+
+
+    def page_content(self, i: int) -> str:
+        return self._slice(self._block(i // self.block_size), i)
+
+
+    def texts(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Row texts in [start, stop), each block decompressed once."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        texts, block, data = [], None, b""
+        for i in range(start, stop):
+            if i // self.block_size != block:
+                block = i // self.block_size
+                data = self._block(block)
+            texts.append(self._slice(data, i))
+        return texts
+
+
+    def category(self, i: int) -> str:
+        return self.categories[self.category_codes[i]]
+
+
+    def brand(self, i: int) -> str:
+        return self.brands[self.brand_codes[i]]
+
+
+    def metadata(self, i: int) -> dict:
+        metadata = {"source": self.sources[self.source_codes[i]], "row": int(self.rows[i])}
+        category = self.category(i)
+        if category:
+            metadata[CATEGORY_COLUMN] = category
+        return metadata
+
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.page_content(i), metadata=self.metadata(i))
+
+
+    def documents(self, ids: Iterable[int]) -> List[Document]:
+        return [self.document(int(i)) for i in ids]
+
+
+    def column(self, name: str) -> np.ndarray:
+        return self.numeric[:, self.numeric_columns.index(name)]
+
+
+    def category_rows(self) -> Dict[str, np.ndarray]:
+        """Row positions per category, "all" for rows without one."""
+        return {(self.categories[code] or "all"): np.flatnonzero(self.category_codes == code)
+                for code in np.unique(self.category_codes)}
+
+
+    def subset(self, ids: Sequence[int]) -> "CompactCatalog":
+        writer = _CatalogWriter(self.block_size)
+        for i in ids:
+            i = int(i)
+            writer.add(self.page_content(i), int(self.rows[i]), int(self.category_codes[i]),
+                       int(self.brand_codes[i]), int(self.source_codes[i]))
+        return writer.finish(self.categories, self.brands, self.sources,
+                             np.asarray(self.numeric)[np.asarray(ids, dtype=np.int64)])
+
+
+    def extend(self, documents: Iterable[Document]) -> "CompactCatalog":
+        """A new catalog with `documents` appended after the existing rows."""
+        existing = (self.document(i) for i in range(len(self)))
+        return CompactCatalog.from_documents(itertools.chain(existing, documents), self.block_size)
+
+
+    def memory_bytes(self) -> int:
+        arrays = [getattr(self, name) for name in _ARRAYS] + [self.text]
+        strings = sum(len(s) for s in self.categories + self.brands + self.sources)
+        return int(sum(a.nbytes for a in arrays) + strings)
+
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], block_size: int = 64) -> "CompactCatalog":
+        """Build from (possibly lazily loaded) CSVLoader documents without keeping them around."""
+        writer = _CatalogWriter(block_size)
+        categories, brands, sources = _Interner(), _Interner(), _Interner()
+        numeric_fields = {field: [] for field in _NUMERIC_SOURCE_FIELDS}
+
+        for position, doc in enumerate(documents):
+            fields = dict(line.split(": ", 1) for line in doc.page_content.split("\n") if ": " in line)
+            for field, values in numeric_fields.items():
+                values.append(fields.get(field))
+
+            writer.add(doc.page_content,
+                       int(doc.metadata.get("row", position)),
+                       categories.code(doc.metadata.get(CATEGORY_COLUMN)),
+                       brands.code(fields.get("Brand Name")),
+                       sources.code(doc.metadata.get("source")))
+
+        numeric = numeric_catalog(pd.DataFrame(numeric_fields))[_NUMERIC_COLUMNS].to_numpy(dtype=np.float32)
+        return writer.finish(categories.values, brands.values, sources.values, numeric)
+
+
+    def save(self, path: str):
+        try:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "catalog_text.bin"), "wb") as f:
+                f.write(self.text.tobytes())
+            for name in _ARRAYS:
+                np.save(os.path.join(path, f"catalog_{name}.npy"), np.asarray(getattr(self, name)))
+            with open(os.path.join(path, "catalog.json"), "w", encoding="utf-8") as f:
+                json.dump({"size": len(self),
+                           "block_size": self.block_size,
+                           "categories": self.categories,
+                           "brands": self.brands,
+                           "sources": self.sources,
+                           "numeric_columns": self.numeric_columns}, f)
+
+        except Exception as e:
+            logging.error(f"Error saving compact catalog: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, "catalog.json"))
+
+
+    @classmethod
+    def load(cls, path: str) -> "CompactCatalog":
+        try:
+            with open(os.path.join(path, "catalog.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+            text_path = os.path.join(path, "catalog_text.bin")
+            # an empty file cannot be memory mapped
+            text = (np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path)
+                    else np.zeros(0, dtype=np.uint8))
+            arrays = {name: np.load(os.path.join(path, f"catalog_{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+
+            return cls(text, categories=meta["categories"], brands=meta["brands"], sources=meta["sources"],
+                       numeric_columns=meta["numeric_columns"], block_size=meta["block_size"], **arrays)
+
+        except Exception as e:
+            logging.error(f"Error loading compact catalog: {str(e)}")
+            raise Custom_exception(e, sys)
@@ -8,6 +8,8 @@ import glob
 
 from src.utils.logger import logging 
 from src.utils.exception import Custom_exception
+from src.utils.minhash import MinHashLSH, normalize_text, text_hash
+from src.utils.catalog_utils import CATEGORY_COLUMN, category_from_file
 
 
 @dataclass
@@ -21,25 +23,32 @@ class DataCleaningConfig:
         input_path = "../data"
         output_path = "../../artifacts/data_cleaned.csv" 
 
+    # near duplicate threshold on the estimated jaccard similarity of Brand + Product Name
+    dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+    dedup_columns = ["Brand Name", "Product Name"]
+
 class DataCleaner:
     """
-    Remove nan values from the data 
+    Remove duplicate products and nan values from the data 
     """
 
     def __init__(self):
         self.data_cleaner_config = DataCleaningConfig()
 
 
+    def load_file(self, file_path) -> DataFrame:
+        file = pd.read_csv(file_path)
+        # keep track of which category (source file) each product came from
+        file[CATEGORY_COLUMN] = category_from_file(file_path)
+        return file
+
+
+
     def load_data(self, file_path):
         try:
             logging.info(f"Loading data from {file_path}")
-            dfs = []
-            file_paths = glob.glob(os.path.join(file_path, "*.csv"))
-            for f in file_paths:
-                file = pd.read_csv(f)
-                dfs.append(file)
-
-            df = pd.concat(dfs)
+            file_paths = sorted(glob.glob(os.path.join(file_path, "*.csv")))
+            df = pd.concat([self.load_file(f) for f in file_paths])
             logging.info("Data loaded sucessfully")
             return df
         except Exception as e:
@@ -63,6 +72,46 @@ class DataCleaner:
     
 
 
+    def remove_duplicates(self, df: DataFrame, columns, threshold: float, name_column: str = "Product Name"):
+        try:
+            logging.info("Removing duplicate products")
+            total = len(df)
+
+            # 'na' carries no identity, treat it as empty when building the key
+            values = df[columns].astype(str)
+            missing = values.map(lambda v: v.strip().lower() == 'na')
+            key = values.where(~missing, "").apply(lambda row: normalize_text(" ".join(row)), axis=1)
+
+            # without a product name the key is just the brand, such rows are kept as they are
+            named = np.flatnonzero(~missing[name_column].to_numpy() & (key != "").to_numpy())
+            drop = np.zeros(total, dtype=bool)
+
+            # exact duplicates after normalization
+            exact_mask = key.iloc[named].map(text_hash).duplicated(keep="first").to_numpy()
+            drop[named[exact_mask]] = True
+            remaining = named[~exact_mask]
+            exact_removed = int(exact_mask.sum())
+
+            # near duplicates (sponsored listings re-titled across pages and keywords)
+            lsh = MinHashLSH(threshold=threshold)
+            representatives = lsh.clusters(key.iloc[remaining].tolist())
+            near_mask = np.array([rep != i for i, rep in enumerate(representatives)], dtype=bool)
+            drop[remaining[near_mask]] = True
+            near_removed = int(near_mask.sum())
+            df = df[~drop]
+
+            print(f"Duplicates collapsed: {exact_removed} exact, {near_removed} near (threshold {threshold}), "
+                  f"{total} -> {len(df)} records, {total - len(named)} without a product name kept")
+            logging.info(f"Duplicates collapsed: exact={exact_removed}, near={near_removed}, "
+                         f"threshold={threshold}, unnamed_kept={total - len(named)}, rows {total} -> {len(df)}")
+            return df
+
+        except Exception as e:
+            logging.info(f"Error in removing duplicates: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
     def find_mode(self, df: DataFrame):
         try:
             df_without_na = df[~df.map(lambda x: str(x).strip().lower() == 'na').any(axis=1)]
@@ -83,16 +132,21 @@ class DataCleaner:
     
     
 
+    def fill_na(self, columns, replacement_value, df: DataFrame) -> DataFrame:
+        # Convert 'na' to pd.NA first
+        df = df.replace('na', pd.NA)
+
+        for col in columns:
+            if col in df.columns and col in replacement_value:
+                df[col] = df[col].fillna(replacement_value[col])
+        return df
+
+
+
     def handling_na(self, columns, replacement_value, df: DataFrame, path):
         try:
             logging.info("Replacing 'na' values with mode")
-            
-            # Convert 'na' to pd.NA first
-            df = df.replace('na', pd.NA)
-            
-            for col in columns:
-                if col in df.columns:  # Fixed the condition here
-                    df[col] = df[col].fillna(replacement_value[col])
+            df = self.fill_na(columns, replacement_value, df)
 
             logging.info("Sucessfully replaced 'na' values")
             logging.info("Saving the cleaned data")
@@ -111,6 +165,9 @@ class DataCleaner:
             logging.info("Starting data cleaning process")
             df = self.load_data(self.data_cleaner_config.input_path)
             self.check_for_na(df)
+            df = self.remove_duplicates(df, 
+                                        columns=self.data_cleaner_config.dedup_columns, 
+                                        threshold=self.data_cleaner_config.dedup_threshold)
             cols, replace_value = self.find_mode(df)
             df_cleaned = self.handling_na(columns=cols, 
                                           replacement_value=replace_value, 
@@ -123,4 +180,65 @@ class DataCleaner:
         except Exception as e:
             logging.error(f"Error cleaning data: {str(e)}")
             raise Custom_exception(e, sys)
-        
\ No newline at end of file
+
+
+
+    def clean_category(self, file_path, output_path):
+        """
+        Deduplicate a single scraped category file on its own so a refresh only
+        reprocesses the categories whose source data changed. 'na' values are
+        kept: imputing here would put mode values into the dedup key that
+        merge_categories builds again across categories.
+        """
+        try:
+            logging.info(f"Cleaning category file {file_path}")
+            df = self.load_file(file_path)
+            self.check_for_na(df)
+            df = self.remove_duplicates(df, 
+                                        columns=self.data_cleaner_config.dedup_columns, 
+                                        threshold=self.data_cleaner_config.dedup_threshold)
+
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            df.to_csv(output_path)
+            return df
+
+        except Exception as e:
+            logging.error(f"Error cleaning category file {file_path}: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+    def merge_categories(self, file_paths, output_path, category_output_path):
+        """
+        Combine the cleaned categories into data_cleaned.csv, collapsing listings
+        repeated across keywords, then replace 'na' values with the mode of each
+        category and rewrite the per category slices of the result.
+        """
+        try:
+            logging.info(f"Merging {len(file_paths)} cleaned category files")
+            df = pd.concat([pd.read_csv(f, index_col=0) for f in sorted(file_paths)])
+            df = self.remove_duplicates(df, 
+                                        columns=self.data_cleaner_config.dedup_columns, 
+                                        threshold=self.data_cleaner_config.dedup_threshold)
+
+            # imputation after the last dedup, per category as the single file cleaning did
+            logging.info("Replacing 'na' values with mode")
+            slices = []
+            for category, rows in df.groupby(CATEGORY_COLUMN, sort=True):
+                cols, replace_value = self.find_mode(rows)
+                slices.append((category, self.fill_na(cols, replace_value, rows)))
+            df = pd.concat([rows for _, rows in slices]) if slices else df
+
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            df.to_csv(output_path)
+
+            os.makedirs(category_output_path, exist_ok=True)
+            for category, rows in slices:
+                rows.to_csv(os.path.join(category_output_path, f"{category}.csv"))
+
+            logging.info(f"Merged catalog saved to {output_path} with {len(df)} records")
+            return df
+
+        except Exception as e:
+            logging.error(f"Error merging cleaned categories: {str(e)}")
+            raise Custom_exception(e, sys)
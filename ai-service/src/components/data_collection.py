@@ -35,6 +35,8 @@ class DataCollectionConfig:
         path = '/opt/airflow/data'
     else:     
         path = 'data'   
+
+    resume = os.getenv("SCRAPER_RESUME", "true").lower() == "true"
     
  
 
@@ -54,15 +56,14 @@ class DataCollection:
                 try:
                     logging.info(f"Collecting data for: {product['keyword']}, target products: {product['num_products']}") 
 
-                    data = scraper.scrape_products(product['keyword'], 
-                                                   product['num_products'])        
-
-                    print("Data shape for", product['keyword'], "is: ", data.shape)
-                    print("Sample data for", product['keyword'], "is: ", data.head())
-
+                    # rows are streamed straight into the csv, an interrupted run resumes from its checkpoint
                     file_path = os.path.join(self.data_collection_config.path, product['file_path'])
-                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                    data.to_csv(file_path, index=False)
+                    num_rows = scraper.scrape_products(product['keyword'],
+                                                       product['num_products'],
+                                                       output_path=file_path,
+                                                       resume=self.data_collection_config.resume)
+
+                    print("Number of rows for", product['keyword'], "is: ", num_rows)
 
                     successful_products.append(product['keyword'])
 
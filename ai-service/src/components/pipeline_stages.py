@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from src.components import scraper
+from src.components.data_collection import DataCollectionConfig, products_config
+from src.components.data_cleaning import DataCleaner, DataCleaningConfig
+from src.components.catalog_aggregates import CatalogAggregatesBuilder, CatalogAggregatesConfig
+from src.components.vectorstore_builder import VectorStoreBuilder, VectorStoreBuilderConfig
+from src.components.recommendation_builder import RecommendationBuilder, RecommendationConfig
+from src.utils.chatbot_utils import BuildRetrievalchain
+from src.utils.catalog_utils import category_from_file
+from src.utils.pipeline_runner import StageCache, Task, cached_stage
+from src.utils.hot_reload import ReleaseConfig, publish_release
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+@dataclass
+class PipelineConfig:
+    is_airflow = os.getenv("IS_AIRFLOW", "false").lower() == "true"
+
+    if is_airflow:
+        artifacts_path = "/opt/airflow/artifacts"
+    else:
+        artifacts_path = str(Path(__file__).parent.parent.parent / "artifacts")
+
+    data_path = DataCollectionConfig.path
+    cleaned_path = os.path.join(artifacts_path, "cleaned")      # per category, deduplicated, "na" kept until merge
+    catalog_path = os.path.join(artifacts_path, "catalog")      # per category slices of data_cleaned.csv
+    output_path = os.path.join(artifacts_path, "data_cleaned.csv")
+    manifest_path = os.path.join(artifacts_path, "pipeline_manifest.json")
+
+    # a category is scraped again once its last scrape is older than this
+    scrape_refresh_hours = float(os.getenv("SCRAPE_REFRESH_HOURS", "24"))
+    # "all" or comma separated stage names (e.g. "index[shirts],smoke_test") to run regardless of hashes
+    force = os.getenv("PIPELINE_FORCE", "")
+    max_workers = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+
+
+_src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _code(*modules: str) -> List[str]:
+    # stage code is part of its inputs, a changed cleaner, index builder or one of the helpers
+    # they import (e.g. "utils.minhash") invalidates the stage; bare names are components
+    return [os.path.join(_src_dir, *(module if "." in module else f"components.{module}").split(".")) + ".py"
+            for module in modules]
+
+
+def categories() -> List[str]:
+    return [category_from_file(product['file_path']) for product in products_config]
+
+
+def _product(category: str) -> dict:
+    return next(p for p in products_config if category_from_file(p['file_path']) == category)
+
+
+def _run(name: str, fn, inputs: List[str], outputs: List[str], params=None) -> str:
+    config = PipelineConfig()
+    forced = config.force == "all" or name in [s.strip() for s in config.force.split(",")]
+    try:
+        return cached_stage(StageCache(config.manifest_path), name, fn, inputs, outputs, params=params, force=forced)
+    except Exception as e:
+        logging.error(f"Pipeline stage {name} failed: {str(e)}")
+        raise Custom_exception(e, sys)
+
+
+
+def scrape_category(category: str) -> str:
+    config = PipelineConfig()
+    product = _product(category)
+    output = os.path.join(config.data_path, product['file_path'])
+    # the refresh window is an input: within it the last scrape is reused
+    window = int(time.time() // (config.scrape_refresh_hours * 3600))
+
+    return _run(f"scrape[{category}]",
+                lambda: scraper.scrape_products(product['keyword'], product['num_products'],
+                                                output_path=output, resume=DataCollectionConfig.resume),
+                inputs=[], outputs=[output],
+                params={"product": product, "window": window})
+
+
+def clean_category(category: str) -> str:
+    config = PipelineConfig()
+    source = os.path.join(config.data_path, _product(category)['file_path'])
+    output = os.path.join(config.cleaned_path, f"{category}.csv")
+
+    return _run(f"clean[{category}]",
+                lambda: DataCleaner().clean_category(source, output),
+                inputs=[source] + _code("data_cleaning", "utils.minhash", "utils.catalog_utils"), outputs=[output],
+                params={"threshold": DataCleaningConfig.dedup_threshold, "columns": DataCleaningConfig.dedup_columns})
+
+
+def merge_catalog() -> str:
+    config = PipelineConfig()
+    cleaned = [os.path.join(config.cleaned_path, f"{category}.csv") for category in categories()]
+
+    return _run("merge",
+                lambda: DataCleaner().merge_categories(cleaned, config.output_path, config.catalog_path),
+                inputs=cleaned + _code("data_cleaning", "utils.minhash", "utils.catalog_utils"),
+                outputs=[config.output_path, config.catalog_path],
+                params={"threshold": DataCleaningConfig.dedup_threshold, "columns": DataCleaningConfig.dedup_columns})
+
+
+def index_category(category: str) -> str:
+    config = PipelineConfig()
+    index_config = VectorStoreBuilderConfig()
+    source = os.path.join(config.catalog_path, f"{category}.csv")
+    outputs = [os.path.join(index_config.centroid_path, f"{category}.json")]
+    if index_config.backend in ("local", "both"):
+        outputs.append(os.path.join(index_config.ann_index_path, category))
+
+    return _run(f"index[{category}]",
+                lambda: VectorStoreBuilder().run_category(category, source),
+                inputs=[source] + _code("vectorstore_builder", "ann_index", "catalog_store",
+                                        "utils.minhash", "utils.catalog_utils", "utils.local_embeddings"),
+                outputs=outputs,
+                params={"backend": index_config.backend, "index_name": index_config.index_name,
+                        "embeddings_backend": index_config.embeddings_backend})
+
+
+def build_router() -> str:
+    index_config = VectorStoreBuilderConfig()
+    centroids = [os.path.join(index_config.centroid_path, f"{category}.json") for category in categories()]
+
+    return _run("router",
+                lambda: VectorStoreBuilder().build_router(categories()),
+                inputs=centroids + _code("sharded_retriever", "utils.catalog_utils"), outputs=[index_config.router_path])
+
+
+def build_aggregates() -> str:
+    return _run("aggregates",
+                lambda: CatalogAggregatesBuilder().run_pipeline(),
+                inputs=[PipelineConfig.output_path] + _code("catalog_aggregates", "utils.catalog_utils"),
+                outputs=[CatalogAggregatesConfig.output_path])
+
+
+def build_recommendations() -> str:
+    # the builder itself only re-embeds products that changed since its last run
+    return _run("recommendations",
+                lambda: RecommendationBuilder().run_pipeline(VectorStoreBuilder().create_embeddings()),
+                inputs=[PipelineConfig.output_path] + _code("recommendation_builder", "ann_index",
+                                                            "utils.minhash", "utils.catalog_utils",
+                                                            "utils.local_embeddings"),
+                outputs=[RecommendationConfig.output_path],
+                params={"embeddings_backend": RecommendationConfig.embeddings_backend})
+
+
+def smoke_test() -> str:
+    index_config = VectorStoreBuilderConfig()
+    os.environ.setdefault("ANN_INDEX_PATH", index_config.ann_index_path)
+    os.environ.setdefault("CATEGORY_ROUTER_PATH", index_config.router_path)
+
+    def run():
+        chain = BuildRetrievalchain().build_retrieval_chain()
+        response = chain.invoke({"input": "What do you do?", "chat_history": []})
+        logging.info(f"Test Response: {response['answer']}")
+        print("Test response: ", response['answer'])
+
+    # the index itself is an input: a rebuilt shard with unchanged centroids is still tested
+    inputs = [index_config.router_path, index_config.centroid_path] + _code("utils.chatbot_utils")
+    if index_config.backend in ("local", "both"):
+        inputs.append(index_config.ann_index_path)
+
+    return _run("smoke_test", run, inputs=inputs, outputs=[],
+                params={"backend": index_config.backend, "embeddings_backend": index_config.embeddings_backend,
+                        "index_name": index_config.index_name})
+
+
+def publish() -> str:
+    """
+    Snapshot the index, router, catalog aggregates and recommendation tables into a
+    new release, running services pick them up together without a restart.
+    """
+    index_config = VectorStoreBuilderConfig()
+    release_config = ReleaseConfig()
+    if "RELEASE_POINTER_PATH" not in os.environ:
+        release_config.pointer_path = os.path.join(PipelineConfig.artifacts_path, "release.json")
+    if "RELEASES_DIR" not in os.environ:
+        release_config.releases_dir = os.path.join(PipelineConfig.artifacts_path, "releases")
+
+    artifacts = {"router": index_config.router_path,
+                 "catalog_aggregates": CatalogAggregatesConfig.output_path,
+                 "recommendations": RecommendationConfig.output_path}
+    if index_config.backend in ("local", "both"):
+        artifacts["ann_index"] = index_config.ann_index_path
+
+    return _run("publish",
+                lambda: publish_release(artifacts, config=release_config),
+                inputs=list(artifacts.values()), outputs=[release_config.pointer_path])
+
+
+
+def build_tasks(scrape: bool = True) -> List[Task]:
+    """
+    The pipeline DAG for the local runner, mirroring airflow/dags/pipeline.py:
+    scrape[c] -> clean[c] -> merge -> index[c] -> router -> smoke_test -> publish,
+    with aggregates and recommendations between merge and publish.
+    """
+    tasks = []
+    for category in categories():
+        clean_upstream = []
+        if scrape:
+            tasks.append(Task(f"scrape[{category}]", lambda c=category: scrape_category(c)))
+            clean_upstream = [f"scrape[{category}]"]
+        tasks.append(Task(f"clean[{category}]", lambda c=category: clean_category(c), clean_upstream))
+
+    tasks.append(Task("merge", merge_catalog, [f"clean[{c}]" for c in categories()]))
+    for category in categories():
+        tasks.append(Task(f"index[{category}]", lambda c=category: index_category(c), ["merge"]))
+    tasks.append(Task("router", build_router, [f"index[{c}]" for c in categories()]))
+    tasks.append(Task("aggregates", build_aggregates, ["merge"]))
+    tasks.append(Task("recommendations", build_recommendations, ["merge"]))
+    tasks.append(Task("smoke_test", smoke_test, ["router"]))
+    tasks.append(Task("publish", publish, ["smoke_test", "aggregates", "recommendations"]))
+    return tasks
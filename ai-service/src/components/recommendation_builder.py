@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from langchain_core.embeddings import Embeddings
+
+from src.components.ann_index import IVFQuantizedIndex
+from src.utils.catalog_utils import CATEGORY_COLUMN, numeric_catalog
+from src.utils.minhash import normalize_text, text_hash
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+@dataclass
+class RecommendationConfig:
+    is_airflow = os.getenv("IS_AIRFLOW", "false").lower() == "true"
+
+    if is_airflow:
+        input_path = "/opt/airflow/artifacts/data_cleaned.csv"
+        output_path = "/opt/airflow/artifacts/recommendations"
+    else:
+        _current_dir = Path(__file__).parent.parent.parent
+        input_path = str(_current_dir / "artifacts" / "data_cleaned.csv")
+        output_path = str(_current_dir / "artifacts" / "recommendations")
+
+    # neighbours stored per product, more than we serve so filters still leave enough results
+    num_neighbors = int(os.getenv("RECOMMENDATION_NEIGHBORS", "50"))
+    block_size = 4096
+    embedding_batch_size = 256
+    # above this share of changed products a full rebuild is cheaper than patching
+    full_rebuild_ratio = 0.5
+    # product embeddings are only reused while they come from the same backend
+    embeddings_backend = os.getenv("EMBEDDINGS_BACKEND", "hf_endpoint").lower()
+
+
+def product_id(brand: str, name: str) -> str:
+    return text_hash(normalize_text(f"{brand} {name}"))[:16]
+
+
+def product_text(row) -> str:
+    return f"{row['Brand Name']} {row['Product Name']}"
+
+
+def top_k(scores: np.ndarray, k: int):
+    """Row-wise top-k of a score matrix, best first: (indices, scores)."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class RecommendationBuilder:
+    """
+    Precompute the top-K most similar products for every product from their embeddings
+    and store them as a compact int32 neighbour matrix. Rebuilds are incremental: only
+    new products are embedded, and only rows affected by added or removed products are
+    recomputed.
+    """
+
+    def __init__(self):
+        self.recommendation_config = RecommendationConfig()
+
+
+    def load_catalog(self, path: str) -> DataFrame:
+        try:
+            logging.info(f"Loading cleaned catalog from {path}")
+            df = pd.read_csv(path, index_col=0)
+            if CATEGORY_COLUMN not in df.columns:
+                df[CATEGORY_COLUMN] = "all"
+
+            catalog = pd.concat([df[["Brand Name", "Product Name", CATEGORY_COLUMN]], numeric_catalog(df)], axis=1)
+            catalog["product_id"] = [product_id(b, n) for b, n in zip(catalog["Brand Name"], catalog["Product Name"])]
+            catalog = catalog.drop_duplicates(subset="product_id").reset_index(drop=True)
+
+            logging.info(f"Loaded {len(catalog)} unique products")
+            return catalog
+
+        except Exception as e:
+            logging.error(f"Error loading catalog for recommendations: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def load_previous(self, path: str) -> Optional[dict]:
+        try:
+            if not os.path.exists(os.path.join(path, "neighbors.npy")):
+                return None
+
+            meta_path = os.path.join(path, "meta.json")
+            backend = None
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    backend = json.load(f).get("embeddings_backend")
+            if backend != self.recommendation_config.embeddings_backend:
+                logging.info(f"Previous recommendation tables were embedded with {backend}, "
+                             f"re-embedding everything with {self.recommendation_config.embeddings_backend}")
+                return None
+
+            with open(os.path.join(path, "products.json"), "r", encoding="utf-8") as f:
+                products = json.load(f)
+            return {"ids": [p["product_id"] for p in products],
+                    "embeddings": np.load(os.path.join(path, "embeddings.npy")),
+                    "neighbors": np.load(os.path.join(path, "neighbors.npy")),
+                    "scores": np.load(os.path.join(path, "scores.npy")).astype(np.float32)}
+
+        except Exception as e:
+            logging.info(f"Ignoring unreadable previous recommendation artifacts: {str(e)}")
+            return None
+
+
+    def embed_products(self, catalog: DataFrame, embeddings: Embeddings, previous: Optional[dict]) -> np.ndarray:
+        try:
+            dim = None
+            cached = {}
+            if previous is not None:
+                cached = dict(zip(previous["ids"], previous["embeddings"]))
+                dim = previous["embeddings"].shape[1]
+
+            missing = [i for i, pid in enumerate(catalog["product_id"]) if pid not in cached]
+            logging.info(f"Embedding {len(missing)} new products, reusing {len(catalog) - len(missing)} cached embeddings")
+
+            batch_size = self.recommendation_config.embedding_batch_size
+            fresh = {}
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                texts = [product_text(catalog.iloc[i]) for i in batch]
+                for i, vector in zip(batch, embeddings.embed_documents(texts)):
+                    fresh[i] = vector
+
+            if dim is None:
+                if not fresh:
+                    raise ValueError("The catalog has no products to embed")
+                dim = len(next(iter(fresh.values())))
+            vectors = np.empty((len(catalog), dim), dtype=np.float32)
+            for i, pid in enumerate(catalog["product_id"]):
+                vectors[i] = fresh[i] if i in fresh else cached[pid]
+
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            return vectors / np.maximum(norms, 1e-12)
+
+        except Exception as e:
+            logging.error(f"Error embedding products: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def neighbors_for_rows(self, vectors: np.ndarray, rows: np.ndarray, k: int):
+        """Exact top-k neighbours (excluding the product itself) for the given rows, in blocks."""
+        block_size = self.recommendation_config.block_size
+        neighbors = np.empty((len(rows), k), dtype=np.int32)
+        scores = np.empty((len(rows), k), dtype=np.float32)
+
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            sims = vectors[block] @ vectors.T
+            sims[np.arange(len(block)), block] = -np.inf
+            idx, val = top_k(sims, k)
+            neighbors[start:start + len(block)] = idx
+            scores[start:start + len(block)] = val
+
+        return neighbors, scores
+
+
+    def compute_neighbors(self, catalog: DataFrame, vectors: np.ndarray, previous: Optional[dict]):
+        try:
+            n = len(catalog)
+            k = min(self.recommendation_config.num_neighbors, max(n - 1, 1))
+            ids = catalog["product_id"].tolist()
+
+            if previous is None or previous["neighbors"].shape[1] != k:
+                logging.info(f"Computing neighbour table from scratch for {n} products, k={k}")
+                return self.neighbors_for_rows(vectors, np.arange(n), k)
+
+            old_pos = {pid: i for i, pid in enumerate(previous["ids"])}
+            new_pos = np.array([old_pos.get(pid, -1) for pid in ids])
+            added = np.where(new_pos < 0)[0]
+            removed = len(previous["ids"]) - int((new_pos >= 0).sum())
+
+            if len(added) + removed > self.recommendation_config.full_rebuild_ratio * n:
+                logging.info(f"{len(added)} added and {removed} removed products, rebuilding neighbour table")
+                return self.neighbors_for_rows(vectors, np.arange(n), k)
+
+            logging.info(f"Patching neighbour table: {len(added)} added, {removed} removed products")
+
+            # old position -> new position, -1 for removed products
+            remap = np.full(len(previous["ids"]), -1, dtype=np.int64)
+            kept = np.where(new_pos >= 0)[0]
+            remap[new_pos[kept]] = kept
+
+            neighbors = np.empty((n, k), dtype=np.int32)
+            scores = np.empty((n, k), dtype=np.float32)
+
+            old_neighbors = remap[previous["neighbors"][new_pos[kept]]]
+            old_scores = previous["scores"][new_pos[kept]]
+
+            # rows that lost a neighbour to a removal need an exact recompute
+            stale = (old_neighbors < 0).any(axis=1)
+            patch = kept[~stale]
+
+            if len(patch):
+                cand_idx = old_neighbors[~stale]
+                cand_val = old_scores[~stale]
+                if len(added):
+                    # an added product only enters a row when it beats that row's current candidates
+                    # at the float16 precision the kept scores were saved with, so ties resolve alike
+                    add_val = (vectors[patch] @ vectors[added].T).astype(np.float16).astype(np.float32)
+                    cand_idx = np.concatenate([cand_idx, np.broadcast_to(added, add_val.shape)], axis=1)
+                    cand_val = np.concatenate([cand_val, add_val], axis=1)
+                best, best_val = top_k(cand_val, k)
+                neighbors[patch] = np.take_along_axis(cand_idx, best, axis=1)
+                scores[patch] = best_val
+
+            recompute = np.concatenate([kept[stale], added]).astype(np.int64)
+            if len(recompute):
+                neighbors[recompute], scores[recompute] = self.neighbors_for_rows(vectors, recompute, k)
+
+            logging.info(f"Recomputed {len(recompute)} rows, patched {len(patch)} rows")
+            return neighbors, scores
+
+        except Exception as e:
+            logging.error(f"Error computing neighbour table: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def save(self, path: str, catalog: DataFrame, vectors: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        try:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, "embeddings.npy"), vectors.astype(np.float32))
+            np.save(os.path.join(path, "neighbors.npy"), neighbors.astype(np.int32))
+            np.save(os.path.join(path, "scores.npy"), scores.astype(np.float16))
+
+            records = catalog.rename(columns={"Brand Name": "brand", "Product Name": "name", CATEGORY_COLUMN: "category"})
+            records = records[["product_id", "brand", "name", "category", "price", "mrp", "rating", "rating_count", "discount"]]
+            records = records.astype(object).where(records.notna(), None)
+            with open(os.path.join(path, "products.json"), "w", encoding="utf-8") as f:
+                json.dump(records.to_dict(orient="records"), f, ensure_ascii=False)
+
+            # free text queries search this instead of scanning every product embedding
+            IVFQuantizedIndex().build(vectors).save(os.path.join(path, "ivf_index"))
+
+            with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"embeddings_backend": self.recommendation_config.embeddings_backend,
+                           "products": len(catalog)}, f)
+
+            logging.info(f"Saved recommendation tables for {len(catalog)} products to {path}")
+
+        except Exception as e:
+            logging.error(f"Error saving recommendation tables: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def run_pipeline(self, embeddings: Embeddings):
+        try:
+            logging.info("Starting recommendation pipeline")
+            config = self.recommendation_config
+            catalog = self.load_catalog(config.input_path)
+            previous = self.load_previous(config.output_path)
+
+            vectors = self.embed_products(catalog, embeddings, previous)
+            neighbors, scores = self.compute_neighbors(catalog, vectors, previous)
+            self.save(config.output_path, catalog, vectors, neighbors, scores)
+
+            logging.info("Recommendation pipeline completed successfully")
+            return neighbors
+
+        except Exception as e:
+            logging.error(f"Error in recommendation pipeline: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+class Recommender:
+    """
+    Serves recommendations from the precomputed tables without any LLM call:
+    "similar to product X" is a row lookup in the neighbour matrix, a free-text
+    query is one query embedding searched in the IVF index over the products.
+    """
+
+    def __init__(self, products: List[dict], index: IVFQuantizedIndex, neighbors: np.ndarray, scores: np.ndarray,
+                 query_embeddings: Optional[Embeddings] = None):
+        self.products = products
+        self.index = index
+        self.neighbors = neighbors
+        self.scores = scores
+        self.query_embeddings = query_embeddings
+
+        self.position = {p["product_id"]: i for i, p in enumerate(products)}
+        self.name_position = {normalize_text(p["name"]): i for i, p in enumerate(products)}
+        self.price = np.array([np.nan if p["price"] is None else p["price"] for p in products], dtype=np.float32)
+        self.category = np.array([p["category"] for p in products], dtype=object)
+
+
+    @classmethod
+    def load(cls, path: str = None, query_embeddings: Optional[Embeddings] = None) -> Optional["Recommender"]:
+        path = path or RecommendationConfig.output_path
+        if not os.path.exists(os.path.join(path, "neighbors.npy")):
+            logging.info(f"No recommendation tables found at {path}")
+            return None
+
+        with open(os.path.join(path, "products.json"), "r", encoding="utf-8") as f:
+            products = json.load(f)
+
+        index_path = os.path.join(path, "ivf_index")
+        if os.path.exists(os.path.join(index_path, "index_meta.json")):
+            index = IVFQuantizedIndex.load(index_path)
+        else:
+            # tables from before the index was part of them
+            logging.info(f"No product index at {index_path}, building it from the product embeddings")
+            index = IVFQuantizedIndex().build(np.load(os.path.join(path, "embeddings.npy")))
+
+        return cls(products,
+                   index,
+                   np.load(os.path.join(path, "neighbors.npy")),
+                   np.load(os.path.join(path, "scores.npy")),
+                   query_embeddings)
+
+
+    def find_product(self, product_id: str = None, product_name: str = None) -> Optional[int]:
+        if product_id:
+            return self.position.get(product_id)
+        if product_name:
+            return self.name_position.get(normalize_text(product_name))
+        return None
+
+
+    def allowed(self, candidates: np.ndarray, min_price=None, max_price=None, category=None) -> np.ndarray:
+        mask = np.ones(len(candidates), dtype=bool)
+        if min_price is not None:
+            mask &= self.price[candidates] >= float(min_price)
+        if max_price is not None:
+            mask &= self.price[candidates] <= float(max_price)
+        if category:
+            mask &= self.category[candidates] == category
+        return mask
+
+
+    def result(self, position: int, score: float) -> dict:
+        return {**self.products[position], "score": round(float(score), 4)}
+
+
+    def similar(self, position: int, k: int = 5, **constraints) -> List[dict]:
+        candidates = self.neighbors[position]
+        mask = self.allowed(candidates, **constraints)
+        return [self.result(i, s) for i, s in zip(candidates[mask][:k], self.scores[position][mask][:k])]
+
+
+    def for_query(self, query: str, k: int = 5, max_candidates: int = 1000, **constraints) -> List[dict]:
+        if self.query_embeddings is None:
+            raise ValueError("Free text recommendations need a query embedding model")
+
+        vector = np.asarray(self.query_embeddings.embed_query(query), dtype=np.float32)
+
+        # filters are applied to the index results, widen the search until enough of them pass
+        fetch = min(max(4 * k, 50), len(self.products))
+        while True:
+            candidates, sims = self.index.search(vector, k=fetch)
+            mask = self.allowed(candidates, **constraints)
+            if mask.sum() >= k or fetch >= min(max_candidates, len(self.products)):
+                break
+            fetch = min(2 * fetch, max_candidates, len(self.products))
+        return [self.result(i, s) for i, s in zip(candidates[mask][:k], sims[mask][:k])]
+
+
+    def recommend(self, query: str = None, product_id: str = None, product_name: str = None, k: int = 5,
+                  **constraints) -> Dict[str, object]:
+        position = self.find_product(product_id, product_name)
+        if position is not None:
+            return {"source": self.products[position], "products": self.similar(position, k, **constraints)}
+        if product_id or (product_name and not query):
+            raise KeyError(f"Unknown product: {product_id or product_name}")
+        return {"source": None, "products": self.for_query(query, k, **constraints)}
@@ -4,23 +4,206 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
 import sys
-import time
-import pandas as pd
+import csv
+import json
 import uuid
 import os
 import shutil
+from dataclasses import dataclass
 
 from src.utils.exception import Custom_exception
 from src.utils.logger import logging
 
-def scrape_products(keyword:str, num_products:int) -> pd.DataFrame:
-        
+
+SCRAPER_COLUMNS = ["Brand Name", "Product Name", "Rating", "Rating Count", "Selling Price", "MRP", "Offer"]
+
+SEARCH_BOX_XPATH = "/html/body/div[1]/header/div/div[1]/div[2]/div/form/div[2]/div[1]/input"
+SEARCH_BUTTON_XPATH = "//input[@id='nav-search-submit-button']"
+# for "Sarees for women" and for "Watches for men"
+PRODUCTS_XPATH = "//div[@class='a-section a-spacing-base']"
+# for "Mens formal shirts"
+# PRODUCTS_XPATH = "//div[@class='a-section a-spacing-base a-text-center']"
+NEXT_BUTTON_XPATH = "//a[@class='s-pagination-item s-pagination-next s-pagination-button s-pagination-button-accessibility s-pagination-separator']"
+
+
+@dataclass
+class ScraperConfig:
+    # upper bound for every condition based wait, the wait returns as soon as the condition holds
+    wait_timeout: float = float(os.getenv("SCRAPER_WAIT_TIMEOUT", "15"))
+    poll_frequency: float = 0.2
+    page_load_timeout: int = 30
+
+
+class ScrapeCheckpoint:
+    """
+    Per-keyword resume point stored next to the output csv.
+    Records the page and url to continue from, the rows already written
+    and the byte offset of the csv after the last fully written page.
+    """
+
+    def __init__(self, output_path: str, keyword: str):
+        self.path = output_path + ".checkpoint.json"
+        self.keyword = keyword
+        self.page = 1
+        self.url = None
+        self.rows = 0
+        self.offset = 0
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+        if state.get("keyword") != self.keyword:
+            logging.info(f"Ignoring checkpoint for a different keyword: {state.get('keyword')}")
+            return False
+
+        self.page = state["page"]
+        self.url = state["url"]
+        self.rows = state["rows"]
+        self.offset = state["offset"]
+        return True
+
+    def save(self, page: int, url: str, rows: int, offset: int):
+        self.page, self.url, self.rows, self.offset = page, url, rows, offset
+
+        # write to a temp file and rename so a crash never leaves a half written checkpoint
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"keyword": self.keyword,
+                       "page": page,
+                       "url": url,
+                       "rows": rows,
+                       "offset": offset}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def partial_path(output_path: str) -> str:
+    # rows are scraped into this file, the real csv is only replaced once a run completes
+    return output_path + ".partial"
+
+
+def open_output(output_path: str, checkpoint: ScrapeCheckpoint, resume: bool):
+    """
+    Open the partial csv of `output_path` for appending. When resuming, everything
+    written after the last checkpoint (a partially scraped page) is truncated away.
+    The last good `output_path` is left untouched until `publish_output`.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    path = partial_path(output_path)
+
+    if resume and os.path.exists(path):
+        f = open(path, "r+", encoding="utf-8", newline="")
+        f.truncate(checkpoint.offset)
+        f.seek(checkpoint.offset)
+        return f, csv.DictWriter(f, fieldnames=SCRAPER_COLUMNS)
+
+    f = open(path, "w", encoding="utf-8", newline="")
+    writer = csv.DictWriter(f, fieldnames=SCRAPER_COLUMNS)
+    writer.writeheader()
+    f.flush()
+    return f, writer
+
+
+def publish_output(output_path: str, checkpoint: ScrapeCheckpoint):
+    """Atomically replace `output_path` with the finished partial csv and drop the checkpoint."""
+    os.replace(partial_path(output_path), output_path)
+    checkpoint.clear()
+
+
+def wait_for_products(wait: WebDriverWait):
+    return wait.until(EC.presence_of_all_elements_located((By.XPATH, PRODUCTS_XPATH)))
+
+
+def parse_product(product) -> dict:
+    try:
+        brand_name = product.find_element(By.XPATH,".//h2[@class='a-size-mini s-line-clamp-1']//span").text
+    except:
+        brand_name = "na"
+
+    try:
+        product_name = product.find_element(By.XPATH, ".//h2[@class='a-size-base-plus a-spacing-none a-color-base a-text-normal']//span").text
+    except:
+        product_name = "na"
+
+    try:
+        # .text doesn't work because of unknown factors like css, therefore we use 'textContent'
+        rating_element = product.find_element(By.XPATH, ".//i[@data-cy='reviews-ratings-slot']//span")
+        rating = rating_element.get_attribute('textContent')
+    except:
+        rating = "na"
+
+    try:
+        rating_count = product.find_element(By.XPATH, ".//span[@class='a-size-base s-underline-text']").text
+    except:
+        rating_count = "na"
+
+    try:
+        selling_price_element = product.find_element(By.XPATH, ".//span[@class='a-price']//span[@class='a-offscreen']")
+        selling_price = selling_price_element.get_attribute('textContent')
+    except:
+        selling_price = "na"
+
+    try:
+        mrp = product.find_element(By.XPATH, ".//span[@class='a-price a-text-price']//span[@aria-hidden='true']").text
+    except:
+        mrp = "na"
+
+    try:
+        offer = product.find_element(By.XPATH, ".//div[@class='a-row']//span[contains(text(), '%')]").text
+    except:
+        offer = "na"
+
+    # try:
+    #     delivery_price = driver.find_element(By.XPATH, "/html/body/div[1]/div[1]/div[1]/div[1]/div/span[1]/div[1]/div[3]/div/div/div/div/span/div/div/div[2]/div[5]/div/div[2]/span/span[1]")
+    # except:
+    #     delivery_price = "na"
+
+    return {"Brand Name": brand_name,
+            "Product Name": product_name,
+            "Rating": rating,
+            "Rating Count": rating_count,
+            "Selling Price": selling_price,
+            "MRP": mrp,
+            "Offer": offer}
+            #"Delivery Price: ", delivery_price}
+
+
+def scrape_products(keyword:str, num_products:int, output_path:str, resume:bool = True) -> int:
+        """
+        Scrape search results for `keyword` and stream them into `output_path`.
+
+        Rows are appended page by page to `<output_path>.partial` and a checkpoint is
+        written after every page, so an interrupted run continues from the last completed
+        page when `resume` is set. The partial file replaces `output_path` only once the
+        run succeeds, a failed scrape keeps the previous dataset.
+        Returns the total number of rows in the output file.
+        """
+
         driver = None
         unique_user_data_dir = None
+        output_file = None
+        scraper_config = ScraperConfig()
 
         try:
+            checkpoint = ScrapeCheckpoint(output_path, keyword)
+            resuming = resume and os.path.exists(partial_path(output_path)) and checkpoint.load()
+
+            if resuming and checkpoint.rows >= num_products:
+                logging.info(f"Checkpoint for {keyword} already holds {checkpoint.rows} rows, nothing to scrape")
+                publish_output(output_path, checkpoint)
+                return checkpoint.rows
+
             is_airflow = os.getenv("IS_AIRFLOW", "false").lower() == 'true'
             logging.info(f"Running in {'Airflow' if is_airflow else 'local'} environment")
 
@@ -31,10 +214,10 @@ def scrape_products(keyword:str, num_products:int) -> pd.DataFrame:
 
             # Initializing chrome_options
             chrome_options = Options()
-            
+
             # configuration for airflow environment
             if is_airflow:
-                unique_user_data_dir = f"/tmp/chrome_user_data_{uuid.uuid4()}"         # Create unique temporary directory for this Chrome instance 
+                unique_user_data_dir = f"/tmp/chrome_user_data_{uuid.uuid4()}"         # Create unique temporary directory for this Chrome instance
                 os.makedirs(unique_user_data_dir, exist_ok=True)
 
                 chrome_options.add_argument(f"--user-data-dir={unique_user_data_dir}")
@@ -42,179 +225,147 @@ def scrape_products(keyword:str, num_products:int) -> pd.DataFrame:
                 chrome_options.add_argument('--headless=new')                          # scrape without a new Chrome window every time.
 
 
-            # configuration for both local and airflow environments 
+            # configuration for both local and airflow environments
             chrome_options.add_argument("--window-size=1920,1080")  # opening the new chrome window with maximum size
 
-            # initializing the driver 
+            # initializing the driver
             driver = webdriver.Chrome(service=Service(path), options=chrome_options)
-            
+
             # timeouts after driver initialization
-            driver.set_page_load_timeout(30)  # 30 seconds for page load
-            driver.implicitly_wait(10)        # 10 seconds for element finding
-            
+            driver.set_page_load_timeout(scraper_config.page_load_timeout)
+            # no implicit wait: a missing optional field (mrp, offer, ...) would otherwise block for
+            # the full implicit timeout on every product, explicit waits below cover page loads
+            driver.implicitly_wait(0)
+            wait = WebDriverWait(driver, scraper_config.wait_timeout, poll_frequency=scraper_config.poll_frequency)
+
             logging.info("Chrome driver initialized successfully")
-            
-            url = "https://www.amazon.in/"
-
-            try:
-                logging.info(f"Attempting to navigate to: {url}")
-                driver.get(url)
-                logging.info(f"Successfully navigated to: {driver.current_url}")
-            except Exception as nav_error:
-                print(f"Error navigating to URL: {nav_error}")
-                logging.error(f"Error navigating to URL: {nav_error}")
-                # Try alternative approach
-                driver.execute_script(f"window.location.href = '{url}';")
-                time.sleep(5)   
-
-            time.sleep(2)
-
-            # try:
-            #     # captcha handling
-            #     link = driver.find_element(By.XPATH, "//div[@class = 'a-row a-text-center']//img").get_attribute("src")    # <div class=a-row a-text-center>
-                
-            #     captcha = AmazonCaptcha.fromlink(link)
-            #     captcha_value = AmazonCaptcha.solve(captcha)
-
-            #     logging.info("Captcha found and bypassing...")
-
-            #     input_field = driver.find_element(By.ID, "captchacharacters")
-            #     input_field.send_keys(captcha_value)
-
-            #     continue_shopping = driver.find_element(By.CLASS_NAME, "a-button-text")
-            #     continue_shopping.click()
-            #     logging.info("Captcha bypassed successfully")
-
-            # except NoSuchElementException:
-            #     logging.info("No captcha found")
-
-            time.sleep(3)
-
-            # search product
-            #search_tab = driver.find_element(By.XPATH, "/html/body/div[1]/header/div/div[1]/div[2]/div/form/div[2]/div[1]/div/input")
-            search_tab = driver.find_element(By.XPATH, "/html/body/div[1]/header/div/div[1]/div[2]/div/form/div[2]/div[1]/input")
-            #search_tab = driver.find_element(By.XPATH, "/html/body/div[1]/header/div[1]/div[1]/div[2]/div/form/div[2]/div[1]/input")  
-                                                
-            search_tab.send_keys(keyword)
-            search_button = driver.find_element(By.XPATH, "//input[@id='nav-search-submit-button']")
-            search_button.click()
-            time.sleep(3)
-
-            data = []
-            current_page = 1
-
-            while len(data) < num_products:
+
+            output_file, writer = open_output(output_path, checkpoint, resuming)
+
+            if resuming:
+                logging.info(f"Resuming {keyword} from page {checkpoint.page} with {checkpoint.rows} rows already written")
+                driver.get(checkpoint.url)
+                current_page = checkpoint.page
+                total_rows = checkpoint.rows
+
+            else:
+                url = "https://www.amazon.in/"
+
+                try:
+                    logging.info(f"Attempting to navigate to: {url}")
+                    driver.get(url)
+                    logging.info(f"Successfully navigated to: {driver.current_url}")
+                except Exception as nav_error:
+                    print(f"Error navigating to URL: {nav_error}")
+                    logging.error(f"Error navigating to URL: {nav_error}")
+                    # Try alternative approach
+                    driver.execute_script(f"window.location.href = '{url}';")
+
+                # try:
+                #     # captcha handling
+                #     link = driver.find_element(By.XPATH, "//div[@class = 'a-row a-text-center']//img").get_attribute("src")    # <div class=a-row a-text-center>
+
+                #     captcha = AmazonCaptcha.fromlink(link)
+                #     captcha_value = AmazonCaptcha.solve(captcha)
+
+                #     logging.info("Captcha found and bypassing...")
+
+                #     input_field = driver.find_element(By.ID, "captchacharacters")
+                #     input_field.send_keys(captcha_value)
+
+                #     continue_shopping = driver.find_element(By.CLASS_NAME, "a-button-text")
+                #     continue_shopping.click()
+                #     logging.info("Captcha bypassed successfully")
+
+                # except NoSuchElementException:
+                #     logging.info("No captcha found")
+
+                # search product
+                #search_tab = driver.find_element(By.XPATH, "/html/body/div[1]/header/div/div[1]/div[2]/div/form/div[2]/div[1]/div/input")
+                search_tab = wait.until(EC.element_to_be_clickable((By.XPATH, SEARCH_BOX_XPATH)))
+                #search_tab = driver.find_element(By.XPATH, "/html/body/div[1]/header/div[1]/div[1]/div[2]/div/form/div[2]/div[1]/input")
+
+                search_tab.send_keys(keyword)
+                search_button = driver.find_element(By.XPATH, SEARCH_BUTTON_XPATH)
+                search_button.click()
+
+                current_page = 1
+                total_rows = 0
+
+            wait_for_products(wait)
+            if not resuming:
+                checkpoint.save(page=current_page, url=driver.current_url, rows=total_rows, offset=output_file.tell())
+
+            while total_rows < num_products:
 
                 logging.info(f"Scraping page {current_page}")
 
-                # for "Mens formal shirts"
-                #products = driver.find_elements(By.XPATH, "//div[@class='a-section a-spacing-base a-text-center']")
-                
-                # for "Sarees for women" and for "Watches for men"
-                products = driver.find_elements(By.XPATH, "//div[@class='a-section a-spacing-base']")
+                products = driver.find_elements(By.XPATH, PRODUCTS_XPATH)
                 logging.info(f"Number of products found on page {current_page}: {len(products)}")
 
-                # iterating through each products 
-                # for i in range(len(products)):
-                #     print(f"Scraping product {i+1} on page {current_page}")
-                #     product = products[i] 
-
+                # only one page of rows is held in memory at a time
+                page_rows = []
                 for product in products:
-                    total_scraped = len(data)+1
-                    logging.info(f"Scraping product {total_scraped} on page {current_page}")
-
-                    try:
-                        brand_name = product.find_element(By.XPATH,".//h2[@class='a-size-mini s-line-clamp-1']//span").text
-                    except:
-                        brand_name = "na"
-                    
-                    try:   
-                        product_name = product.find_element(By.XPATH, ".//h2[@class='a-size-base-plus a-spacing-none a-color-base a-text-normal']//span").text
-                    except:
-                        product_name = "na"
-                        
-                    try:
-                        # .text doesn't work because of unknown factors like css, therefore we use 'textContent'
-                        rating_element = product.find_element(By.XPATH, ".//i[@data-cy='reviews-ratings-slot']//span")
-                        rating = rating_element.get_attribute('textContent')
-                    except:
-                        rating = "na"
-
-                    try: 
-                        rating_count = product.find_element(By.XPATH, ".//span[@class='a-size-base s-underline-text']").text
-                    except:
-                        rating_count = "na"
-
-                    try: 
-                        selling_price_element = product.find_element(By.XPATH, ".//span[@class='a-price']//span[@class='a-offscreen']")
-                        selling_price = selling_price_element.get_attribute('textContent')
-                    except:
-                        selling_price = "na"
-                    
-                    try: 
-                        mrp = product.find_element(By.XPATH, ".//span[@class='a-price a-text-price']//span[@aria-hidden='true']").text
-                    except:
-                        mrp = "na"
-
-                    try: 
-                        offer = product.find_element(By.XPATH, ".//div[@class='a-row']//span[contains(text(), '%')]").text
-                    except:
-                        offer = "na"
-                    
-                    # try:
-                    #     delivery_price = driver.find_element(By.XPATH, "/html/body/div[1]/div[1]/div[1]/div[1]/div/span[1]/div[1]/div[3]/div/div/div/div/span/div/div/div[2]/div[5]/div/div[2]/span/span[1]")
-                    # except:
-                    #     delivery_price = "na"
-
-
-                    data.append({"Brand Name": brand_name,
-                                "Product Name": product_name,
-                                "Rating": rating,
-                                "Rating Count": rating_count,
-                                "Selling Price": selling_price,
-                                "MRP": mrp,
-                                "Offer": offer})
-                                #"Delivery Price: ", delivery_price})
-                
-                    # Break out of the loop if the desired number of products is reached
-                    if len(data) == num_products:
-                        #break
-                        df = pd.DataFrame(data)
-                        return df                       # Immediately exits the entire function if condition is met
+                    page_rows.append(parse_product(product))
+
+                    # stop at the desired number of products
+                    if total_rows + len(page_rows) == num_products:
+                        break
+
+                writer.writerows(page_rows)
+                output_file.flush()
+                total_rows += len(page_rows)
+                logging.info(f"Written {len(page_rows)} rows from page {current_page}, total: {total_rows}")
+
+                if total_rows >= num_products:
+                    break
 
                 # Click the "Next" button to go to the next page if the desired number of products isn't reached
-                time.sleep(3)
                 try:
-                    next_button = driver.find_element(By.XPATH, "//a[@class='s-pagination-item s-pagination-next s-pagination-button s-pagination-button-accessibility s-pagination-separator']")
-                    next_button.click()
-                    current_page += 1
-                    logging.info(f"Moving to next page: {current_page}")
-                    time.sleep(3)  
-                    
+                    next_button = driver.find_element(By.XPATH, NEXT_BUTTON_XPATH)
                 except NoSuchElementException:
                     logging.info("No next page found. Ending scrape.")
-                    break 
-                    
-            df = pd.DataFrame(data)
-            return df 
-        
+                    break
+
+                next_button.click()
+                try:
+                    # the old result list goes stale once the next page replaces it
+                    if products:
+                        wait.until(EC.staleness_of(products[0]))
+                    wait_for_products(wait)
+                except TimeoutException:
+                    logging.info(f"Next page did not load within {scraper_config.wait_timeout}s. Ending scrape.")
+                    break
+
+                current_page += 1
+                logging.info(f"Moving to next page: {current_page}")
+                checkpoint.save(page=current_page, url=driver.current_url, rows=total_rows, offset=output_file.tell())
+
+            output_file.close()
+            output_file = None
+            publish_output(output_path, checkpoint)
+            return total_rows
+
         except Exception as e:
             print(f"Error in scrape_products: {e}")
             raise Custom_exception(e, sys)
 
         finally:
-            # quit driver 
+            if output_file is not None:
+                output_file.close()
+
+            # quit driver
             if driver is not None:
                 try:
                     driver.quit()
                     logging.info("Chrome driver closed successfully")
                 except Exception as cleanup_error:
                     logging.error(f"Error closing driver: {cleanup_error}")
-            
+
             # Clean up temporary directory
             if unique_user_data_dir and os.path.exists(unique_user_data_dir):
                 try:
                     shutil.rmtree(unique_user_data_dir, ignore_errors=True)
                     logging.info("Temporary directory cleaned up")
                 except Exception as cleanup_error:
-                    logging.info(f"Error cleaning temp directory: {cleanup_error}")
\ No newline at end of file
+                    logging.info(f"Error cleaning temp directory: {cleanup_error}")
@@ -0,0 +1,110 @@
+import os
+import re
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from src.utils.catalog_utils import CATEGORY_PATTERNS, normalize_question
+from src.utils.logger import logging
+
+
+# search one shard by query vector: (vector, k) -> [(document, cosine similarity)]
+ShardSearch = Callable[[List[float], int], List[Tuple[Document, float]]]
+
+
+class CategoryRouter:
+    """
+    Decide which category shards a query should search: explicit keyword
+    rules first, then similarity to each shard's embedding centroid. When
+    no shard is a clear winner every shard is searched.
+    """
+
+    def __init__(self, centroids: Dict[str, List[float]], margin: float = 0.05):
+        self.categories = list(centroids)
+        matrix = np.asarray([centroids[c] for c in self.categories], dtype=np.float32)
+        self.centroids = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.margin = margin
+        self.patterns = {c: re.compile(p) for c, p in CATEGORY_PATTERNS.items() if c in centroids}
+
+
+    @staticmethod
+    def build(shard_vectors: Dict[str, np.ndarray]) -> Dict[str, List[float]]:
+        centroids = {}
+        for category, vectors in shard_vectors.items():
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            centroids[category] = vectors.mean(axis=0).tolist()
+        return centroids
+
+
+    @staticmethod
+    def save(path: str, centroids: Dict[str, List[float]], sizes: Dict[str, int]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"centroids": centroids, "sizes": sizes}, f)
+
+
+    @classmethod
+    def load(cls, path: str, margin: float = 0.05) -> "CategoryRouter":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["centroids"], margin=margin)
+
+
+    def route(self, query: str, vector: List[float]) -> List[str]:
+        if len(self.categories) == 1:
+            return self.categories
+
+        text = normalize_question(query)
+        matched = [c for c, pattern in self.patterns.items() if pattern.search(text)]
+        if matched:
+            return matched
+
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = self.centroids @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+        order = np.argsort(-scores)
+        if scores[order[0]] - scores[order[1]] >= self.margin:
+            return [self.categories[order[0]]]
+
+        # ambiguous: fall back to every shard
+        return self.categories
+
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Retriever over one index shard per catalog category. The query is embedded
+    once, routed to the relevant shard(s), and the merged hits are filtered with
+    the same relevance threshold the single-index retriever used. Without a
+    router every shard is searched.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    shards: Dict[str, ShardSearch]
+    router: Optional[CategoryRouter] = None
+    k: int = 5
+    score_threshold: float = 0.7
+
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # errors propagate unchanged so deadline and breaker errors keep their type
+        vector = self.embeddings.embed_query(query)
+        routed = self.router.route(query, vector) if self.router is not None else []
+        categories = [c for c in routed if c in self.shards] or list(self.shards)
+        logging.info(f"Routing query to shards: {categories}")
+
+        hits = []
+        for category in categories:
+            hits.extend(self.shards[category](vector, self.k))
+
+        # cosine similarity -> [0, 1] relevance, as the Pinecone store reports it
+        hits = [(doc, (score + 1) / 2) for doc, score in hits]
+        hits = [(doc, relevance) for doc, relevance in hits if relevance >= self.score_threshold]
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return [doc for doc, _ in hits[:self.k]]
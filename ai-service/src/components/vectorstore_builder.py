@@ -1,7 +1,8 @@
 import os 
 import sys 
 import time
-from typing import List
+import json
+from typing import Dict, List, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -10,8 +11,14 @@ from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
-from langchain_core.documents import Document
-
+import numpy as np
+
+from src.components.ann_index import IVFQuantizedIndex, LocalANNVectorStore
+from src.components.catalog_store import CompactCatalog
+from src.components.sharded_retriever import CategoryRouter
+from src.utils.catalog_utils import CATEGORY_COLUMN
+from src.utils.minhash import normalize_text, text_hash
+from src.utils.local_embeddings import get_local_embeddings
 from src.utils.logger import logging
 from src.utils.exception import Custom_exception
 from dotenv import load_dotenv
@@ -31,6 +38,17 @@ class VectorStoreBuilderConfig:
         _current_dir = Path(__file__).parent.parent.parent
         path = str(_current_dir / "artifacts" / "data_cleaned.csv")
 
+    # "pinecone", "local" (IVF + int8 index on disk) or "both"
+    backend = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+    embeddings_backend = os.getenv("EMBEDDINGS_BACKEND", "hf_endpoint").lower()
+    ann_index_path = os.getenv("ANN_INDEX_PATH", str(Path(path).parent / "ann_index"))
+    # per category centroids used by the query router
+    router_path = os.getenv("CATEGORY_ROUTER_PATH", str(Path(path).parent / "category_router.json"))
+    centroid_path = str(Path(path).parent / "centroids")
+    index_name = "rough"
+    embedding_batch_size = 256
+    upsert_batch_size = 100
+
 class VectorStoreBuilder:
     """
     Load data 
@@ -43,22 +61,28 @@ class VectorStoreBuilder:
         
         self.nvidia_api_key = os.getenv("NVIDIA_API_KEY")
         self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        if  not self.pinecone_api_key:
+        if self.vectorstore_builder_config.backend != "local" and not self.pinecone_api_key:
             raise ValueError("Required API keys not set")
 
 
 
-    def load_data(self, data_path: str) -> List[Document]:
+    def load_data(self, data_path: str) -> CompactCatalog:
         try:
             logging.info(f"Loading data from {data_path}")
+            with open(data_path, "r", encoding="utf-8") as f:
+                has_category = CATEGORY_COLUMN in f.readline()
+
             loader = CSVLoader(file_path=data_path,
                                encoding="utf-8",
                                 csv_args={"delimiter": ",",
-                                          "quotechar": '"'})
-            docs = loader.load()
-
-            logging.info(f"Sample data: {docs[:5]}")
-            logging.info(f"Successfully loaded {len(docs)} documents.")
+                                          "quotechar": '"'},
+                               # category also goes into metadata so documents can be sharded
+                               metadata_columns=[CATEGORY_COLUMN] if has_category else ())
+            # rows are streamed into the compact catalog, no Document list is kept
+            docs = CompactCatalog.from_documents(loader.lazy_load())
+
+            logging.info(f"Sample data: {docs.documents(range(min(5, len(docs))))}")
+            logging.info(f"Successfully loaded {len(docs)} documents ({docs.memory_bytes()} bytes).")
             return docs 
         
         except Exception as e:
@@ -86,6 +110,10 @@ class VectorStoreBuilder:
 
     def create_embeddings(self) -> HuggingFaceEndpointEmbeddings:
         try: 
+            if self.vectorstore_builder_config.embeddings_backend == "local":
+                logging.info("Initializing local ONNX BGE Embeddings.")
+                return get_local_embeddings()
+
             logging.info("Initializing HF BGE Embeddings.")
             embeddings = HuggingFaceEndpointEmbeddings(
                 model="BAAI/bge-small-en-v1.5",
@@ -115,33 +143,95 @@ class VectorStoreBuilder:
 
 
 
-    def create_vector_store(self, documents: List[Document], 
+    def embed_documents(self, documents: CompactCatalog, 
+                        embeddings: HuggingFaceEndpointEmbeddings) -> np.ndarray:
+        try:
+            logging.info(f"Embedding {len(documents)} documents")
+            batch_size = self.vectorstore_builder_config.embedding_batch_size
+
+            vectors = []
+            for start in range(0, len(documents), batch_size):
+                vectors.extend(embeddings.embed_documents(documents.texts(start, start + batch_size)))
+            return np.asarray(vectors, dtype=np.float32)
+
+        except Exception as e:
+            logging.error(f"Error embedding documents: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+    def split_shards(self, documents: CompactCatalog, 
+                     vectors: np.ndarray) -> Dict[str, Tuple[CompactCatalog, np.ndarray]]:
+        # one shard per products_config category, a single "all" shard for catalogs without categories
+        shards = {category: (documents.subset(rows), vectors[rows])
+                  for category, rows in documents.category_rows().items()}
+        logging.info(f"Shard sizes: { {c: len(d) for c, (d, _) in shards.items()} }")
+        return shards
+
+
+
+    @staticmethod
+    def record_id(category: str, text: str) -> str:
+        """
+        Stable Pinecone id: the normalized Brand + Product Name (the dedup key),
+        or the whole row text for products without a name. Row positions shift
+        whenever the catalog changes and would map ids onto other products.
+        """
+        fields = dict(line.split(": ", 1) for line in text.splitlines() if ": " in line)
+        name = fields.get("Product Name", "").strip()
+        key = normalize_text(f"{fields.get('Brand Name', '')} {name}") if name and name.lower() != "na" else text
+        return f"{category}-{text_hash(key)}"
+
+
+
+    def create_vector_store(self, shards: Dict[str, Tuple[CompactCatalog, np.ndarray]], 
                             embeddings: HuggingFaceEndpointEmbeddings, 
                             index_name: str = 'rough') -> PineconeVectorStore: # ecommerce-chatbot-project
         try:
             logging.info(f"Connecting to Pinecone and creating index: {index_name}")
             pc = Pinecone(api_key=self.pinecone_api_key)
 
-            pc.create_index(name=index_name,
-                             dimension = 384,    # 4096,   384 
-                             metric="cosine",
-                             spec=ServerlessSpec(cloud="aws",region="us-east-1"))
-            
-            time.sleep(10)
+            if index_name not in pc.list_indexes().names():
+                pc.create_index(name=index_name,
+                                 dimension = 384,    # 4096,   384 
+                                 metric="cosine",
+                                 spec=ServerlessSpec(cloud="aws",region="us-east-1"))
+                time.sleep(10)
+
             index = pc.Index(index_name)
-            time.sleep(10)
 
             initial_stats = index.describe_index_stats()
             logging.info(f"Index status before uploading: {initial_stats}")
 
-            vector_store = PineconeVectorStore.from_documents(documents=documents,
-                                                              index_name=index_name, 
-                                                              embedding = embeddings)
-            
+            # one namespace per category shard, in the record layout PineconeVectorStore reads ("text" key)
+            batch_size = self.vectorstore_builder_config.upsert_batch_size
+            for category, (documents, vectors) in shards.items():
+                # upsert over the live namespace first (record ids are stable, so unchanged products are
+                # overwritten in place), then drop only the ids the rebuilt shard no longer has; readers
+                # never see an empty namespace and a failed upload leaves the previous shard complete
+                live = set()
+                for start in range(0, len(documents), batch_size):
+                    # texts() decompresses each block once instead of once per row
+                    texts = documents.texts(start, start + batch_size)
+                    records = [(self.record_id(category, text), vectors[i].tolist(),
+                                {**documents.metadata(i), "text": text})
+                               for i, text in enumerate(texts, start=start)]
+                    index.upsert(vectors=records, namespace=category)
+                    live.update(record_id for record_id, _, _ in records)
+
+                stale = [record_id for page in index.list(namespace=category)
+                         for record_id in page if record_id not in live]
+                for start in range(0, len(stale), 1000):    # pinecone deletes at most 1000 ids per call
+                    index.delete(ids=stale[start:start + 1000], namespace=category)
+                if stale:
+                    logging.info(f"Deleted {len(stale)} stale vectors from namespace: {category}")
+                logging.info(f"Uploaded {len(documents)} vectors to namespace: {category}")
+
             final_stats = index.describe_index_stats()
             logging.info(f"Index status after uploading: {final_stats}")
 
-            logging.info(f"Successfully created vector store with {len(documents)} documents")
+            vector_store = PineconeVectorStore(index_name=index_name, embedding=embeddings)
+            logging.info(f"Successfully created vector store with {sum(len(d) for d, _ in shards.values())} documents")
             return vector_store
         
         except Exception as e:
@@ -150,13 +240,109 @@ class VectorStoreBuilder:
         
 
 
-    def run_pipeline(self) -> PineconeVectorStore:
+    def create_local_index(self, documents: CompactCatalog, 
+                           vectors: np.ndarray,
+                           embeddings: HuggingFaceEndpointEmbeddings, 
+                           index_path: str) -> LocalANNVectorStore:
+        try:
+            logging.info(f"Building local ANN index at: {index_path}")
+
+            index = IVFQuantizedIndex().build(vectors)
+            recall = index.measure_recall(vectors, k=5)
+            memory = index.memory_bytes()
+            logging.info(f"Local ANN index: {index.size} vectors, {index.nlist} lists, nprobe={index.nprobe}, "
+                         f"recall vs exact search: {recall}")
+            logging.info(f"Local ANN resident vectors: {memory['int8_codes']} bytes int8 "
+                         f"(float32 would be {memory['float32_equivalent']} bytes)")
+
+            vector_store = LocalANNVectorStore(index, documents, embeddings)
+            vector_store.save(index_path)
+            return vector_store
+
+        except Exception as e:
+            logging.error(f"Error creating local ANN index: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+    def save_centroid(self, category: str, vectors: np.ndarray):
+        os.makedirs(self.vectorstore_builder_config.centroid_path, exist_ok=True)
+        centroid = CategoryRouter.build({category: vectors})[category]
+        with open(os.path.join(self.vectorstore_builder_config.centroid_path, f"{category}.json"), "w", encoding="utf-8") as f:
+            json.dump({"centroid": centroid, "size": len(vectors)}, f)
+
+
+
+    def build_router(self, categories: List[str]):
+        """Assemble the query router from the centroids saved by run_category."""
+        try:
+            centroids, sizes = {}, {}
+            for category in categories:
+                with open(os.path.join(self.vectorstore_builder_config.centroid_path, f"{category}.json"), "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                centroids[category], sizes[category] = saved["centroid"], saved["size"]
+
+            CategoryRouter.save(self.vectorstore_builder_config.router_path, centroids, sizes)
+            logging.info(f"Saved category router for {categories} to {self.vectorstore_builder_config.router_path}")
+
+        except Exception as e:
+            logging.error(f"Error building category router: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+    def run_category(self, category: str, data_path: str):
+        """
+        Rebuild the shard of a single category from its cleaned slice, leaving
+        the other shards untouched. Used by the pipeline DAG.
+        """
+        try:
+            logging.info(f"Starting vectorstore pipeline for category: {category}")
+            config = self.vectorstore_builder_config
+            docs = self.load_data(data_path)
+            embeddings = self.create_embeddings()
+
+            vectors = self.embed_documents(docs, embeddings)
+            shards = {category: (docs, vectors)}
+            self.save_centroid(category, vectors)
+
+            if config.backend in ("local", "both"):
+                vector_store = self.create_local_index(docs, vectors, embeddings,
+                                                       os.path.join(config.ann_index_path, category))
+            if config.backend != "local":
+                vector_store = self.create_vector_store(shards, embeddings, config.index_name)
+
+            logging.info(f"Vectorstore pipeline completed for category: {category}")
+            return vector_store
+
+        except Exception as e:
+            logging.error(f"Error in pipeline execution for {category}: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
+    def run_pipeline(self):
         try:
             logging.info("Starting vectorstore pipeline")
-            docs = self.load_data(self.vectorstore_builder_config.path)
+            config = self.vectorstore_builder_config
+            docs = self.load_data(config.path)
             embeddings = self.create_embeddings()
             self.test_embeddings(embeddings)
-            vector_store = self.create_vector_store(docs, embeddings)
+
+            vectors = self.embed_documents(docs, embeddings)
+            shards = self.split_shards(docs, vectors)
+
+            CategoryRouter.save(config.router_path,
+                                CategoryRouter.build({c: v for c, (_, v) in shards.items()}),
+                                {c: len(d) for c, (d, _) in shards.items()})
+            logging.info(f"Saved category router to {config.router_path}")
+
+            if config.backend in ("local", "both"):
+                for category, (shard_docs, shard_vectors) in shards.items():
+                    vector_store = self.create_local_index(shard_docs, shard_vectors, embeddings,
+                                                           os.path.join(config.ann_index_path, category))
+            if config.backend != "local":
+                vector_store = self.create_vector_store(shards, embeddings, config.index_name)
 
             logging.info("Vectorstore pipeline completed successfully")
             return vector_store
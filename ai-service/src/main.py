@@ -2,10 +2,8 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from src.components.data_collection import DataCollection
-from src.components.data_cleaning import DataCleaner
-from src.components.vectorstore_builder import VectorStoreBuilder
-from src.components.chatbot_builder import ChatbotBuilder
+from src.components.pipeline_stages import PipelineConfig, build_tasks
+from src.utils.pipeline_runner import LocalDAGRunner
 
 from src.utils.logger import logging
 from src.utils.exception import Custom_exception
@@ -15,20 +13,16 @@ load_dotenv()
 
 def main():
     try:    
-        data_cleaner = DataCleaner()
-        data_cleaner.clean_data()
+        # same stages as the Airflow DAG (without scraping), unchanged stages are skipped
+        results = LocalDAGRunner(build_tasks(scrape=False), max_workers=PipelineConfig.max_workers).run()
 
-        vectorstore_builder = VectorStoreBuilder()
-        vector_store = vectorstore_builder.run_pipeline()
+        for name, result in results.items():
+            logging.info(f"Stage {name}: {result['state']} ({result.get('outcome', '-')}) in {result['seconds']}s")
+            print(f"{name}: {result['state']} ({result.get('outcome', '-')}) in {result['seconds']}s")
 
-        chatbot_builder = ChatbotBuilder()
-        chatbot = chatbot_builder.build_chatbot(vector_store)
-
-        # test code
-        test_response = chatbot.invoke({"input": "What do you do?"})
-
-        logging.info(f"Test Response: {test_response}")
-        print("Test response: ", test_response)
+        failed = [name for name, result in results.items() if result["state"] != "success"]
+        if failed:
+            raise Exception(f"Pipeline stages did not succeed: {failed}")
 
     except Exception as e:
         raise Custom_exception(e, sys)
@@ -0,0 +1,311 @@
+import os
+import time
+import heapq
+import tempfile
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # windows, the limit stays per process
+    fcntl = None
+
+from src.utils.logger import logging
+
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+
+@dataclass
+class AdmissionConfig:
+    # per worker limits for concurrent LLM calls (gunicorn gthread workers run several requests at once)
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    max_queue = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    max_queue_seconds = float(os.getenv("LLM_MAX_QUEUE_SECONDS", "5"))
+
+    # limit shared by every process using the same slot directory (web workers and Kafka chat workers), 0 = off
+    host_concurrency = int(os.getenv("LLM_HOST_CONCURRENCY", "0"))
+    # host slots batch traffic may never take, so interactive requests always find one
+    host_reserved_interactive = int(os.getenv("LLM_HOST_RESERVED_INTERACTIVE", "2"))
+    slot_dir = os.getenv("LLM_SLOT_DIR", os.path.join(tempfile.gettempdir(), "llm_slots"))
+
+
+class Overloaded(RuntimeError):
+    """The queue is full, the request is shed immediately."""
+
+
+class QueueTimeout(TimeoutError):
+    """The request waited longer than allowed for an LLM slot."""
+
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority", default=BATCH)
+
+
+@contextmanager
+def request_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class HostSlots:
+    """
+    Concurrency limit across processes: `slots` lock files in a shared
+    directory, a call holds an flock on one of them. The first
+    `reserved_interactive` slots are never given to batch traffic. A crashed
+    process releases its slot with its file descriptors.
+    """
+
+    def __init__(self, lock_dir: str, slots: int, reserved_interactive: int = 0, poll_interval: float = 0.02):
+        self.lock_dir = lock_dir
+        self.slots = slots
+        self.reserved_interactive = min(reserved_interactive, slots - 1)
+        self.poll_interval = poll_interval
+        os.makedirs(lock_dir, exist_ok=True)
+
+
+    def acquire(self, priority: int, timeout: float):
+        """An open, locked slot file, QueueTimeout when none frees up in time."""
+        first = 0 if priority == INTERACTIVE else self.reserved_interactive
+        deadline = time.monotonic() + max(timeout, 0.0)
+        while True:
+            for slot in range(first, self.slots):
+                f = open(os.path.join(self.lock_dir, f"slot_{slot}.lock"), "a+")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except BlockingIOError:
+                    f.close()
+            if time.monotonic() > deadline:
+                raise QueueTimeout(f"No free host-wide LLM slot within {timeout:.2f}s")
+            time.sleep(self.poll_interval)
+
+
+    @staticmethod
+    def release(handle):
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+
+
+class _Waiter:
+    __slots__ = ("priority", "event", "state")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.event = threading.Event()
+        self.state = "waiting"
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a priority queue in front of it. Interactive
+    requests are admitted before batch ones, a full queue sheds the newest
+    lowest-priority request, and waiting is capped by a queue-time limit.
+    A released slot is handed directly to the next waiter so late arrivals
+    cannot barge ahead of the queue. With `host_slots` an admitted request
+    also takes one of the slots shared with the other processes.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_seconds: float, window: int = 1000,
+                 host_slots: Optional[HostSlots] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.host_slots = host_slots
+
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._waiting = 0
+
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self.rejected = {p: 0 for p in PRIORITY_NAMES}
+        self.timed_out = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: deque(maxlen=window) for p in PRIORITY_NAMES}
+
+
+    def _evict_lowest(self, priority: int) -> bool:
+        """Drop the newest waiter of a lower priority than `priority` to make room; True when one was dropped."""
+        worst = None
+        for entry in self._heap:
+            if entry[2].state == "waiting" and (worst is None or entry[:2] > worst[:2]):
+                worst = entry
+        if worst is None or worst[0] <= priority:
+            return False
+
+        worst[2].state = "rejected"
+        worst[2].event.set()
+        self._waiting -= 1
+        return True
+
+
+    def acquire(self, priority: int = None, timeout: Optional[float] = None):
+        """Wait for a slot; returns the token to pass to `release`."""
+        priority = _priority.get() if priority is None else priority
+        timeout = self.max_queue_seconds if timeout is None else min(timeout, self.max_queue_seconds)
+        start = time.monotonic()
+        self._acquire_local(priority, timeout, start)
+        if self.host_slots is None:
+            return None
+
+        try:
+            return self.host_slots.acquire(priority, timeout - (time.monotonic() - start))
+        except QueueTimeout:
+            with self._lock:
+                self.timed_out[priority] += 1
+            self._release_local()
+            raise
+
+
+    def _acquire_local(self, priority: int, timeout: float, start: float):
+        with self._lock:
+            if self._in_flight < self.max_concurrency and self._waiting == 0:
+                self._in_flight += 1
+                self.admitted[priority] += 1
+                self._waits[priority].append(0.0)
+                return
+
+            if self._waiting >= self.max_queue and not self._evict_lowest(priority):
+                self.rejected[priority] += 1
+                raise Overloaded(f"LLM queue is full ({self._waiting} waiting)")
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+            self._waiting += 1
+
+        waiter.event.wait(max(timeout, 0.0))
+
+        with self._lock:
+            waited = time.monotonic() - start
+            if waiter.state == "admitted":
+                self.admitted[priority] += 1
+                self._waits[priority].append(waited)
+                return
+
+            if waiter.state == "rejected":
+                self.rejected[priority] += 1
+                raise Overloaded("Shed from the LLM queue by higher priority traffic")
+
+            # still waiting: give up, the heap entry is skipped lazily on release
+            waiter.state = "cancelled"
+            self._waiting -= 1
+            self.timed_out[priority] += 1
+            raise QueueTimeout(f"Waited {waited:.2f}s for an LLM slot")
+
+
+    def release(self, token=None):
+        if token is not None:
+            self.host_slots.release(token)
+        self._release_local()
+
+
+    def _release_local(self):
+        with self._lock:
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.state == "waiting":
+                    # hand the slot over, in-flight count stays the same
+                    waiter.state = "admitted"
+                    self._waiting -= 1
+                    waiter.event.set()
+                    return
+            self._in_flight -= 1
+
+
+    @contextmanager
+    def slot(self, priority: int = None, timeout: Optional[float] = None):
+        """
+        Yields `hold(fn)`: a wrapper that keeps the slot until fn returns, even
+        when the caller stops waiting for it (a timed out call still running on
+        a stage thread). If the wrapped fn never started when the block exits,
+        the slot is released there and a late start does not run fn.
+        """
+        token = self.acquire(priority, timeout)
+        lock = threading.Lock()
+        state = {"started": False, "released": False}
+
+        def release_once():
+            with lock:
+                if state["released"]:
+                    return
+                state["released"] = True
+            self.release(token)
+
+        def hold(fn: Callable[[], Any]) -> Callable[[], Any]:
+            def run():
+                with lock:
+                    if state["released"]:
+                        raise QueueTimeout("LLM slot was given up before the call started")
+                    state["started"] = True
+                try:
+                    return fn()
+                finally:
+                    release_once()
+            return run
+
+        try:
+            yield hold
+        finally:
+            with lock:
+                started = state["started"]
+            if not started:
+                release_once()
+
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"in_flight": self._in_flight,
+                     "queue_depth": self._waiting,
+                     "max_concurrency": self.max_concurrency,
+                     "max_queue": self.max_queue,
+                     "host_concurrency": self.host_slots.slots if self.host_slots else None}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = list(self._waits[priority])
+                stats[name] = {"admitted": self.admitted[priority],
+                               "rejected": self.rejected[priority],
+                               "queue_timeouts": self.timed_out[priority],
+                               "wait_ms_p50": round(1000 * self._percentile(waits, 0.50), 2),
+                               "wait_ms_p95": round(1000 * self._percentile(waits, 0.95), 2),
+                               "wait_ms_p99": round(1000 * self._percentile(waits, 0.99), 2)}
+            return stats
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            config = AdmissionConfig()
+            host_slots = None
+            if config.host_concurrency > 0 and fcntl is not None:
+                host_slots = HostSlots(config.slot_dir, config.host_concurrency, config.host_reserved_interactive)
+            _controller = AdmissionController(config.max_concurrency, config.max_queue, config.max_queue_seconds,
+                                              host_slots=host_slots)
+            logging.info(f"LLM admission control: concurrency={config.max_concurrency}, "
+                         f"queue={config.max_queue}, max queue time={config.max_queue_seconds}s, "
+                         f"host concurrency={config.host_concurrency or 'off'} ({config.slot_dir})")
+        return _controller
@@ -0,0 +1,52 @@
+import re
+import os
+
+import pandas as pd
+from pandas import DataFrame
+
+
+CATEGORY_COLUMN = "Category"
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+
+# keyword rules that tie a question to a catalog category (keys match category_from_file names)
+CATEGORY_PATTERNS = {
+    "shirts": r"\bshirts?\b",
+    "sarees": r"\b(sarees?|saris?)\b",
+    "watches": r"\bwatch(es)?\b",
+}
+
+
+def category_from_file(file_name: str) -> str:
+    """data_sarees.csv -> sarees"""
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    return name[len("data_"):] if name.startswith("data_") else name
+
+
+def parse_number(series: pd.Series, pattern: str = _NUMBER) -> pd.Series:
+    """Extract the first number from scraped strings like '₹1,695', '2,360', '4.2 out of 5 stars' or '(15% off)'."""
+    cleaned = series.astype(str).str.replace(",", "", regex=False)
+    return pd.to_numeric(cleaned.str.extract(pattern, expand=False), errors="coerce")
+
+
+def numeric_catalog(df: DataFrame) -> DataFrame:
+    """
+    Numeric view of the scraped catalog: price, mrp, rating, rating count and discount.
+    The discount falls back to (mrp - price) / mrp when the offer text is missing.
+    """
+    out = pd.DataFrame(index=df.index)
+    out["price"] = parse_number(df["Selling Price"])
+    out["mrp"] = parse_number(df["MRP"])
+    out["rating"] = parse_number(df["Rating"])
+    out["rating_count"] = parse_number(df["Rating Count"])
+
+    offer = parse_number(df["Offer"], pattern=r"(\d+(?:\.\d+)?)\s*%")
+    computed = ((out["mrp"] - out["price"]) / out["mrp"] * 100).round()
+    out["discount"] = offer.fillna(computed.where(out["mrp"] > out["price"]))
+    return out
+
+
+def normalize_question(text: str) -> str:
+    # apostrophes are dropped rather than split on, "what's" -> "whats" and not "what s"
+    text = re.sub(r"['’]", "", str(text).lower())
+    return " ".join(re.sub(r"[^a-z0-9₹ ]+", " ", text).split())
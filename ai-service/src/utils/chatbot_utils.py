@@ -1,6 +1,7 @@
 import os 
 import sys
-from typing import Any
+import threading
+from typing import Any, List, Optional, Sequence
 
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_groq import ChatGroq
@@ -8,29 +9,67 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_classic.chains import create_retrieval_chain
+from langchain_core.documents import Document
 
+from pinecone import Pinecone
 from langchain_pinecone import PineconeVectorStore
-from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from src.components.ann_index import LocalANNVectorStore
+from src.components.sharded_retriever import CategoryRouter, ShardedRetriever
+from src.components.catalog_aggregates import CatalogAggregates
+from src.components.recommendation_builder import Recommender
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
+from src.utils.local_embeddings import get_local_embeddings
+from src.utils.micro_batching import BatchedEmbeddings, QueryBatchingConfig
 from src.utils.logger import logging
 from src.utils.exception import Custom_exception
+from src.utils.catalog_utils import normalize_question
+from src.utils.request_coalescing import SingleFlight, default_lock_dir
+from src.utils.history_compaction import CompactingChatMessageHistory, HistoryCompactionConfig
+from src.utils.admission import get_admission_controller, QueueTimeout
+from src.utils.resilience import (DeadlineConfig, DeadlineEmbeddings, DeadlineExceeded, CircuitOpen,
+                                  call_upstream, remaining)
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+DEFAULT_SYSTEM_PROMPT = """You are a helpful assistant.
+
+            Use only the provided context:
+            {context}
+            """
+
+
 class BuildRetrievalchain:
 
+    def __init__(self, release: dict = None):
+        # a published release (see hot_reload) overrides index paths and retriever / prompt settings
+        release = release or {}
+        self.version = release.get("version")
+        self.artifacts = release.get("artifacts", {})
+        self.settings = release.get("settings", {})
+        self.local_stores = []
+
+
     def load_embeddings(self) -> HuggingFaceEndpointEmbeddings:
         try: 
+            if os.getenv("EMBEDDINGS_BACKEND", "hf_endpoint").lower() == "local":
+                logging.info("Initializing local ONNX BGE Embeddings.")
+                return get_local_embeddings()
+
             logging.info("Initializing HF Embeddings.")
 
             embeddings = HuggingFaceEndpointEmbeddings(
                 model="BAAI/bge-small-en-v1.5",
                 huggingfacehub_api_token=os.getenv("HF_API_KEY"),
             )
+            if QueryBatchingConfig.enabled:
+                # concurrent query embeddings share one endpoint call
+                embeddings = BatchedEmbeddings(embeddings)
 
             logging.info("Embeddings initialized successfully.")
             return embeddings
@@ -49,7 +88,10 @@ class BuildRetrievalchain:
                 temperature=0.6,
                 model_name="llama-3.3-70b-versatile",
                 groq_api_key=os.getenv("GROQ_API_KEY"),
-                max_tokens=4096
+                max_tokens=4096,
+                # the http call must not outlive the llm stage budget by much
+                request_timeout=DeadlineConfig().llm_seconds,
+                max_retries=1
             )
             
             logging.info("LLM initialized successfully")
@@ -61,15 +103,35 @@ class BuildRetrievalchain:
         
 
 
+    def load_summary_llm(self):
+        try:
+            config = HistoryCompactionConfig()
+            logging.info(f"Initializing history summary model {config.summary_model} with Groq")
+
+            llm = ChatGroq(
+                temperature=0,
+                model_name=config.summary_model,
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                max_tokens=config.summary_max_tokens,
+                max_retries=1
+            )
+
+            logging.info("History summary model initialized successfully")
+            return llm
+
+        except Exception as e:
+            logging.error(f"Error initializing history summary model: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+
     def setup_prompt(self):
         try:
             logging.info("Creating prompt template")
 
-            system_prompt = """You are a helpful assistant.
-
-            Use only the provided context:
-            {context}
-            """
+            system_prompt = self.settings.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
+            if "{context}" not in system_prompt:
+                raise ValueError("system prompt must contain {context}")
         
             prompt = ChatPromptTemplate.from_messages([
                 ("system", system_prompt),
@@ -90,8 +152,24 @@ class BuildRetrievalchain:
         try:
             logging.info("Loading vectorstore ")  
 
+            if os.getenv("VECTOR_BACKEND", "pinecone").lower() == "local":
+                index_path = self.artifacts.get("ann_index") or os.getenv("ANN_INDEX_PATH", os.path.join("artifacts", "ann_index"))
+                router = self.load_router()
+                if router is not None:
+                    # sharded layout: one index per category under index_path
+                    stores = {category: LocalANNVectorStore.load(os.path.join(index_path, category), embeddings)
+                              for category in router.categories}
+                else:
+                    stores = {"all": LocalANNVectorStore.load(index_path, embeddings)}
+
+                if QueryBatchingConfig.enabled:
+                    for category, store in stores.items():
+                        store.enable_batching(name=f"ann-search-{category}" + (f"@{self.version}" if self.version else ""))
+                self.local_stores.extend(stores.values())
+                return stores if router is not None else stores["all"]
+
             vector_store = PineconeVectorStore.from_existing_index(
-                index_name="rough",
+                index_name=self.settings.get("pinecone_index", "rough"),
                 embedding=embeddings
             )
 
@@ -103,19 +181,50 @@ class BuildRetrievalchain:
         
 
 
-    def build_retriever(self, vector_store: PineconeVectorStore):
+    def load_router(self):
+        router_path = self.artifacts.get("router") or os.getenv("CATEGORY_ROUTER_PATH", os.path.join("artifacts", "category_router.json"))
+        if not os.path.exists(router_path):
+            return None
+        return CategoryRouter.load(router_path, margin=float(self.settings.get("router_margin", os.getenv("ROUTER_MARGIN", "0.05"))))
+
+
+
+    def pinecone_namespaces(self) -> List[str]:
+        """Category namespaces of the Pinecone index, the default namespace is no longer written."""
+        index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(self.settings.get("pinecone_index", "rough"))
+        namespaces = index.describe_index_stats().namespaces
+        return sorted(name for name, summary in namespaces.items() if name and summary.vector_count > 0)
+
+
+
+    def build_retriever(self, vector_store: PineconeVectorStore, embeddings=None):
         try:
             logging.info("Initializing retriever")
-
-            retriever = vector_store.as_retriever(
-                search_type="similarity_score_threshold",
-                search_kwargs={
-                    "k": 5,
-                    "score_threshold": 0.7
-                }
-            )
-                                                            
-            logging.info("Retriever initialized")
+            if embeddings is None:
+                raise ValueError("embeddings are required to query the category shards")
+
+            router = self.load_router()
+            if isinstance(vector_store, dict):
+                shards = {category: store.similarity_search_by_vector_with_score
+                          for category, store in vector_store.items()}
+            elif isinstance(vector_store, PineconeVectorStore):
+                # Pinecone keeps each category in its own namespace; without a router every one is searched
+                categories = router.categories if router is not None else self.pinecone_namespaces()
+                if not categories:
+                    raise ValueError("Pinecone index has no category namespaces, rebuild the vectorstore")
+                if router is None:
+                    logging.warning(f"No category router found, searching every namespace: {categories}")
+                shards = {category: (lambda vector, k, ns=category:
+                                     vector_store.similarity_search_by_vector_with_score(vector, k=k, namespace=ns))
+                          for category in categories}
+            else:
+                # local index built without categories
+                shards = {"all": vector_store.similarity_search_by_vector_with_score}
+
+            retriever = ShardedRetriever(embeddings=embeddings, shards=shards, router=router,
+                                         k=int(self.settings.get("k", 5)),
+                                         score_threshold=float(self.settings.get("score_threshold", 0.7)))
+            logging.info(f"Sharded retriever initialized over: {list(shards)}")
             return retriever
         
         except Exception as e:
@@ -124,9 +233,28 @@ class BuildRetrievalchain:
         
 
 
+    @staticmethod
+    def format_degraded_answer(docs: List[Document]) -> str:
+        """Retrieval-only answer used when the LLM cannot answer within its budget."""
+        if not docs:
+            return ("[Degraded response] Our assistant is taking longer than usual and "
+                    "no matching products were found. Please try again in a moment.")
+
+        lines = ["[Degraded response] Our assistant is taking longer than usual, "
+                 "here are the products that best match your question:"]
+        for i, doc in enumerate(docs, start=1):
+            fields = dict(line.split(": ", 1) for line in doc.page_content.splitlines() if ": " in line)
+            details = [fields.get(col) for col in ("Selling Price", "Rating", "Offer") if fields.get(col, "na") != "na"]
+            name = f"{fields.get('Brand Name', '')} - {fields.get('Product Name', doc.page_content[:80])}".strip(" -")
+            lines.append(f"{i}. {name}" + (f" ({', '.join(details)})" if details else ""))
+        return "\n".join(lines)
+
+
+
     def build_chains(self, llm: Any, prompt: ChatPromptTemplate, retriever: Any):
         try:
             logging.info("Creating document chain...")
+            deadline_config = DeadlineConfig()
 
             doc_chain = create_stuff_documents_chain(
                 llm=llm, 
@@ -137,10 +265,38 @@ class BuildRetrievalchain:
             
             logging.info("Creating retrieval chain...")
 
-            retrieval_chain = create_retrieval_chain(
-                retriever=retriever, 
-                combine_docs_chain=doc_chain
-            )
+            # same shape as create_retrieval_chain, with every upstream stage under its own
+            # budget (capped by the request deadline) and circuit breaker
+            def retrieve(inputs: dict, config) -> List[Document]:
+                return call_upstream("vectorstore",
+                                     lambda: retriever.invoke(inputs["input"], config=config),
+                                     deadline_config.retrieval_seconds)
+
+            admission = get_admission_controller()
+
+            def answer(inputs: dict, config) -> dict:
+                try:
+                    # precomputed catalog rankings (see CatalogAggregates.context) go in front of the products
+                    facts = inputs.get("catalog_facts")
+                    llm_inputs = {**inputs, "context": [Document(page_content=facts)] + inputs["context"]} if facts else inputs
+
+                    # bounded LLM concurrency, interactive traffic is queued ahead of batch; a full queue
+                    # raises Overloaded which the caller turns into a fast 503. The slot is held until the
+                    # LLM call returns, also when the stage budget ran out first
+                    with admission.slot(timeout=remaining()) as hold:
+                        text = call_upstream("llm",
+                                             hold(lambda: doc_chain.invoke(llm_inputs, config=config)),
+                                             deadline_config.llm_seconds)
+                    return {**inputs, "answer": text, "degraded": False}
+
+                except (DeadlineExceeded, CircuitOpen, QueueTimeout) as e:
+                    logging.error(f"LLM stage unavailable, serving retrieval-only answer: {str(e)}")
+                    return {**inputs, "answer": self.format_degraded_answer(inputs["context"]), "degraded": True}
+
+            retrieval_chain = (
+                RunnablePassthrough.assign(context=RunnableLambda(retrieve).with_config(run_name="retrieve_documents"))
+                | RunnableLambda(answer).with_config(run_name="answer")
+            ).with_config(run_name="retrieval_chain")
             
             logging.info("Chains created successfully")
             return retrieval_chain
@@ -151,40 +307,153 @@ class BuildRetrievalchain:
         
 
 
-    def build_retrieval_chain(self):
+    def warm_up(self, retriever):
+        """Run the release's warm-up queries so the first real requests do not page the index in."""
+        for query in self.settings.get("warmup_queries", []):
+            retriever.invoke(query)
+        
+
+
+    def build_retrieval_chain(self, embeddings=None, llm=None):
         try:
-            embeddings = self.load_embeddings()
-            llm = self.load_llm()
+            # a reload reuses the embeddings client and LLM of the running chain
+            embeddings = embeddings or DeadlineEmbeddings(self.load_embeddings(), DeadlineConfig().embedding_seconds)
+            llm = llm or self.load_llm()
             prompt = self.setup_prompt()
 
             vector_store = self.load_vectorstore(embeddings)
-            retriever = self.build_retriever(vector_store)
+            retriever = self.build_retriever(vector_store, embeddings)
+            self.warm_up(retriever)
 
             retrieval_chain = self.build_chains(llm, prompt, retriever)
 
             return retrieval_chain
 
         except Exception as e:
+            self.close()
             raise Custom_exception(e, sys)
+
+
+    def close(self):
+        for store in self.local_stores:
+            store.close()
+        self.local_stores = []
         
     
 
 
+class ServingRelease:
+    """
+    Everything one release serves: the chatbot (None where chat is relayed to
+    Kafka workers), the catalog aggregates and the recommendation tables
+    published with it. A reload swaps all of them together.
+    """
+
+    def __init__(self, release: dict = None, chatbot: Any = None, query_embeddings=None):
+        artifacts = (release or {}).get("artifacts", {})
+        self.version = (release or {}).get("version")
+        self.chatbot = chatbot
+        # precomputed cheapest / best rated / biggest discount lists, answered without the LLM
+        self.catalog_aggregates = CatalogAggregates.load(artifacts.get("catalog_aggregates"))
+        self.recommendations_path = artifacts.get("recommendations")
+        self.query_embeddings = query_embeddings
+        self._recommender = None
+        self._recommender_lock = threading.Lock()
+
+
+    def recommender(self) -> Optional[Recommender]:
+        """Neighbour tables for /recommend, loaded on first use so chat-only workers never pay for them."""
+        with self._recommender_lock:
+            if self._recommender is None:
+                self._recommender = Recommender.load(self.recommendations_path)
+                if self._recommender is not None:
+                    # the chain's embeddings when this process serves it, a client of its own otherwise
+                    self._recommender.query_embeddings = self.query_embeddings or DeadlineEmbeddings(
+                        BuildRetrievalchain().load_embeddings(), DeadlineConfig().embedding_seconds)
+            return self._recommender
+
+
+
 class BuildChatbot:
     def __init__(self):
         self.store = {}
+        self._store_lock = threading.Lock()
+        self.summary_llm = None
+        self.embeddings = None
+        self.llm = None
+
+        # identical first-turn questions share one retrieval + LLM call
+        self.single_flight = None
+        if os.getenv("COALESCE_ENABLED", "true").lower() == "true":
+            self.single_flight = SingleFlight(
+                window=float(os.getenv("COALESCE_WINDOW_SECONDS", "2")),
+                lock_dir=default_lock_dir(),
+                to_shared=lambda result: {"answer": result["answer"], "degraded": result.get("degraded", False)},
+                # a retrieval-only fallback must not stand in for real answers for the whole window
+                cacheable=lambda result: not result.get("degraded", False)
+            )
 
 
     def get_session_id(self, session_id: str) -> BaseChatMessageHistory:
-        if session_id not in self.store:
-            self.store[session_id] = InMemoryChatMessageHistory()
-        return self.store[session_id]
+        # concurrent first requests of a session must end up with the same history
+        with self._store_lock:
+            if session_id not in self.store:
+                self.store[session_id] = CompactingChatMessageHistory(summarize=self.summarize_history)
+            return self.store[session_id]
+
+
+    def summarize_history(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        """Fold older turns into the running summary (runs in the background, off the request path)."""
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in messages)
+        prompt = ("Update the running summary of a shopping conversation between a customer and an "
+                  "e-commerce assistant. Keep the customer's needs, budgets, preferences and the products "
+                  "already discussed (brands, names, prices). Be concise.\n\n"
+                  f"Current summary:\n{summary or '(empty)'}\n\n"
+                  f"New messages:\n{transcript}\n\n"
+                  "Updated summary:")
+        return self.summary_llm.invoke(prompt).content
+
+
+    def coalesce_first_turn(self, retrieval_chain):
+        def invoke(inputs: dict, config):
+            # answers that depend on earlier turns are never shared
+            if inputs.get("chat_history"):
+                return retrieval_chain.invoke(inputs, config=config)
+
+            key = normalize_question(inputs["input"])
+            return self.single_flight.do(key, lambda: retrieval_chain.invoke(inputs, config=config),
+                                         timeout=remaining())
+
+        return RunnableLambda(invoke)
 
 
-    def initialize_chatbot(self):
-        utils = BuildRetrievalchain()
 
-        retrieval_chain = utils.build_retrieval_chain()
+    def initialize_chatbot(self, release: dict = None):
+        serving, _ = self.build_release(release)
+        return serving.chatbot
+
+
+    def initialize_release(self, release: dict = None) -> ServingRelease:
+        serving, _ = self.build_release(release)
+        return serving
+
+
+    def build_release(self, release: dict = None):
+        """
+        ServingRelease for a published release (None: paths and settings from the
+        environment) and a callable releasing its resources. Session histories live
+        in self.store, so they carry over when a reload replaces the chatbot.
+        """
+        utils = BuildRetrievalchain(release)
+        if self.embeddings is None:
+            self.embeddings = DeadlineEmbeddings(utils.load_embeddings(), DeadlineConfig().embedding_seconds)
+            self.llm = utils.load_llm()
+
+        retrieval_chain = utils.build_retrieval_chain(self.embeddings, self.llm)
+        if self.summary_llm is None:
+            self.summary_llm = utils.load_summary_llm()
+        if self.single_flight is not None:
+            retrieval_chain = self.coalesce_first_turn(retrieval_chain)
 
         chatbot = RunnableWithMessageHistory(
             runnable=retrieval_chain,
@@ -194,4 +463,9 @@ class BuildChatbot:
             output_messages_key="answer"
         )
 
-        return chatbot
\ No newline at end of file
+        try:
+            serving = ServingRelease(release, chatbot, self.embeddings)
+        except Exception as e:
+            utils.close()
+            raise Custom_exception(e, sys)
+        return serving, utils.close
\ No newline at end of file
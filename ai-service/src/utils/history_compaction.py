@@ -0,0 +1,136 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from src.utils.admission import BATCH, get_admission_controller
+from src.utils.resilience import DeadlineConfig, call_upstream
+from src.utils.logger import logging
+
+
+@dataclass
+class HistoryCompactionConfig:
+    # turns (user + assistant message pairs) kept verbatim in the prompt
+    verbatim_turns = int(os.getenv("HISTORY_VERBATIM_TURNS", "4"))
+    # hard cap on the tokens history may add to a prompt, summary included
+    token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    summary_model = os.getenv("HISTORY_SUMMARY_MODEL", "llama-3.1-8b-instant")
+    summary_max_tokens = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "256"))
+
+
+# summaries are produced here, never on the request thread; the LLM call itself still takes a
+# batch admission slot and goes through the "llm" breaker like the answers do
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text, good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    limit = max(tokens, 0) * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + " ..."
+
+
+class CompactingChatMessageHistory(BaseChatMessageHistory):
+    """
+    Session history that keeps the last N turns verbatim and folds older
+    turns into a running summary. Folding runs in the background once older
+    turns pile up; until it finishes those turns are simply left out of the
+    prompt. `messages` (what the prompt sees) never exceeds the token budget.
+    """
+
+    def __init__(self, summarize: Optional[Callable[[str, Sequence[BaseMessage]], str]],
+                 config: HistoryCompactionConfig = None):
+        self.config = config or HistoryCompactionConfig()
+        self.summarize = summarize
+
+        self._lock = threading.Lock()
+        self._messages: List[BaseMessage] = []   # messages not folded into the summary yet
+        self.summary = ""
+        self._summarizing = False
+
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            recent = self._messages[-2 * self.config.verbatim_turns:] if self.config.verbatim_turns else []
+            summary = self.summary
+
+        budget = self.config.token_budget
+        prompt: List[BaseMessage] = []
+
+        if summary:
+            summary_text = truncate_to_tokens(summary, budget // 3)
+            prompt.append(SystemMessage(content=f"Summary of the earlier conversation: {summary_text}"))
+            budget -= approx_tokens(summary_text)
+
+        # newest messages first until the budget runs out, the oldest one kept may be truncated
+        kept: List[BaseMessage] = []
+        for message in reversed(recent):
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            cost = approx_tokens(content)
+            if cost > budget:
+                if budget > 32:
+                    kept.append(message.model_copy(update={"content": truncate_to_tokens(content, budget)}))
+                break
+            kept.append(message)
+            budget -= cost
+
+        return prompt + list(reversed(kept))
+
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self._messages.extend(messages)
+            if self.summarize is None:
+                # nothing to fold into, keep only the verbatim window
+                del self._messages[:-2 * self.config.verbatim_turns or None]
+            overflow = len(self._messages) - 2 * self.config.verbatim_turns
+            start = overflow > 0 and not self._summarizing and self.summarize is not None
+            if start:
+                self._summarizing = True
+                folded = self._messages[:overflow]
+                summary = self.summary
+
+        if start:
+            _summary_executor.submit(self._fold, summary, folded)
+
+
+    def _fold(self, summary: str, folded: List[BaseMessage]):
+        try:
+            with get_admission_controller().slot(priority=BATCH) as hold:
+                new_summary = call_upstream("llm", hold(lambda: self.summarize(summary, folded)),
+                                            DeadlineConfig().llm_seconds)
+        except Exception as e:
+            logging.error(f"History summarization failed, keeping previous summary: {str(e)}")
+            new_summary = summary
+
+        with self._lock:
+            self.summary = new_summary
+            # drop what was folded, messages added meanwhile stay
+            del self._messages[:len(folded)]
+            self._summarizing = False
+            overflow = len(self._messages) - 2 * self.config.verbatim_turns
+            again = overflow > 0
+            if again:
+                self._summarizing = True
+                folded, summary = self._messages[:overflow], self.summary
+
+        if again:
+            _summary_executor.submit(self._fold, summary, folded)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages = []
+            self.summary = ""
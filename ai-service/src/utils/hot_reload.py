@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # windows, releases are pruned by count only
+    fcntl = None
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+@dataclass
+class ReleaseConfig:
+    # opt-in: without it the artifacts are read once from the environment paths at startup
+    enabled = os.getenv("HOT_RELOAD", "false").lower() == "true"
+    # the versioned pointer workers watch, written by publish_release
+    pointer_path = os.getenv("RELEASE_POINTER_PATH", os.path.join("artifacts", "release.json"))
+    releases_dir = os.getenv("RELEASES_DIR", os.path.join("artifacts", "releases"))
+    poll_seconds = float(os.getenv("RELEASE_POLL_SECONDS", "10"))
+    # newest release folders always kept; older ones are deleted once no worker holds their lease
+    keep_releases = int(os.getenv("RELEASE_KEEP", "3"))
+
+
+_LEASE_FILE = ".lease"
+
+
+def read_release(pointer_path: str) -> Optional[dict]:
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def lease_release(release: Optional[dict], config: ReleaseConfig = None) -> Optional[IO]:
+    """
+    Shared flock on the release folder's lease file, held by every generation
+    built from it until that generation is drained and closed (closing the file
+    gives it back, as does the process dying). None when there is nothing to lock.
+    """
+    if not release or fcntl is None:
+        return None
+    config = config or ReleaseConfig()
+    release_dir = release.get("path") or os.path.join(config.releases_dir, release["version"])
+    try:
+        lease = open(os.path.join(release_dir, _LEASE_FILE), "a")
+        fcntl.flock(lease, fcntl.LOCK_SH)
+        return lease
+    except OSError as e:
+        logging.error(f"Could not lease release {release.get('version')}: {str(e)}")
+        return None
+
+
+def prune_release(release_dir: str) -> bool:
+    """Delete a release folder unless a worker still holds its lease. True when deleted."""
+    lease_path = os.path.join(release_dir, _LEASE_FILE)
+    if fcntl is None or not os.path.exists(lease_path):
+        shutil.rmtree(release_dir, ignore_errors=True)
+        return True
+
+    with open(lease_path, "a") as lease:
+        try:
+            fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # deleted while holding the exclusive lock, no lease can be taken halfway
+        shutil.rmtree(release_dir, ignore_errors=True)
+        return True
+
+
+def publish_release(artifacts: Dict[str, str], settings: Optional[dict] = None,
+                    config: ReleaseConfig = None) -> dict:
+    """
+    Copy `artifacts` (name -> file or folder, e.g. ann_index, router, catalog_aggregates,
+    recommendations) into a new release folder and point the release pointer at it.
+    Settings not given are carried over from the current release. The pointer is
+    replaced atomically, so a watcher never reads a half written release.
+    """
+    config = config or ReleaseConfig()
+    try:
+        current = read_release(config.pointer_path) or {}
+        version = time.strftime("%Y%m%d-%H%M%S")
+        if version == current.get("version"):
+            version = f"{version}-{os.getpid()}"
+        release_dir = os.path.join(config.releases_dir, version)
+        os.makedirs(release_dir, exist_ok=True)
+
+        paths = {}
+        for name, source in artifacts.items():
+            if not source or not os.path.exists(source):
+                continue
+            target = os.path.join(release_dir, name if os.path.isdir(source) else name + os.path.splitext(source)[1])
+            if os.path.isdir(source):
+                shutil.copytree(source, target)
+            else:
+                shutil.copy2(source, target)
+            paths[name] = os.path.abspath(target)
+
+        release = {"version": version,
+                   "path": os.path.abspath(release_dir),
+                   "created": time.time(),
+                   "artifacts": paths,
+                   "settings": {**current.get("settings", {}), **(settings or {})}}
+
+        os.makedirs(os.path.dirname(os.path.abspath(config.pointer_path)), exist_ok=True)
+        tmp_path = f"{config.pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(release, f, indent=2)
+        os.replace(tmp_path, config.pointer_path)
+        logging.info(f"Published release {version} with {list(paths)} to {config.pointer_path}")
+
+        releases = sorted(os.listdir(config.releases_dir))
+        for old in releases[:-config.keep_releases]:
+            if not prune_release(os.path.join(config.releases_dir, old)):
+                logging.info(f"Keeping release {old}, a worker is still serving from it")
+        return release
+
+    except Exception as e:
+        logging.error(f"Error publishing release: {str(e)}")
+        raise Custom_exception(e, sys)
+
+
+
+class _Generation:
+    __slots__ = ("chatbot", "version", "close", "lease", "active", "retired", "loaded_at")
+
+    def __init__(self, chatbot: Any, version: Optional[str], close: Optional[Callable[[], None]],
+                 lease: Optional[IO] = None):
+        self.chatbot = chatbot
+        self.version = version
+        self.close = close
+        self.lease = lease
+        self.active = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+
+
+class ChainReloader:
+    """
+    Serves what `build` made of the current release (the chatbot together with
+    the catalog aggregates and recommendation tables) and swaps in a new one when
+    the release pointer changes. The new chain is built (and warmed up) on a
+    background thread while the old one keeps serving; the swap is a single
+    reference change between requests. Requests already running finish on the
+    chain they started with, whose resources are closed once the last of them
+    returns. A release that fails to build is logged and the old chain kept.
+    Each generation leases its release folder until it is closed, so
+    `publish_release` never deletes files a draining generation still reads.
+    """
+
+    def __init__(self, build: Callable[[Optional[dict]], Tuple[Any, Callable[[], None]]], config: ReleaseConfig = None):
+        self.config = config or ReleaseConfig()
+        self.build = build
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()     # one build at a time (watcher or /debug/reload)
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._seen_mtime = None
+        self._failed_version = None
+
+        release = read_release(self.config.pointer_path)
+        lease = lease_release(release, self.config)
+        chatbot, close = build(release)
+        self._current = _Generation(chatbot, release and release.get("version"), close, lease)
+        self._seen_mtime = self._pointer_mtime()
+
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="release-watcher", daemon=True)
+        self._watcher.start()
+
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._current.version
+
+
+    @contextmanager
+    def use(self):
+        """What to serve one request with, pinned until the block exits."""
+        with self._lock:
+            generation = self._current
+            generation.active += 1
+        try:
+            yield generation.chatbot
+        finally:
+            with self._lock:
+                generation.active -= 1
+                drained = generation.retired and generation.active == 0
+            if drained:
+                self._close(generation)
+
+
+    def _pointer_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.config.pointer_path)
+        except OSError:
+            return None
+
+
+    def _watch(self):
+        while not self._stop.wait(self.config.poll_seconds):
+            mtime = self._pointer_mtime()
+            if mtime is None or mtime == self._seen_mtime:
+                continue
+            self._seen_mtime = mtime
+            try:
+                self.reload()
+            except Exception as e:
+                logging.error(f"Release watcher error: {str(e)}")
+
+
+    def reload(self, force: bool = False) -> bool:
+        """Build the release the pointer names and swap it in. True when swapped."""
+        with self._build_lock:
+            release = read_release(self.config.pointer_path)
+            version = release and release.get("version")
+            if not force and version in (self._current.version, self._failed_version):
+                return False
+
+            started = time.perf_counter()
+            lease = lease_release(release, self.config)
+            try:
+                chatbot, close = self.build(release)
+            except Exception as e:
+                if lease is not None:
+                    lease.close()
+                self.failures += 1
+                self.last_error = f"{version}: {str(e)}"
+                self._failed_version = version
+                logging.error(f"Could not build release {version}, still serving {self._current.version}: {str(e)}")
+                return False
+
+            with self._lock:
+                previous, self._current = self._current, _Generation(chatbot, version, close, lease)
+                previous.retired = True
+                drained = previous.active == 0
+            self.reloads += 1
+            self._failed_version = None
+
+        logging.info(f"Swapped in release {version} (built in {time.perf_counter() - started:.1f}s), "
+                     f"replacing {previous.version}")
+        if drained:
+            self._close(previous)
+        return True
+
+
+    @staticmethod
+    def _close(generation: _Generation):
+        try:
+            if generation.close is not None:
+                generation.close()
+        except Exception as e:
+            logging.error(f"Error closing release {generation.version}: {str(e)}")
+        finally:
+            # the release folder may be pruned from here on
+            if generation.lease is not None:
+                generation.lease.close()
+
+
+    def stop(self):
+        self._stop.set()
+        self._watcher.join()
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            current = self._current
+        return {"version": current.version,
+                "loaded_at": current.loaded_at,
+                "active_requests": current.active,
+                "reloads": self.reloads,
+                "failures": self.failures,
+                "last_error": self.last_error}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish the current index artifacts and settings as a new release")
+    parser.add_argument("--ann-index", default=os.getenv("ANN_INDEX_PATH", os.path.join("artifacts", "ann_index")))
+    parser.add_argument("--router", default=os.getenv("CATEGORY_ROUTER_PATH", os.path.join("artifacts", "category_router.json")))
+    parser.add_argument("--catalog-aggregates", default=os.path.join("artifacts", "catalog_aggregates.json"))
+    parser.add_argument("--recommendations", default=os.path.join("artifacts", "recommendations"))
+    parser.add_argument("--prompt-file", help="system prompt, must contain {context}")
+    parser.add_argument("--k", type=int)
+    parser.add_argument("--score-threshold", type=float)
+    parser.add_argument("--pinecone-index")
+    parser.add_argument("--router-margin", type=float)
+    parser.add_argument("--warmup-query", action="append", dest="warmup_queries")
+    args = parser.parse_args()
+
+    settings = {"k": args.k, "score_threshold": args.score_threshold,
+                "pinecone_index": args.pinecone_index, "router_margin": args.router_margin,
+                "warmup_queries": args.warmup_queries}
+    if args.prompt_file:
+        with open(args.prompt_file, "r", encoding="utf-8") as f:
+            settings["system_prompt"] = f.read()
+
+    release = publish_release({"ann_index": args.ann_index, "router": args.router,
+                               "catalog_aggregates": args.catalog_aggregates, "recommendations": args.recommendations},
+                              {name: value for name, value in settings.items() if value is not None})
+    print(json.dumps(release, indent=2))
+
+
+if __name__ == "__main__":
+    main()
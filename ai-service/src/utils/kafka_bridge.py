@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import uuid
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.resilience import CircuitOpen, DeadlineExceeded, request_deadline
+from src.utils.admission import INTERACTIVE, AdmissionConfig, Overloaded, QueueTimeout, request_priority
+from src.utils.logger import logging
+
+
+@dataclass
+class KafkaBridgeConfig:
+    # "kafka": /chat is answered by LLM workers behind chat_requests / chat_responses
+    enabled = os.getenv("CHAT_BACKEND", "local").lower() == "kafka"
+    bootstrap_servers = os.getenv("KAFKA_BROKER", "localhost:29092")
+    request_topic = os.getenv("KAFKA_CHAT_REQUEST_TOPIC", "chat_requests")
+    response_topic = os.getenv("KAFKA_CHAT_RESPONSE_TOPIC", "chat_responses")
+    timeout_seconds = float(os.getenv("KAFKA_REPLY_TIMEOUT_SECONDS", os.getenv("CHAT_DEADLINE_SECONDS", "20")))
+    poll_ms = 100
+
+
+
+class InMemoryBroker:
+    """
+    Stand-in for a Kafka cluster in tests and local runs. Producers and
+    consumers have the subset of the kafka-python interface the bridge uses
+    (send / flush / close and poll / close); a consumer starts at the end of
+    its topic, like auto_offset_reset="latest". Consumers of the same group
+    share one offset, so each message goes to one of them.
+    """
+
+    def __init__(self):
+        self._topics: Dict[str, List[Any]] = defaultdict(list)
+        self._group_offsets: Dict[tuple, int] = {}
+        self._condition = threading.Condition()
+
+
+    def producer(self) -> "_InMemoryProducer":
+        return _InMemoryProducer(self)
+
+
+    def consumer(self, topic: str, group_id: Optional[str] = None) -> "_InMemoryConsumer":
+        return _InMemoryConsumer(self, topic, group_id)
+
+
+    def publish(self, topic: str, value: Any):
+        with self._condition:
+            # round trip through JSON like the real serializers, callers never share objects
+            self._topics[topic].append(json.loads(json.dumps(value)))
+            self._condition.notify_all()
+
+
+
+class _Record:
+    __slots__ = ("topic", "value")
+
+    def __init__(self, topic: str, value: Any):
+        self.topic = topic
+        self.value = value
+
+
+
+class _InMemoryProducer:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+
+
+    def send(self, topic: str, value: Any, key: Optional[str] = None):
+        self.broker.publish(topic, value)
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        pass
+
+
+
+class _InMemoryConsumer:
+    def __init__(self, broker: InMemoryBroker, topic: str, group_id: Optional[str] = None):
+        self.broker = broker
+        self.topic = topic
+        self.key = (group_id or id(self), topic)
+        with broker._condition:
+            broker._group_offsets.setdefault(self.key, len(broker._topics[topic]))
+
+
+    def poll(self, timeout_ms: int = 0, max_records: int = 10) -> Dict[str, List[_Record]]:
+        with self.broker._condition:
+            messages = self.broker._topics[self.topic]
+            if self.broker._group_offsets[self.key] >= len(messages):
+                self.broker._condition.wait(timeout_ms / 1000.0)
+            offset = self.broker._group_offsets[self.key]
+            records = [_Record(self.topic, value) for value in messages[offset:offset + max_records]]
+            self.broker._group_offsets[self.key] = offset + len(records)
+        return {self.topic: records} if records else {}
+
+
+    def close(self):
+        pass
+
+
+
+class KafkaChatBridge:
+    """
+    Request/reply over the chat topics. `ask` publishes the question with a
+    fresh correlation id and blocks on a future; one reader thread per process
+    polls the response topic and completes the future whose correlation id
+    matches. Replies arriving after their request timed out are dropped.
+    """
+
+    def __init__(self, producer, consumer, config: KafkaBridgeConfig = None):
+        self.config = config or KafkaBridgeConfig()
+        self.producer = producer
+        self.consumer = consumer
+
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.replies = 0
+        self.timeouts = 0
+        self.unmatched = 0
+
+        self._running = True
+        self._reader = threading.Thread(target=self._read, name="kafka-replies", daemon=True)
+        self._reader.start()
+
+
+    def _read(self):
+        while self._running:
+            try:
+                polled = self.consumer.poll(timeout_ms=self.config.poll_ms)
+            except Exception as e:
+                logging.error(f"Polling {self.config.response_topic} failed: {str(e)}")
+                time.sleep(self.config.poll_ms / 1000.0)
+                continue
+
+            for records in polled.values():
+                for record in records:
+                    reply = record.value or {}
+                    with self._lock:
+                        future = self._pending.pop(reply.get("correlationId"), None)
+                    if future is None:
+                        # late, or meant for another web worker reading the same topic
+                        self.unmatched += 1
+                        continue
+                    self.replies += 1
+                    future.set_result(reply)
+
+
+    def ask(self, session_id: str, question: str, timeout: Optional[float] = None, **fields) -> dict:
+        """Send one question and wait for its reply, DeadlineExceeded when none arrives in time."""
+        timeout = self.config.timeout_seconds if timeout is None else timeout
+        correlation_id = uuid.uuid4().hex
+        future: Future = Future()
+        with self._lock:
+            self._pending[correlation_id] = future
+
+        try:
+            # keyed by session: a session's turns land on one partition, hence on the worker holding its history.
+            # deadlineAt (epoch seconds) lets the worker budget the chain to what is left when it picks it up
+            self.producer.send(self.config.request_topic,
+                               {"correlationId": correlation_id, "sessionId": session_id, "input": question,
+                                "deadlineAt": time.time() + timeout, **fields},
+                               key=session_id)
+            self.sent += 1
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            raise DeadlineExceeded(f"no reply on {self.config.response_topic} for {correlation_id} "
+                                   f"within {timeout:.1f}s")
+        finally:
+            with self._lock:
+                self._pending.pop(correlation_id, None)
+
+
+    def close(self):
+        self._running = False
+        self._reader.join()
+        self.producer.close()
+        self.consumer.close()
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {"sent": self.sent,
+                "replies": self.replies,
+                "timeouts": self.timeouts,
+                "unmatched_replies": self.unmatched,
+                "pending": pending}
+
+
+
+class _SessionLocks:
+    """One lock per session with requests in flight, so a session's turns are answered in order."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[Any, list] = {}
+
+
+    @contextmanager
+    def hold(self, session_id):
+        with self._lock:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[session_id]
+
+
+
+def serve_requests(answer: Callable[[str, str], dict], consumer, producer, response_topic: str,
+                   should_stop: Callable[[], bool] = lambda: False, poll_ms: int = 100,
+                   max_in_flight: int = None, default_timeout: float = None):
+    """
+    LLM worker loop: answer chat requests and publish each reply with the
+    request's correlation id and sessionId. Up to `max_in_flight` requests (the
+    LLM admission limit by default) are answered concurrently, turns of one
+    session in order. Each runs under the deadline the web tier sent, a request
+    whose caller already gave up is not answered. Errors are replied too, with an
+    `errorType` ("deadline", "overloaded", "unavailable" or "internal"), so the
+    caller fails fast with the right status instead of waiting for its timeout.
+    """
+    max_in_flight = max_in_flight or AdmissionConfig.max_concurrency
+    default_timeout = KafkaBridgeConfig.timeout_seconds if default_timeout is None else default_timeout
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    sessions = _SessionLocks()
+
+    def handle(request: dict, received: float):
+        reply = {"correlationId": request.get("correlationId"), "sessionId": request.get("sessionId")}
+        try:
+            with sessions.hold(request.get("sessionId")):
+                left = float(request.get("deadlineAt") or received + default_timeout) - time.time()
+                if left <= 0:
+                    raise DeadlineExceeded(f"request {request.get('correlationId')} expired before it was answered")
+                # the web tier's /chat is waiting on it: interactive priority, budget = what is left of its deadline
+                with request_deadline(left), request_priority(INTERACTIVE):
+                    reply.update(answer(request.get("sessionId"), request.get("input", "")))
+        except DeadlineExceeded as e:
+            logging.error(f"Chat request from Kafka not answered in time: {str(e)}")
+            reply.update(error=str(e), errorType="deadline")
+        except (Overloaded, QueueTimeout) as e:
+            logging.error(f"Chat request from Kafka shed by admission control: {str(e)}")
+            reply.update(error=str(e), errorType="overloaded")
+        except CircuitOpen as e:
+            logging.error(f"Chat request from Kafka hit an open circuit: {str(e)}")
+            reply.update(error=str(e), errorType="unavailable")
+        except Exception as e:
+            logging.exception("Error answering chat request from Kafka")
+            reply.update(error=str(e), errorType="internal")
+
+        # the slot is only given back once the reply is out, so at most max_in_flight are pending
+        try:
+            producer.send(response_topic, reply)
+        except Exception:
+            logging.exception(f"Could not publish reply {reply.get('correlationId')}")
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="chat-worker") as executor:
+        while not should_stop():
+            for records in consumer.poll(timeout_ms=poll_ms).values():
+                for record in records:
+                    # no more than max_in_flight requests are taken off the topic at a time
+                    in_flight.acquire()
+                    executor.submit(handle, record.value or {}, time.time())
+            producer.flush()
+
+
+
+def kafka_clients(config: KafkaBridgeConfig, consume_topic: str, group_id: Optional[str] = None):
+    from kafka import KafkaConsumer, KafkaProducer
+
+    producer = KafkaProducer(bootstrap_servers=config.bootstrap_servers,
+                             value_serializer=lambda x: json.dumps(x).encode("utf-8"),
+                             key_serializer=lambda x: x.encode("utf-8") if x is not None else None,
+                             linger_ms=1)
+    consumer = KafkaConsumer(consume_topic,
+                             bootstrap_servers=config.bootstrap_servers,
+                             group_id=group_id,
+                             auto_offset_reset="latest",
+                             value_deserializer=lambda x: json.loads(x.decode("utf-8")))
+    return producer, consumer
+
+
+_bridge = None
+_bridge_lock = threading.Lock()
+
+
+def get_kafka_bridge() -> Optional[KafkaChatBridge]:
+    """
+    The process wide bridge, None unless CHAT_BACKEND=kafka. It has no consumer
+    group, so every web worker sees every reply and keeps the ones it is waiting for.
+    """
+    global _bridge
+    config = KafkaBridgeConfig()
+    if not config.enabled:
+        return None
+    with _bridge_lock:
+        if _bridge is None:
+            producer, consumer = kafka_clients(config, config.response_topic)
+            _bridge = KafkaChatBridge(producer, consumer, config)
+        return _bridge
+
+
+
+def main():
+    """Run an LLM worker: the full chain behind chat_requests, one consumer group shared by all workers."""
+    parser = argparse.ArgumentParser(description="Answer /chat requests published on Kafka")
+    parser.add_argument("--group-id", default=os.getenv("KAFKA_WORKER_GROUP", "ai-chat-workers"))
+    args = parser.parse_args()
+
+    from contextlib import nullcontext
+    from src.utils.chatbot_utils import BuildChatbot
+    from src.utils.hot_reload import ChainReloader, ReleaseConfig
+
+    config = KafkaBridgeConfig()
+    chatbot_builder = BuildChatbot()
+    # with HOT_RELOAD=true the worker follows the release pointer like the web tier
+    reloader = ChainReloader(chatbot_builder.build_release) if ReleaseConfig.enabled else None
+    serving = None if reloader else chatbot_builder.initialize_release()
+
+    def answer(session_id: str, question: str) -> dict:
+        inputs = {"input": question}
+        with reloader.use() if reloader else nullcontext(serving) as current:
+            if current.catalog_aggregates is not None:
+                # same rules as app.handle_chat: canned lists only for a plain superlative opening a session
+                history = chatbot_builder.get_session_id(session_id)
+                aggregate_answer = None if history.messages else current.catalog_aggregates.answer(question)
+                if aggregate_answer is not None:
+                    history.add_user_message(question)
+                    history.add_ai_message(aggregate_answer)
+                    return {"answer": aggregate_answer}
+                catalog_facts = current.catalog_aggregates.context(question)
+                if catalog_facts is not None:
+                    inputs["catalog_facts"] = catalog_facts
+
+            response = current.chatbot.invoke(inputs, config={"configurable": {"session_id": session_id}})
+        return {"answer": response.get("answer"), "degraded": response.get("degraded", False)}
+
+    producer, consumer = kafka_clients(config, config.request_topic, group_id=args.group_id)
+    logging.info(f"Chat worker consuming {config.request_topic} as {args.group_id}")
+    serve_requests(answer, consumer, producer, config.response_topic)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.utils.micro_batching import MicroBatcher
+from src.utils.logger import logging
+from src.utils.exception import Custom_exception
+
+
+@dataclass
+class LocalEmbeddingsConfig:
+    model_name = "BAAI/bge-small-en-v1.5"
+    # directory holding model.onnx and tokenizer.json, downloaded from the hub when not set
+    model_dir = os.getenv("LOCAL_EMBEDDINGS_MODEL_DIR")
+    max_length = 512
+    # the cores are shared by every gunicorn worker on the host (WEB_CONCURRENCY)
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    num_threads = int(os.getenv("LOCAL_EMBEDDINGS_THREADS", str(max(1, (os.cpu_count() or 1) // workers))))
+    max_batch_size = int(os.getenv("LOCAL_EMBEDDINGS_MAX_BATCH", "32"))
+    max_wait_ms = float(os.getenv("LOCAL_EMBEDDINGS_BATCH_WAIT_MS", "5"))
+    document_batch_size = 64
+
+
+class LocalBGEEmbeddings(Embeddings):
+    """
+    bge-small-en-v1.5 run in process with ONNX Runtime on CPU.
+
+    Produces the same 384-d, CLS pooled and L2 normalized vectors as the HF
+    feature-extraction endpoint, so it can query the existing index. Query
+    embeddings from concurrent requests are grouped by a MicroBatcher into
+    a single forward pass.
+    """
+
+    def __init__(self, config: LocalEmbeddingsConfig = None):
+        try:
+            # imported here so the HF endpoint backend runs without the ONNX dependencies
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            self.config = config or LocalEmbeddingsConfig()
+            model_path, tokenizer_path = self._resolve_files()
+
+            self.tokenizer = Tokenizer.from_file(tokenizer_path)
+            self.tokenizer.enable_truncation(max_length=self.config.max_length)
+            self.tokenizer.enable_padding()
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.config.num_threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+            self.input_names = {i.name for i in self.session.get_inputs()}
+
+            self.batcher = MicroBatcher(self._encode,
+                                        max_batch_size=self.config.max_batch_size,
+                                        max_wait_ms=self.config.max_wait_ms,
+                                        name="local-embeddings")
+            logging.info(f"Local ONNX embeddings loaded from {model_path} with {self.config.num_threads} threads")
+
+        except Exception as e:
+            logging.error(f"Error initializing local embeddings: {str(e)}")
+            raise Custom_exception(e, sys)
+
+
+    def _resolve_files(self):
+        if self.config.model_dir:
+            model_path = os.path.join(self.config.model_dir, "model.onnx")
+            if not os.path.exists(model_path):
+                model_path = os.path.join(self.config.model_dir, "onnx", "model.onnx")
+            return model_path, os.path.join(self.config.model_dir, "tokenizer.json")
+
+        from huggingface_hub import hf_hub_download
+        return (hf_hub_download(self.config.model_name, "onnx/model.onnx"),
+                hf_hub_download(self.config.model_name, "tokenizer.json"))
+
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+        hidden = self.session.run(None, feeds)[0]
+        # bge uses the [CLS] token as the sentence embedding
+        cls = hidden[:, 0]
+        cls = cls / np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+        return cls.tolist()
+
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher(text)
+
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        batch_size = self.config.document_batch_size
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(self._encode(texts[start:start + batch_size]))
+        return vectors
+
+
+_local_embeddings = None
+_local_embeddings_lock = threading.Lock()
+
+
+def get_local_embeddings() -> LocalBGEEmbeddings:
+    """One model per process, shared by the chatbot and the recommender."""
+    global _local_embeddings
+    with _local_embeddings_lock:
+        if _local_embeddings is None:
+            _local_embeddings = LocalBGEEmbeddings()
+        return _local_embeddings
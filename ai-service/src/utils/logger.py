@@ -1,21 +1,179 @@
 import os
+import re
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
 import logging
-from datetime import datetime
+import threading
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
-logs_file_name = datetime.now().strftime('%d_%m_%Y_%H_%M_%S') + ".log" 
-logs_folder_name = datetime.now().strftime('%d_%m_%Y')
+# the request thread only puts records on a queue, formatting and file / stdout I/O happen
+# on the listener thread. `from src.utils.logger import logging` keeps working everywhere.
 
+logs_folder_name = datetime.now().strftime('%d_%m_%Y')
 logs_path = os.path.join(os.getcwd(), "Logs", logs_folder_name)
 os.makedirs(logs_path, exist_ok=True)
 
-logs_file_path = os.path.join(logs_path, logs_file_name)
+# one file per process (gunicorn workers), rotated by size
+logs_file_path = os.path.join(logs_path, f"ai_service_{os.getpid()}.log")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_TO_STDOUT = os.getenv("LOG_TO_STDOUT", "true").lower() == "true"
+# messages longer than this are cut, payloads (user input, answers) get a much smaller limit
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "200"))
+# share of requests whose payloads are logged in full
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("log_request_id", default="-")
+_stage_timings: contextvars.ContextVar[dict] = contextvars.ContextVar("log_stage_timings", default=None)
+_full_payloads: contextvars.ContextVar[bool] = contextvars.ContextVar("log_full_payloads", default=False)
+
+
+# client supplied request ids end up in log lines, response headers and profile file names
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def safe_request_id(value) -> str:
+    """The client's X-Request-ID when it is a plain token, otherwise a fresh id."""
+    if isinstance(value, str) and REQUEST_ID_PATTERN.fullmatch(value):
+        return value
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def request_context(request_id: str):
+    """Tag every record logged within the block (stage worker threads included) with the request id."""
+    tokens = (_request_id.set(request_id),
+              _stage_timings.set({}),
+              _full_payloads.set(random.random() < LOG_PAYLOAD_SAMPLE_RATE))
+    try:
+        yield
+    finally:
+        for var, token in zip((_request_id, _stage_timings, _full_payloads), tokens):
+            var.reset(token)
+
+
+def record_stage(name: str, seconds: float):
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + seconds * 1000.0, 1)
+
+
+def stage_timings() -> dict:
+    return dict(_stage_timings.get() or {})
+
+
+def payload(text) -> str:
+    """User input / LLM output for a log line: truncated unless this request was sampled."""
+    text = str(text)
+    if _full_payloads.get() or len(text) <= LOG_PAYLOAD_CHARS:
+        return text
+    return f"{text[:LOG_PAYLOAD_CHARS]}...[+{len(text) - LOG_PAYLOAD_CHARS} chars]"
+
+
+
+class _ContextFilter(logging.Filter):
+    # runs on the calling thread, where the request contextvars are visible
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
 
-logging.basicConfig(filename=logs_file_path,
-                    format="[%(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-                    level=logging.INFO)
+
+
+class JsonFormatter(logging.Formatter):
+    _fields = ("stage_timings", "duration_ms", "status", "endpoint")
+
+    def format(self, record):
+        entry = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "module": record.module,
+                 "line": record.lineno,
+                 "request_id": getattr(record, "request_id", "-"),
+                 "message": record.getMessage()}
+        for field in self._fields:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        exception = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the listener falls behind."""
+
+    # shared by every request thread of the process, incremented under the lock
+    dropped = 0
+    _dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # only merge args and cut the message here, JSON formatting happens on the listener
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = f"{message[:LOG_MAX_MESSAGE_CHARS]}...[+{len(message) - LOG_MAX_MESSAGE_CHARS} chars]"
+        if record.exc_info:
+            # tracebacks cannot cross the queue, render them while they exist
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = message, None, None
+        return record
+
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with NonBlockingQueueHandler._dropped_lock:
+                NonBlockingQueueHandler.dropped += 1
+
+
+def _configure():
+    formatter = JsonFormatter()
+    handlers = []
+
+    file_handler = logging.handlers.RotatingFileHandler(logs_file_path, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+
+    if LOG_TO_STDOUT:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    # handlers installed by the host (gunicorn, pytest, an embedding app) are kept
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, NonBlockingQueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # flush what is still queued on interpreter exit
+    atexit.register(listener.stop)
+    return listener
+
+
+listener = _configure()
 
 
 
 if __name__=="__main__":
     logging.info("Logging has started.")
-
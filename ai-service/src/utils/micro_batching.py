@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import shlex
+import threading
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def threaded_server() -> bool:
+    """
+    True when running under gunicorn with threaded workers (gthread or --threads > 1).
+    Sync workers serve one request at a time, batching would only add the wait window.
+    """
+    args = shlex.split(os.getenv("GUNICORN_CMD_ARGS", "")) + sys.argv[1:]
+    if "gunicorn" not in os.path.basename(sys.argv[0]) and not os.getenv("GUNICORN_CMD_ARGS"):
+        return False
+
+    options = {}
+    for i, arg in enumerate(args):
+        name, _, value = arg.partition("=")
+        if name in ("-k", "--worker-class", "--threads") and not value and i + 1 < len(args):
+            value = args[i + 1]
+        options[name] = value
+
+    worker_class = options.get("--worker-class") or options.get("-k") or ""
+    threads = options.get("--threads") or "1"
+    return worker_class.endswith("gthread") or (threads.isdigit() and int(threads) > 1)
+
+
+@dataclass
+class QueryBatchingConfig:
+    # query embeddings and local index searches of concurrent /chat requests, on by default only
+    # where requests of one process run concurrently
+    enabled = os.getenv("QUERY_BATCHING", "true" if threaded_server() else "false").lower() == "true"
+    max_wait_ms = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+    max_batch_size = int(os.getenv("QUERY_MAX_BATCH", "32"))
+    # batches in flight at once; while all are busy the next batch keeps filling
+    num_workers = int(os.getenv("QUERY_BATCH_WORKERS", "4"))
+
+
+_batchers: List["MicroBatcher"] = []
+_CLOSE = object()
+_batchers_lock = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching dispatcher. Items submitted by concurrent callers
+    are collected for at most `max_wait_ms` (or until `max_batch_size` items
+    are waiting), passed to `batch_fn` as one list, and each caller gets its
+    own result back through a future. Up to `num_workers` batches run at once;
+    when all of them are busy the window stays open and the next batch keeps
+    growing until one finishes. A lone request pays at most the wait window
+    on top of the call itself.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, num_workers: int = 1, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # pending items and free workers share one condition: the collector sleeps until
+        # either a new item arrives, a batch finishes or the wait window is over
+        self._changed = threading.Condition(self._lock)
+        self._pending = deque()
+        self._free_workers = num_workers
+
+        self.items = 0
+        self.batches = 0
+
+        self._collector = threading.Thread(target=self._collect, name=f"{name}-collector", daemon=True)
+        self._collector.start()
+        with _batchers_lock:
+            _batchers.append(self)
+
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._put((item, future))
+        return future
+
+
+    def _put(self, entry):
+        with self._changed:
+            self._pending.append(entry)
+            self._changed.notify()
+
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        return self.submit(item).result(timeout=timeout)
+
+
+    def close(self):
+        """Stop after the batches already queued, used when a reloaded index replaces this one."""
+        self._put(_CLOSE)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+        with _batchers_lock:
+            if self in _batchers:
+                _batchers.remove(self)
+
+
+    def _collect(self):
+        while True:
+            with self._changed:
+                while not self._pending:
+                    self._changed.wait()
+                first = self._pending.popleft()
+                if first is _CLOSE:
+                    return
+
+                batch = [first]
+                deadline = time.monotonic() + self.max_wait
+                while True:
+                    while self._pending and self._pending[0] is not _CLOSE and len(batch) < self.max_batch_size:
+                        batch.append(self._pending.popleft())
+                    # full, closing or window over: go as soon as a worker is free, until then keep collecting
+                    ready = (len(batch) >= self.max_batch_size or bool(self._pending)
+                             or time.monotonic() >= deadline)
+                    if ready and self._free_workers:
+                        break
+                    self._changed.wait(None if ready else deadline - time.monotonic())
+
+                self._free_workers -= 1
+                self.items += len(batch)
+                self.batches += 1
+            self._executor.submit(self._run, batch)
+
+
+    def _run(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: batch function returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._changed:
+                self._free_workers += 1
+                self._changed.notify()
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": self.items,
+                    "batches": self.batches,
+                    "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                    "queued": len(self._pending)}
+
+
+
+def batching_stats() -> Dict[str, dict]:
+    """Stats of every batcher in this process, for /metrics."""
+    with _batchers_lock:
+        batchers = list(_batchers)
+    return {batcher.name: batcher.stats() for batcher in batchers}
+
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Groups `embed_query` calls of concurrent requests into one `embed_documents`
+    call of the wrapped embeddings (one HTTP request to the HF endpoint).
+    """
+
+    def __init__(self, embeddings: Embeddings, config: QueryBatchingConfig = None, name: str = "query-embeddings"):
+        config = config or QueryBatchingConfig()
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(self.embeddings.embed_documents,
+                                    max_batch_size=config.max_batch_size,
+                                    max_wait_ms=config.max_wait_ms,
+                                    num_workers=config.num_workers,
+                                    name=name)
+
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher(text)
+
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
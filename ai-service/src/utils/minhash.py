@@ -0,0 +1,132 @@
+import re
+import zlib
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_LOW_29 = np.uint64((1 << 29) - 1)
+
+
+def _mod61(x: np.ndarray) -> np.ndarray:
+    """x mod 2^61-1 for any uint64 x, using 2^61 = 1 (mod 2^61-1)."""
+    x = (x & _MERSENNE_PRIME) + (x >> np.uint64(61))
+    return np.where(x >= _MERSENNE_PRIME, x - _MERSENNE_PRIME, x)
+
+
+def _mulmod61(h: np.ndarray, a: np.ndarray) -> np.ndarray:
+    """
+    (h * a) mod 2^61-1 for h < 2^32 and a < 2^61 without overflowing uint64:
+    a is split into 32 bit halves so every partial product fits in 64 bits.
+    """
+    low = _mod61(np.outer(h, a & _MAX_HASH))                 # h * a_lo < 2^64
+    high = np.outer(h, a >> np.uint64(32))                   # h * a_hi < 2^61
+    # high * 2^32 = (high >> 29) * 2^61 + (high & (2^29-1)) * 2^32 = (high >> 29) + (high & (2^29-1)) << 32
+    high = ((high & _LOW_29) << np.uint64(32)) + (high >> np.uint64(29))
+    return _mod61(low + high)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial formatting differences compare equal."""
+    text = str(text).lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = 4) -> set:
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHashLSH:
+    """
+    MinHash signatures over character shingles with LSH banding.
+    Only rows that share at least one band are compared, so near duplicate
+    detection stays close to linear in the number of rows.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 4, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._optimal_bands(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+        self._b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+
+
+    @staticmethod
+    def _optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+        # the band/row split whose s-curve midpoint (1/b)^(1/r) sits closest below the
+        # threshold, erring on the side of more candidates since every pair is verified afterwards
+        best = (num_perm, 1)
+        for rows in range(1, num_perm + 1):
+            if num_perm % rows:
+                continue
+            bands = num_perm // rows
+            if (1.0 / bands) ** (1.0 / rows) <= threshold:
+                best = (bands, rows)
+        return best
+
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)], dtype=np.uint64)
+        # (a * h + b) mod p, done exactly: every term stays below 2^64
+        permuted = _mod61(_mulmod61(hashes, self._a) + self._b) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+    def clusters(self, texts: Iterable[str]) -> List[int]:
+        """
+        Return, for every text, the position of the first text in its near duplicate
+        cluster (itself when it has no earlier near duplicate).
+        """
+        signatures = [self.signature(t) for t in texts]
+        parent = list(range(len(signatures)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        for idx, sig in enumerate(signatures):
+            for band in range(self.bands):
+                key = (band, sig[band * self.rows:(band + 1) * self.rows].tobytes())
+                buckets.setdefault(key, []).append(idx)
+
+        def union(i: int, j: int):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                # keep the earliest row as the representative
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        checked = set()
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # each member is only compared with one member per cluster already seen in the bucket,
+            # so a bucket of n near identical listings costs n comparisons instead of n^2 / 2
+            representatives: Dict[int, int] = {}    # cluster root -> one bucket member of that cluster
+            for j in members:
+                for i in list(representatives.values()):
+                    if find(i) == find(j) or (i, j) in checked:
+                        continue
+                    checked.add((i, j))
+                    if np.mean(signatures[i] == signatures[j]) >= self.threshold:
+                        union(i, j)
+                # clusters j joined together keep a single representative
+                representatives = {find(i): i for i in representatives.values()}
+                representatives.setdefault(find(j), j)
+
+        return [find(i) for i in range(len(signatures))]
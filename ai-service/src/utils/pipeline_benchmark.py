@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import resource
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+# offline run: the index is built locally, nothing goes to Pinecone
+os.environ.setdefault("VECTOR_BACKEND", "local")
+
+from langchain_core.embeddings import Embeddings
+
+from src.components.data_cleaning import DataCleaner
+from src.components.vectorstore_builder import VectorStoreBuilder, VectorStoreBuilderConfig
+from src.components.ann_index import IVFQuantizedIndex
+from src.utils.synthetic_catalog import SyntheticCatalogConfig, write_catalog
+from src.utils.traffic_replay import percentile
+from src.utils.logger import logging
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline stand-in for the embedding endpoint: signed feature hashing of the
+    words into `dim` dimensions, L2 normalized. Products sharing words get
+    similar vectors, so the index sees clustered data instead of noise.
+    Its cost is not the endpoint's, only the pipeline around it is measured.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = zlib.crc32(word.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # no procfs: the lifetime peak is the best available figure (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+
+@contextmanager
+def measure(results: dict, interval: float = 0.01):
+    """Wall time and peak resident memory (sampled, above the level at entry) of the block."""
+    start_rss = peak = _rss_bytes()
+    stop = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not stop.wait(interval):
+            peak = max(peak, _rss_bytes())
+
+    sampler = threading.Thread(target=sample, name="benchmark-rss", daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        results["seconds"] = round(time.perf_counter() - started, 3)
+        stop.set()
+        sampler.join()
+        peak = max(peak, _rss_bytes())
+        results["peak_rss_mb"] = round((peak - start_rss) / 2 ** 20, 1)
+
+
+
+def run_scale(num_products: int, work_dir: str, stages: List[str], num_queries: int = 200,
+              embedding_batch_size: int = 256) -> Dict[str, dict]:
+    """Run the pipeline stages on a synthetic catalog of `num_products`, stopping at the first failure."""
+    data_dir = os.path.join(work_dir, "data")
+    cleaned_dir = os.path.join(work_dir, "cleaned")
+    merged_path = os.path.join(work_dir, "data_cleaned.csv")
+    catalog_dir = os.path.join(work_dir, "catalog")
+    index_dir = os.path.join(work_dir, "ann_index")
+
+    cleaner = DataCleaner()
+    embeddings = HashingEmbeddings()
+    report: Dict[str, dict] = {}
+    state = {}
+
+    def generate():
+        state["paths"] = write_catalog(data_dir, num_products)
+        return {"rows": num_products}
+
+    def clean():
+        rows = 0
+        for category, path in state["paths"].items():
+            rows += len(cleaner.clean_category(path, os.path.join(cleaned_dir, f"{category}.csv")))
+        return {"rows": rows}
+
+    def merge():
+        cleaned = [os.path.join(cleaned_dir, f"{category}.csv") for category in state["paths"]]
+        rows = len(cleaner.merge_categories(cleaned, merged_path, catalog_dir))
+        return {"rows": rows, "artifact_mb": round(os.path.getsize(merged_path) / 2 ** 20, 1)}
+
+    def load():
+        state["catalog"] = VectorStoreBuilder().load_data(merged_path)
+        return {"rows": len(state["catalog"]), "catalog_mb": round(state["catalog"].memory_bytes() / 2 ** 20, 1)}
+
+    def embed():
+        catalog = state["catalog"]
+        vectors = np.empty((len(catalog), embeddings.dim), dtype=np.float32)
+        for start in range(0, len(catalog), embedding_batch_size):
+            texts = catalog.texts(start, start + embedding_batch_size)
+            vectors[start:start + len(texts)] = embeddings.embed_array(texts)
+        state["vectors"] = vectors
+        return {"rows": len(vectors)}
+
+    def index():
+        built = IVFQuantizedIndex().build(state["vectors"])
+        built.save(index_dir)
+        state["index"] = IVFQuantizedIndex.load(index_dir)
+        return {"nlist": built.nlist, **{k: round(v / 2 ** 20, 1) for k, v in built.memory_bytes().items()}}
+
+    def query():
+        catalog, loaded = state["catalog"], state["index"]
+        rng = np.random.default_rng(SyntheticCatalogConfig.seed)
+        # questions made of product title words, like a shopper would type
+        titles = [next((line[len("Product Name: "):] for line in catalog.page_content(int(i)).split("\n")
+                        if line.startswith("Product Name: ")), "")
+                  for i in rng.integers(0, len(catalog), num_queries)]
+        queries = embeddings.embed_array([" ".join(title.split()[1:7]) for title in titles])
+
+        latencies = []
+        for q in queries:
+            started = time.perf_counter()
+            ids, _ = loaded.search(q, k=5)
+            catalog.documents(ids)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+        started = time.perf_counter()
+        loaded.search_batch(queries, k=5)
+        batch_ms = (time.perf_counter() - started) * 1000.0
+
+        recall = loaded.measure_recall(state["vectors"], k=5, num_queries=min(100, len(catalog)))
+        return {"p50_ms": round(percentile(latencies, 0.5), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "batched_ms_per_query": round(batch_ms / len(queries), 3),
+                "recall_at_5": recall["recall@5"]}
+
+    steps = {"generate": generate, "clean": clean, "merge": merge, "load": load,
+             "embed": embed, "index": index, "query": query}
+
+    for name in stages:
+        result = {}
+        try:
+            with measure(result):
+                result.update(steps[name]())
+            result["status"] = "ok"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)[:500]
+            logging.error(f"Benchmark stage {name} failed at {num_products} products: {str(e)}")
+        report[name] = result
+        print(f"{num_products:>10} {name:<9} {result.get('seconds', 0):>9.2f}s {result.get('peak_rss_mb', 0):>9.1f} MB  "
+              f"{json.dumps({k: v for k, v in result.items() if k not in ('seconds', 'peak_rss_mb', 'status')})}",
+              flush=True)
+        if result["status"] != "ok":
+            break
+    return report
+
+
+
+STAGES = ["generate", "clean", "merge", "load", "embed", "index", "query"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and measure the data pipeline on synthetic catalogs of growing size")
+    parser.add_argument("--scales", default="1000,10000,100000", help="comma separated product counts, e.g. 1000,100000,10000000")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--stage-budget", type=float, default=900.0,
+                        help="seconds; larger scales are skipped once a stage takes longer than this")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--work-dir", default=None, help="kept after the run when given")
+    parser.add_argument("--output", default=os.path.join("artifacts", "benchmarks", f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json"))
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    embedding_batch_size = VectorStoreBuilderConfig.embedding_batch_size
+    report = {"created": time.time(), "stage_budget_seconds": args.stage_budget, "scales": {}}
+
+    print(f"{'products':>10} {'stage':<9} {'time':>10} {'peak rss':>12}")
+    for scale in sorted(int(s) for s in args.scales.split(",")):
+        work_dir = os.path.join(args.work_dir, str(scale)) if args.work_dir else tempfile.mkdtemp(prefix=f"bench_{scale}_")
+        try:
+            results = run_scale(scale, work_dir, stages, args.queries, embedding_batch_size)
+        finally:
+            if not args.work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        report["scales"][str(scale)] = results
+
+        # a stage over budget (or failed) stops it, and everything after it, from scaling further
+        slow = [name for name, r in results.items() if r["status"] != "ok" or r["seconds"] > args.stage_budget]
+        if slow:
+            report["stopped_scaling"] = {"stage": slow[0], "products": scale}
+            print(f"Stage {slow[0]} did not scale past {scale} products, larger scales skipped")
+            break
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
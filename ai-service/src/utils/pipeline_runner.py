@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.utils.logger import logging
+
+try:
+    import fcntl
+except ImportError:  # windows, the local runner threads still share the in-process lock
+    fcntl = None
+
+
+def hash_paths(paths: Iterable[str]) -> str:
+    """
+    Content hash of files and directories (recursively). Missing paths hash
+    as missing, so a deleted output never looks up to date.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, os.path.dirname(path) or ".").encode("utf-8"))
+            if not os.path.exists(file_path):
+                digest.update(b"<missing>")
+                continue
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_params(params: Any) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Manifest of stage runs keyed by stage name: the hash of the inputs a stage
+    last ran on, the hash of what it produced and how long it took. Shared by
+    the local runner threads and by Airflow task processes on the same volume.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+    def get(self, stage: str) -> Optional[dict]:
+        with self._lock:
+            return self._read().get(stage)
+
+
+    def record(self, stage: str, entry: dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            # lock file serializes read-modify-write across processes (parallel mapped tasks)
+            with open(self.manifest_path + ".lock", "w") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                manifest = self._read()
+                manifest[stage] = entry
+                tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.manifest_path)
+
+
+    def durations(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: entry.get("duration_seconds", 0.0) for stage, entry in self._read().items()}
+
+
+
+def cached_stage(cache: StageCache, name: str, fn: Callable[[], Any], inputs: List[str], outputs: List[str],
+                 params: Any = None, force: bool = False) -> str:
+    """
+    Run `fn` unless the stage already ran on the same inputs and its outputs
+    are still what it produced. Returns "ran" or "skipped".
+    """
+    started = time.perf_counter()
+    input_hash = hash_params({"files": hash_paths(inputs), "params": params})
+
+    previous = cache.get(name)
+    if (not force and previous and previous.get("input_hash") == input_hash
+            and previous.get("output_hash") == hash_paths(outputs)):
+        logging.info(f"Stage {name}: inputs unchanged, skipped")
+        cache.record(name, {**previous, "status": "skipped",
+                            "checked_at": time.time(),
+                            "check_seconds": round(time.perf_counter() - started, 3)})
+        return "skipped"
+
+    logging.info(f"Stage {name}: running")
+    fn()
+    duration = round(time.perf_counter() - started, 3)
+
+    cache.record(name, {"status": "ran",
+                        "input_hash": input_hash,
+                        "output_hash": hash_paths(outputs),
+                        "duration_seconds": duration,
+                        "finished_at": time.time()})
+    logging.info(f"Stage {name}: finished in {duration}s")
+    return "ran"
+
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[[], Any]
+    upstream: List[str] = field(default_factory=list)
+
+
+
+class LocalDAGRunner:
+    """
+    Minimal in-process stand-in for the Airflow scheduler: runs tasks as soon
+    as their upstream tasks succeed, independent tasks in parallel threads.
+    A failed task marks everything downstream of it as upstream_failed.
+    """
+
+    def __init__(self, tasks: List[Task], max_workers: int = 4):
+        self.tasks = {task.name: task for task in tasks}
+        self.max_workers = max_workers
+
+        for task in tasks:
+            missing = [name for name in task.upstream if name not in self.tasks]
+            if missing:
+                raise ValueError(f"Task {task.name} depends on unknown tasks: {missing}")
+
+
+    def run(self) -> Dict[str, dict]:
+        results: Dict[str, dict] = {}
+        pending = dict(self.tasks)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                progressed = False
+                for name, task in list(pending.items()):
+                    states = [results.get(up, {}).get("state") for up in task.upstream]
+                    if any(state in ("failed", "upstream_failed") for state in states):
+                        results[name] = {"state": "upstream_failed", "seconds": 0.0}
+                    elif all(state == "success" for state in states):
+                        running[executor.submit(self._run_task, task)] = name
+                    else:
+                        continue
+                    del pending[name]
+                    progressed = True
+
+                if not running:
+                    if not progressed:
+                        raise ValueError(f"Dependency cycle between tasks: {sorted(pending)}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+        return results
+
+
+    @staticmethod
+    def _run_task(task: Task) -> dict:
+        started = time.perf_counter()
+        try:
+            outcome = task.fn()
+            return {"state": "success", "outcome": outcome, "seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            logging.error(f"Task {task.name} failed: {str(e)}")
+            return {"state": "failed", "error": str(e), "seconds": round(time.perf_counter() - started, 3)}
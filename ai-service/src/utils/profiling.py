@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from src.utils.logger import REQUEST_ID_PATTERN, logging
+
+
+@dataclass
+class ProfilingConfig:
+    # fraction of /chat requests profiled without being asked to, 0 disables sampling
+    sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    output_dir = os.getenv("PROFILE_DIR", os.path.join("artifacts", "profiles"))
+    max_profiles = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    max_depth = 128
+    # header trigger and /debug/profiles are only honoured with this token, unset means disabled
+    admin_token = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    trigger_header = "X-Profile"
+    token_header = "X-Admin-Token"
+
+
+_config = ProfilingConfig()
+
+# profiler of the request being handled, seen by the stage worker threads through copied contexts
+_active: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar("active_profiler", default=None)
+
+
+def is_admin(headers) -> bool:
+    return bool(_config.admin_token) and headers.get(_config.token_header) == _config.admin_token
+
+
+def should_profile(headers) -> bool:
+    if headers.get(_config.trigger_header) and is_admin(headers):
+        return True
+    return _config.sample_rate > 0 and random.random() < _config.sample_rate
+
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler: a background thread snapshots the stacks of
+    the followed threads every `interval_ms` with sys._current_frames(). The
+    profiled code is not instrumented, so the cost is the sampler thread only.
+    """
+
+    def __init__(self, name: str, interval_ms: float = 5.0, max_depth: int = 128):
+        self.name = name
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+        self.frames: List[dict] = []
+        self._frame_index: Dict[tuple, int] = {}
+        self.samples: Dict[str, List[List[int]]] = {}
+        self.weights: Dict[str, List[float]] = {}
+        self.started = self.stopped = None
+
+
+    def follow(self, thread_id: int, label: str):
+        with self._lock:
+            self._threads[thread_id] = label
+
+
+    def unfollow(self, thread_id: int):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+    def start(self):
+        self.follow(threading.get_ident(), "request")
+        self.started = time.perf_counter()
+        self._sampler.start()
+
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.stopped = time.perf_counter()
+
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed_ms, last = (now - last) * 1000.0, now
+
+            with self._lock:
+                threads = dict(self._threads)
+            frames = sys._current_frames()
+
+            for thread_id, label in threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(label, []).append(stack)
+                self.weights.setdefault(label, []).append(elapsed_ms)
+
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.stopped or time.perf_counter()) - self.started) * 1000.0
+
+
+    def to_speedscope(self) -> dict:
+        profiles = []
+        for label, samples in self.samples.items():
+            weights = self.weights[label]
+            profiles.append({"type": "sampled",
+                             "name": f"{self.name} [{label}]",
+                             "unit": "milliseconds",
+                             "startValue": 0,
+                             "endValue": sum(weights),
+                             "samples": samples,
+                             "weights": weights})
+
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": self.name,
+                "exporter": "ecommerce-chatbot profiler",
+                "activeProfileIndex": 0,
+                "shared": {"frames": self.frames},
+                "profiles": profiles}
+
+
+
+def follow_thread(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Wrap work handed to a pool thread so the active request profiler (if any)
+    samples that thread too. Costs one contextvar lookup when nothing is profiled.
+    """
+    profiler = _active.get()
+    if profiler is None:
+        return fn
+
+    def run():
+        thread_id = threading.get_ident()
+        profiler.follow(thread_id, threading.current_thread().name)
+        try:
+            return fn()
+        finally:
+            profiler.unfollow(thread_id)
+
+    return run
+
+
+@contextmanager
+def profile_request(request_id: str, enabled: bool, endpoint: str = "chat"):
+    """Profile the block when `enabled`, saving a speedscope file named after the request id."""
+    if not enabled:
+        yield None
+        return
+
+    profiler = SamplingProfiler(f"{endpoint} {request_id}", _config.interval_ms, _config.max_depth)
+    token = _active.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active.reset(token)
+        try:
+            path = save_profile(profiler, request_id, endpoint)
+            logging.info(f"Saved profile of request {request_id} ({profiler.duration_ms:.0f} ms) to {path}")
+        except Exception as e:
+            logging.error(f"Could not save profile of request {request_id}: {str(e)}")
+
+
+def save_profile(profiler: SamplingProfiler, request_id: str, endpoint: str) -> str:
+    # the id is part of the file name, it must not be able to point outside output_dir
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        raise ValueError(f"unsafe request id for a profile file name: {request_id!r}")
+
+    os.makedirs(_config.output_dir, exist_ok=True)
+    file_name = f"{time.strftime('%Y%m%d_%H%M%S')}_{endpoint}_{request_id}.speedscope.json"
+    path = os.path.join(_config.output_dir, file_name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profiler.to_speedscope(), f)
+
+    # keep only the newest profiles
+    for old in list_profiles()[_config.max_profiles:]:
+        try:
+            os.remove(os.path.join(_config.output_dir, old["file"]))
+        except FileNotFoundError:
+            pass  # pruned by another worker
+    return path
+
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(_config.output_dir):
+        return []
+
+    profiles = []
+    for file_name in os.listdir(_config.output_dir):
+        if not file_name.endswith(".speedscope.json"):
+            continue
+        try:
+            stat = os.stat(os.path.join(_config.output_dir, file_name))
+        except FileNotFoundError:
+            continue
+        profiles.append({"file": file_name,
+                         "request_id": file_name[:-len(".speedscope.json")].split("_", 3)[-1],
+                         "bytes": stat.st_size,
+                         "created": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+def profile_dir() -> str:
+    return os.path.abspath(_config.output_dir)
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # windows, coalescing stays within the worker
+    fcntl = None
+
+from src.utils.resilience import DeadlineExceeded
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class FileLockStore:
+    """
+    Cross-worker single flight through a local directory: one lock file per
+    key (flock) plus a result file that other workers reuse while it is
+    younger than the coalescing window.
+    """
+
+    def __init__(self, lock_dir: str, window: float, wait_timeout: float, poll_interval: float = 0.02):
+        self.lock_dir = lock_dir
+        self.window = window
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._writes = 0
+        os.makedirs(lock_dir, exist_ok=True)
+
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.lock_dir, digest + ".lock"), os.path.join(self.lock_dir, digest + ".json")
+
+
+    def _read_fresh(self, result_path: str) -> Optional[Any]:
+        try:
+            with open(result_path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - record["ts"] > self.window:
+            return None
+        return record["value"]
+
+
+    def _write(self, result_path: str, value: Any):
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "value": value}, f)
+        os.replace(tmp_path, result_path)
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+
+    def _prune(self):
+        cutoff = time.time() - max(60.0, 10 * self.window)
+        for name in os.listdir(self.lock_dir):
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+    def _acquire(self, lock_file, timeout: float) -> bool:
+        """Take the lock, return True when another worker held it (and may have produced a result)."""
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except BlockingIOError:
+            pass
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded("Timed out waiting for an identical in-flight request")
+                time.sleep(self.poll_interval)
+
+
+    def run(self, key: str, fn: Callable[[], Any], to_shared: Callable[[Any], Any],
+            timeout: Optional[float] = None, cacheable: Callable[[Any], bool] = lambda result: True) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared means the result came from another worker."""
+        lock_path, result_path = self._paths(key)
+
+        cached = self._read_fresh(result_path)
+        if cached is not None:
+            return cached, True
+
+        with open(lock_path, "a+") as lock_file:
+            waited = self._acquire(lock_file, self.wait_timeout if timeout is None else timeout)
+            try:
+                if waited:
+                    cached = self._read_fresh(result_path)
+                    if cached is not None:
+                        return cached, True
+
+                result = fn()
+                if cacheable(result):
+                    self._write(result_path, to_shared(result))
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: while a call for a key is in flight
+    (or finished less than `window` seconds ago) later callers receive its
+    result instead of running `fn` again. Within a worker callers wait on a
+    shared event, across workers on a FileLockStore. Results `cacheable`
+    rejects (e.g. degraded answers) only go to the callers already waiting,
+    they are not kept for the rest of the window.
+    """
+
+    def __init__(self, window: float = 2.0, wait_timeout: float = 60.0, lock_dir: Optional[str] = None,
+                 to_shared: Callable[[Any], Any] = lambda result: result,
+                 cacheable: Callable[[Any], bool] = lambda result: True):
+        self.window = window
+        self.wait_timeout = wait_timeout
+        self.to_shared = to_shared
+        self.cacheable = cacheable
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._recent = {}
+
+        self.store = None
+        if lock_dir and fcntl is not None:
+            self.store = FileLockStore(lock_dir, window, wait_timeout)
+
+        self.requests = 0
+        self.executed = 0
+        self.coalesced_local = 0
+        self.coalesced_cross_worker = 0
+
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn once per key across concurrent callers, waiting at most `timeout` seconds for a leader."""
+        wait_timeout = self.wait_timeout if timeout is None else max(timeout, 0.0)
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+
+            recent = self._recent.get(key)
+            if recent is not None and recent[0] > now:
+                self.coalesced_local += 1
+                return recent[1]
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            if not call.event.wait(wait_timeout):
+                raise DeadlineExceeded("Timed out waiting for an identical in-flight request")
+            if call.error is not None:
+                raise call.error
+            self._count("coalesced_local")
+            return call.result
+
+        try:
+            if self.store is not None:
+                call.result, shared = self.store.run(key, fn, self.to_shared, wait_timeout, self.cacheable)
+            else:
+                call.result, shared = fn(), False
+            self._count("coalesced_cross_worker" if shared else "executed")
+            return call.result
+
+        except Exception as e:
+            call.error = e
+            raise
+
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and self.cacheable(call.result):
+                    self._recent[key] = (time.monotonic() + self.window, call.result)
+                    # drop expired entries so the window cache stays small
+                    if len(self._recent) > 1024:
+                        now = time.monotonic()
+                        self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+            call.event.set()
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            coalesced = self.coalesced_local + self.coalesced_cross_worker
+            return {"requests": self.requests,
+                    "upstream_calls": self.executed,
+                    "coalesced_local": self.coalesced_local,
+                    "coalesced_cross_worker": self.coalesced_cross_worker,
+                    "coalescing_ratio": round(coalesced / self.requests, 4) if self.requests else 0.0}
+
+
+def default_lock_dir() -> str:
+    return os.getenv("COALESCE_LOCK_DIR", os.path.join(tempfile.gettempdir(), "chat_singleflight"))
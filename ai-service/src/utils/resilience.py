@@ -0,0 +1,206 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.utils.profiling import follow_thread
+from src.utils.logger import logging, record_stage
+
+
+@dataclass
+class DeadlineConfig:
+    # end to end budget of one /chat request and the share each stage may use of it
+    request_seconds = float(os.getenv("CHAT_DEADLINE_SECONDS", "20"))
+    embedding_seconds = float(os.getenv("EMBEDDING_BUDGET_SECONDS", "3"))
+    retrieval_seconds = float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "5"))
+    llm_seconds = float(os.getenv("LLM_BUDGET_SECONDS", "15"))
+
+    breaker_failure_threshold = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    breaker_reset_seconds = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+_stage_executor_threads = int(os.getenv("STAGE_EXECUTOR_THREADS", "32"))
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Set the deadline for everything called within the block (propagates through contextvars)."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def stage_timeout(budget: float) -> float:
+    """A stage gets its own budget, capped by whatever is left of the request deadline."""
+    left = remaining()
+    return budget if left is None else min(budget, left)
+
+
+class CircuitBreaker:
+    """
+    Per-upstream breaker: after `failure_threshold` consecutive failures calls
+    fail fast for `reset_seconds`, then a single trial call decides whether
+    to close again. Calls run on the breaker's own pool, so a hung upstream
+    only holds one of its threads, never the request thread, and a nested
+    stage (embeddings inside vectorstore) never waits on its parent's pool.
+    Errors raised by a nested stage are counted by that stage's breaker only.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._executor = ThreadPoolExecutor(max_workers=_stage_executor_threads, thread_name_prefix=f"upstream-{name}")
+
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial_running):
+                raise self._tag(CircuitOpen(f"{self.name} circuit is open"))
+            if state == "half_open":
+                self._trial_running = True
+
+
+    def record(self, success: bool):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logging.error(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+    def release_trial(self):
+        """Give back a half open trial that never reached the upstream, without a verdict."""
+        with self._lock:
+            self._trial_running = False
+
+
+    def _tag(self, error: Exception) -> Exception:
+        # the innermost stage an error came from; outer stages see it and leave it to that breaker
+        if getattr(error, "stage", None) is None:
+            try:
+                error.stage = self.name
+            except AttributeError:
+                pass
+        return error
+
+
+    def call(self, fn: Callable[[], Any], timeout: float, budget: Optional[float] = None) -> Any:
+        """
+        Run `fn` within `timeout`. `budget` is the stage's full budget: a timeout
+        cut shorter by the request deadline is the request running out of time,
+        not the upstream being slow, so it is not counted as a failure.
+        """
+        self.before_call()
+        if timeout <= 0:
+            self.release_trial()  # not the upstream's fault, do not count it
+            raise self._tag(DeadlineExceeded(f"No time left for {self.name}"))
+
+        future = self._executor.submit(contextvars.copy_context().run, follow_thread(fn))
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            if budget is not None and timeout < budget:
+                self.release_trial()
+            else:
+                self.record(success=False)
+            raise self._tag(DeadlineExceeded(f"{self.name} did not answer within {timeout:.2f}s"))
+        except Exception as e:
+            if getattr(e, "stage", self.name) != self.name:
+                self.release_trial()
+            else:
+                self.record(success=False)
+            raise self._tag(e)
+
+        self.record(success=True)
+        return result
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            config = DeadlineConfig()
+            _breakers[name] = CircuitBreaker(name, config.breaker_failure_threshold, config.breaker_reset_seconds)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def call_upstream(name: str, fn: Callable[[], Any], budget: float) -> Any:
+    started = time.perf_counter()
+    try:
+        return get_breaker(name).call(fn, stage_timeout(budget), budget)
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+
+class DeadlineEmbeddings(Embeddings):
+    """Embeddings wrapper that runs every call under the embedding budget and breaker."""
+
+    def __init__(self, embeddings: Embeddings, budget: float, name: str = "embeddings"):
+        self.embeddings = embeddings
+        self.budget = budget
+        self.name = name
+
+
+    def embed_query(self, text: str) -> List[float]:
+        return call_upstream(self.name, lambda: self.embeddings.embed_query(text), self.budget)
+
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # bulk embedding happens in the offline pipeline, no request deadline applies
+        return self.embeddings.embed_documents(texts)
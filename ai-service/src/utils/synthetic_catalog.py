@@ -0,0 +1,181 @@
+import os
+import sys
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.logger import logging
+
+
+# exactly what scraper.scrape_products writes
+SCRAPER_COLUMNS = ["Brand Name", "Product Name", "Rating", "Rating Count", "Selling Price", "MRP", "Offer"]
+
+
+@dataclass
+class SyntheticCatalogConfig:
+    seed = int(os.getenv("SYNTHETIC_SEED", "42"))
+    # share of rows with scraped "na" gaps (rating / price pairs go missing together, as on Amazon)
+    na_rate = float(os.getenv("SYNTHETIC_NA_RATE", "0.05"))
+    # share of rows repeating an earlier listing, half verbatim, half re-titled (sponsored repeats)
+    duplicate_rate = float(os.getenv("SYNTHETIC_DUPLICATE_RATE", "0.05"))
+    chunk_size = 100_000
+
+
+_VOCABULARY = {
+    "sarees": {
+        "brands": ["C J Enterprise", "SGF11", "Satrani", "Mimosa", "Sugathari", "Anni Designer", "Siril",
+                   "Yashika", "KANJIVARAM SILKS", "Janasya", "Leriya Fashion", "AKHILAM", "Kashvi Sarees"],
+        "parts": [["Women's"],
+                  ["Kanjivaram", "Banarasi", "Chiffon", "Georgette", "Cotton", "Linen", "Art Silk", "Soft Silk",
+                   "Organza", "Chanderi", "Tussar", "Net"],
+                  ["Saree", "Sari"],
+                  ["With Blouse Piece", "With Unstitched Blouse", "Without Blouse"],
+                  ["For Wedding", "For Party", "For Festive Wear", "For Daily Wear", "For Office", ""],
+                  ["Zari Border", "Printed", "Embroidered", "Woven Design", "Sequence Work", "Floral Print", ""]],
+        "mrp": (7.3, 0.6),
+    },
+    "shirts": {
+        "brands": ["Pinkmint", "Park Avenue", "Allen Solly", "Van Heusen", "Peter England", "Louis Philippe",
+                   "U.S. POLO ASSN.", "Amazon Brand - Symbol", "Dennis Lingo", "LEVI'S", "Raymond", "Arrow"],
+        "parts": [["Men's"],
+                  ["Regular Fit", "Slim Fit", "Relaxed Fit", "Oversized Fit"],
+                  ["Cotton", "Cotton Blend", "Linen", "Cotton Polyester Blend", "Denim", "Oxford"],
+                  ["Solid", "Checks Pattern", "Striped", "Printed", "Self Design", ""],
+                  ["Spread Collar", "Button Down Collar", "Mandarin Collar", "Cutaway Collar"],
+                  ["Full Sleeves", "Half Sleeves"],
+                  ["Formal Shirt", "Casual Shirt", "Party Wear Shirt"]],
+        "mrp": (7.2, 0.5),
+    },
+    "watches": {
+        "brands": ["Titan", "Casio", "Fastrack", "Sonata", "Fossil", "Timex", "Maxima", "Noise", "boAt",
+                   "Tommy Hilfiger", "Daniel Klein", "Armani Exchange"],
+        "parts": [["Karishma", "Vintage", "Neo", "Edge", "Classic", "Sport", "Workwear", "Raga", "Octane", ""],
+                  ["Analog", "Digital", "Analog-Digital", "Chronograph", "Smart"],
+                  ["Black", "Blue", "White", "Silver", "Grey", "Green", "Rose Gold", "Brown"],
+                  ["Dial"],
+                  ["Men's", "Women's", "Unisex"],
+                  ["Watch"],
+                  ["Metal Strap", "Leather Strap", "Silicone Strap", "Mesh Strap", ""]],
+        "mrp": (7.9, 0.7),
+    },
+}
+
+
+def _pick(rng: np.random.Generator, values: List[str], n: int, zipf: bool = False) -> np.ndarray:
+    values = np.asarray(values, dtype=object)
+    if not zipf:
+        return values[rng.integers(0, len(values), n)]
+    # a few brands dominate, like real listings
+    weights = 1.0 / np.arange(1, len(values) + 1)
+    return values[rng.choice(len(values), n, p=weights / weights.sum())]
+
+
+def _rupees(values: np.ndarray) -> List[str]:
+    return [f"₹{int(v):,}" for v in values]
+
+
+def generate_chunk(category: str, n: int, rng: np.random.Generator, config: SyntheticCatalogConfig = None) -> DataFrame:
+    """`n` products of `category` (sarees, shirts, watches or any name, using the shirts vocabulary)."""
+    config = config or SyntheticCatalogConfig()
+    vocabulary = _VOCABULARY.get(category, _VOCABULARY["shirts"])
+
+    # long tail of small sellers behind the well known brands
+    tail = [f"{category.title()[:4].upper()}{i:04d}" for i in range(200)]
+    brands = np.where(rng.random(n) < 0.7,
+                      _pick(rng, vocabulary["brands"], n, zipf=True),
+                      _pick(rng, tail, n))
+
+    names = [_pick(rng, part, n) for part in vocabulary["parts"]]
+    codes = [f"({chr(65 + a)}{chr(65 + b)}{c:05d})" for a, b, c in
+             zip(rng.integers(0, 26, n), rng.integers(0, 26, n), rng.integers(0, 100_000, n))]
+    product_names = [" ".join(word for word in words if word) for words in zip(*names, codes)]
+
+    mean, sigma = vocabulary["mrp"]
+    mrp = np.maximum(np.round(rng.lognormal(mean, sigma, n), -2) - 1, 149).astype(np.int64)
+    discount = np.clip(np.round(rng.beta(2, 2.5, n) * 90), 0, 90).astype(np.int64)
+    price = np.maximum((mrp * (100 - discount) / 100).astype(np.int64), 99)
+    discount = np.round((mrp - price) / mrp * 100).astype(np.int64)
+
+    rating = np.clip(np.round(rng.normal(4.0, 0.4, n), 1), 1.0, 5.0)
+    rating_count = np.maximum(rng.lognormal(5.5, 2.0, n).astype(np.int64), 1)
+
+    df = pd.DataFrame({"Brand Name": brands,
+                       "Product Name": product_names,
+                       "Rating": [f"{r:.1f} out of 5 stars" for r in rating],
+                       "Rating Count": [f"{c:,}" for c in rating_count],
+                       "Selling Price": _rupees(price),
+                       "MRP": _rupees(mrp),
+                       "Offer": [f"({d}% off)" for d in discount]})
+
+    # listings without a strike-through price have neither MRP nor offer
+    no_discount = discount <= 0
+    df.loc[no_discount, ["MRP", "Offer"]] = "na"
+
+    na = rng.random((n, 3)) < config.na_rate / 3
+    df.loc[na[:, 0], ["MRP", "Offer"]] = "na"
+    df.loc[na[:, 1], ["Rating", "Rating Count"]] = "na"
+    df.loc[na[:, 2], "Brand Name"] = "na"
+
+    # sponsored listings show up again later in the results
+    duplicates = np.flatnonzero(rng.random(n) < config.duplicate_rate)
+    duplicates = duplicates[duplicates > 0]
+    if len(duplicates):
+        sources = (rng.random(len(duplicates)) * duplicates).astype(np.int64)
+        df.iloc[duplicates] = df.iloc[sources].to_numpy()
+        retitled = duplicates[rng.random(len(duplicates)) < 0.5]
+        df.loc[retitled, "Product Name"] = df.loc[retitled, "Product Name"] + " " + \
+            _pick(rng, ["| Sponsored", "- Best Seller", "(Pack of 1)", "New Arrival"], len(retitled))
+
+    return df[SCRAPER_COLUMNS]
+
+
+def write_catalog(output_dir: str, num_products: int, categories: List[str] = None,
+                  config: SyntheticCatalogConfig = None) -> Dict[str, str]:
+    """
+    Write data_<category>.csv files with `num_products` rows in total, in
+    chunks so 10M products never sit in memory at once. Returns the paths.
+    """
+    config = config or SyntheticCatalogConfig()
+    categories = categories or list(_VOCABULARY)
+    rng = np.random.default_rng(config.seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = {}
+    per_category = np.full(len(categories), num_products // len(categories))
+    per_category[:num_products % len(categories)] += 1
+    for category, count in zip(categories, per_category):
+        path = os.path.join(output_dir, f"data_{category}.csv")
+        # at least one (possibly empty) chunk so the file always has its header
+        for start in range(0, max(int(count), 1), config.chunk_size):
+            n = int(min(config.chunk_size, count - start))
+            generate_chunk(category, n, rng, config).to_csv(path, mode="w" if start == 0 else "a",
+                                                            header=start == 0, index=False)
+        paths[category] = path
+        logging.info(f"Wrote {count} synthetic {category} products to {path}")
+    return paths
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog in the scraper's CSV schema")
+    parser.add_argument("output_dir")
+    parser.add_argument("--products", type=int, default=100_000, help="total over all categories")
+    parser.add_argument("--categories", default=",".join(_VOCABULARY))
+    parser.add_argument("--seed", type=int, default=SyntheticCatalogConfig.seed)
+    parser.add_argument("--na-rate", type=float, default=SyntheticCatalogConfig.na_rate)
+    parser.add_argument("--duplicate-rate", type=float, default=SyntheticCatalogConfig.duplicate_rate)
+    args = parser.parse_args()
+
+    config = SyntheticCatalogConfig()
+    config.seed, config.na_rate, config.duplicate_rate = args.seed, args.na_rate, args.duplicate_rate
+    for category, path in write_catalog(args.output_dir, args.products, args.categories.split(","), config).items():
+        print(f"{category:<10} {path}")
+
+
+if __name__ == "__main__":
+    main()
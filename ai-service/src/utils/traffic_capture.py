@@ -0,0 +1,161 @@
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import shutil
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from src.utils.logger import logging
+
+
+@dataclass
+class TrafficCaptureConfig:
+    enabled = os.getenv("TRAFFIC_CAPTURE", "false").lower() == "true"
+    output_dir = os.getenv("TRAFFIC_CAPTURE_DIR", os.path.join("artifacts", "traffic"))
+    # session ids are hashed with this salt, set it per deployment
+    salt = os.getenv("TRAFFIC_CAPTURE_SALT", "")
+    max_file_bytes = int(os.getenv("TRAFFIC_CAPTURE_FILE_BYTES", str(5 * 1024 * 1024)))
+    max_files = int(os.getenv("TRAFFIC_CAPTURE_MAX_FILES", "50"))
+    queue_size = 10000
+    max_question_chars = 1000
+
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\d[\d\s-]{8,}\d")
+_LONG_NUMBER = re.compile(r"\d{6,}")
+
+
+def anonymize_question(text: str, limit: int = 1000) -> str:
+    """Mask what could identify a user (emails, phone / order / card numbers), keep the shape of the question."""
+    text = _EMAIL.sub("<email>", str(text))
+    text = _PHONE.sub("<phone>", text)
+    text = _LONG_NUMBER.sub("<number>", text)
+    return text[:limit]
+
+
+def hash_session(session_id: str, salt: str = "") -> str:
+    return hashlib.sha256(f"{salt}{session_id}".encode("utf-8")).hexdigest()[:16]
+
+
+
+class TrafficRecorder:
+    """
+    Appends one JSON line per /chat request to artifacts/traffic/capture-*.jsonl.
+    Records go through a bounded queue to a writer thread, full files are
+    gzipped on rotation and the oldest gzipped ones deleted. Nothing here blocks or
+    fails the request; records are dropped when the writer falls behind.
+    """
+
+    def __init__(self, config: TrafficCaptureConfig = None):
+        self.config = config or TrafficCaptureConfig()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.config.queue_size)
+        self.recorded = 0
+        self.dropped = 0
+
+        self._file = None
+        self._path = None
+        self._sequence = 0
+        self._writer = threading.Thread(target=self._write, name="traffic-capture", daemon=True)
+        self._writer.start()
+
+
+    def record(self, session_id: str, question: str, status: int, duration_ms: float,
+               stage_timings: Optional[dict] = None, started: Optional[float] = None, **fields):
+        # ts is the arrival time (epoch seconds), replay schedules requests by it
+        if started is None:
+            started = time.time() - duration_ms / 1000.0
+        entry = {"ts": round(started, 3),
+                 "session": hash_session(session_id, self.config.salt),
+                 "question": anonymize_question(question, self.config.max_question_chars),
+                 "status": status,
+                 "duration_ms": duration_ms,
+                 "stages": stage_timings or {},
+                 **fields}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+
+    def _open(self):
+        os.makedirs(self.config.output_dir, exist_ok=True)
+        self._sequence += 1
+        self._path = os.path.join(self.config.output_dir,
+                                  f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}.jsonl")
+        self._file = open(self._path, "a", encoding="utf-8")
+
+
+    def _rotate(self):
+        self._file.close()
+        with open(self._path, "rb") as src, gzip.open(self._path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self._path)
+
+        # only rotated (closed) files are pruned, other workers may still be appending to their .jsonl
+        closed = [f for f in capture_files(self.config.output_dir) if f.endswith(".gz")]
+        for old in closed[:-self.config.max_files]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass  # pruned by another worker
+        self._open()
+
+
+    def _write(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+                self.recorded += 1
+                if self._queue.empty():
+                    self._file.flush()
+                if self._file.tell() >= self.config.max_file_bytes:
+                    self._rotate()
+            except Exception as e:
+                logging.error(f"Traffic capture write failed: {str(e)}")
+
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+
+def capture_files(path: str) -> List[str]:
+    """Capture files under `path` (a directory) or `path` itself, oldest first."""
+    if os.path.isfile(path):
+        return [path]
+    files = [os.path.join(path, f) for f in os.listdir(path)
+             if f.startswith("capture-") and (f.endswith(".jsonl") or f.endswith(".jsonl.gz"))]
+    # the open file (.jsonl) and its rotated predecessors (.jsonl.gz) sort by name, not suffix
+    return sorted(files, key=lambda f: f[:-3] if f.endswith(".gz") else f)
+
+
+def read_records(path: str) -> Iterator[dict]:
+    for file_path in capture_files(path):
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_traffic_recorder() -> Optional[TrafficRecorder]:
+    """The process wide recorder, None unless TRAFFIC_CAPTURE=true."""
+    global _recorder
+    if not TrafficCaptureConfig.enabled:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = TrafficRecorder()
+        return _recorder
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.utils.traffic_capture import read_records
+from src.utils.kafka_bridge import KafkaBridgeConfig, KafkaChatBridge, kafka_clients
+from src.utils.resilience import DeadlineExceeded
+
+
+class HttpTarget:
+    def __init__(self, url: str, timeout: float):
+        self.url = url.rstrip("/") + "/chat"
+        self.timeout = timeout
+
+
+    def send(self, session: str, question: str) -> int:
+        body = json.dumps({"input": question, "session_id": session}).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+    def close(self):
+        pass
+
+
+
+class KafkaTarget:
+    """Publishes to the chat_requests topic and waits for the reply with the same correlation id."""
+
+    def __init__(self, bootstrap_servers: str, request_topic: str, response_topic: str, timeout: float):
+        config = KafkaBridgeConfig()
+        config.bootstrap_servers = bootstrap_servers
+        config.request_topic = request_topic
+        config.response_topic = response_topic
+        config.timeout_seconds = timeout
+        self.bridge = KafkaChatBridge(*kafka_clients(config, response_topic), config)
+
+
+    def send(self, session: str, question: str) -> int:
+        try:
+            reply = self.bridge.ask(session, question)
+        except DeadlineExceeded:
+            return 504
+        return 500 if reply.get("error") else 200
+
+
+    def close(self):
+        self.bridge.close()
+
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low, high = int(position), min(int(position) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def replay(records: List[dict], target, speed: float = 1.0, concurrency: int = 256) -> dict:
+    """
+    Replay captured requests with their original spacing divided by `speed`.
+    Each session is played in order by one worker: a question is sent at its
+    scheduled time, or when the previous answer of the session arrives if later.
+    """
+    records = sorted(records, key=lambda r: r["ts"])
+    if not records:
+        return {"requests": 0}
+
+    sessions: Dict[str, List[dict]] = defaultdict(list)
+    for record in records:
+        sessions[record["session"]].append(record)
+
+    first_ts = records[0]["ts"]
+    results = []
+    results_lock = threading.Lock()
+    started = time.monotonic()
+
+    def play(session: str, session_records: List[dict]):
+        for record in session_records:
+            delay = started + (record["ts"] - first_ts) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.monotonic()
+            try:
+                status = target.send(f"replay-{session}", record["question"])
+            except Exception:
+                status = 0
+            latency = (time.monotonic() - sent) * 1000.0
+            with results_lock:
+                results.append({"status": status, "latency_ms": latency,
+                                "lag_ms": max(0.0, (sent - started) * 1000.0 - (record["ts"] - first_ts) * 1000.0 / speed)})
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(sessions))) as executor:
+        for session, session_records in sessions.items():
+            executor.submit(play, session, session_records)
+
+    wall = time.monotonic() - started
+    latencies = [r["latency_ms"] for r in results]
+    errors = [r for r in results if r["status"] != 200]
+    by_status: Dict[str, int] = defaultdict(int)
+    for r in results:
+        by_status[str(r["status"])] += 1
+
+    return {"requests": len(results),
+            "sessions": len(sessions),
+            "speed": speed,
+            "wall_seconds": round(wall, 2),
+            "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+            "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+            "status": dict(by_status),
+            "latency_ms": {name: round(percentile(latencies, q), 1)
+                           for name, q in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+            # how far behind schedule requests were sent, high values mean the replay itself saturated
+            "send_lag_ms_p99": round(percentile([r["lag_ms"] for r in results], 0.99), 1)}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /chat traffic against the service or Kafka")
+    parser.add_argument("capture", help="capture file or directory (artifacts/traffic)")
+    parser.add_argument("--target", default="http", choices=["http", "kafka"])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--bootstrap-servers", default=os.getenv("KAFKA_BROKER", "localhost:29092"))
+    parser.add_argument("--request-topic", default="chat_requests")
+    parser.add_argument("--response-topic", default="chat_responses")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 4 = four times faster")
+    parser.add_argument("--concurrency", type=int, default=256, help="sessions played at the same time")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--since", type=float, default=None, help="only records at or after this unix time")
+    parser.add_argument("--until", type=float, default=None, help="only records before this unix time")
+    args = parser.parse_args()
+
+    records = [r for r in read_records(args.capture)
+               if (args.since is None or r["ts"] >= args.since) and (args.until is None or r["ts"] < args.until)]
+
+    if args.target == "kafka":
+        target = KafkaTarget(args.bootstrap_servers, args.request_topic, args.response_topic, args.timeout)
+    else:
+        target = HttpTarget(args.url, args.timeout)
+
+    try:
+        report = replay(records, target, speed=args.speed, concurrency=args.concurrency)
+    finally:
+        target.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
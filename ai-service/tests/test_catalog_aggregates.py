@@ -0,0 +1,35 @@
+import pytest
+
+from src.components.catalog_aggregates import CatalogAggregates, CatalogAggregatesBuilder, CatalogAggregatesConfig
+
+
+@pytest.fixture(scope="module")
+def aggregates():
+    builder = CatalogAggregatesBuilder()
+    df = builder.load_data(CatalogAggregatesConfig.input_path)
+    return CatalogAggregates(builder.compute_aggregates(df, top_n=10))
+
+
+def test_builds_per_category_aggregates(aggregates):
+    assert {"all", "sarees", "shirts", "watches"} <= set(aggregates.aggregates)
+
+
+@pytest.mark.parametrize("question, title", [
+    ("What's the highest rated watch?", "Highest rated watches"),
+    ("cheapest saree", "Cheapest sarees"),
+    ("Which is the most expensive shirt you have?", "Most expensive shirts"),
+    ("what's your biggest discount", "Biggest discount on products"),
+])
+def test_answers_plain_superlatives(aggregates, question, title):
+    answer = aggregates.answer(question)
+    assert answer is not None and answer.startswith(title)
+
+
+@pytest.mark.parametrize("question", [
+    "cheapest Titan watch",
+    "cheapest silk saree under 500",
+    "what's the highest rated shirt or watch",
+    "show me some sarees",
+])
+def test_leaves_qualified_questions_to_the_llm(aggregates, question):
+    assert aggregates.answer(question) is None
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from src.utils import hot_reload
+from src.utils.hot_reload import ChainReloader, ReleaseConfig, publish_release
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    config = ReleaseConfig()
+    config.pointer_path = str(tmp_path / "release.json")
+    config.releases_dir = str(tmp_path / "releases")
+    config.keep_releases = 1
+    config.poll_seconds = 3600
+    (tmp_path / "router.json").write_text("{}")
+
+    # distinct versions without sleeping between publishes
+    versions = iter(f"20260101-0000{i:02d}" for i in range(100))
+    monkeypatch.setattr(hot_reload.time, "strftime", lambda _: next(versions))
+    return config
+
+
+@pytest.mark.skipif(hot_reload.fcntl is None, reason="release leases need flock")
+def test_release_is_kept_until_its_generation_drains(config, tmp_path):
+    artifacts = {"router": str(tmp_path / "router.json")}
+    first = publish_release(artifacts, config=config)
+    closed = []
+    reloader = ChainReloader(lambda release: (release["version"], lambda: closed.append(release["version"])), config)
+
+    with reloader.use() as version:
+        second = publish_release(artifacts, config=config)
+        assert reloader.reload()
+        third = publish_release(artifacts, config=config)
+        assert version == first["version"]
+        assert os.path.isdir(first["path"]) and os.path.isdir(second["path"])
+
+    assert closed == [first["version"]]
+    publish_release(artifacts, config=config)
+    reloader.stop()
+
+    # the drained release and the never served one are pruned, the live one stays
+    assert not os.path.exists(first["path"]) and not os.path.exists(third["path"])
+    assert os.path.isdir(second["path"])
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from src.utils.admission import Overloaded
+from src.utils.kafka_bridge import InMemoryBroker, KafkaBridgeConfig, KafkaChatBridge, serve_requests
+from src.utils.resilience import CircuitOpen, DeadlineExceeded
+
+
+def answer(session_id: str, question: str) -> dict:
+    errors = {"overloaded": Overloaded, "circuit": CircuitOpen, "slow": DeadlineExceeded, "broken": ValueError}
+    if question in errors:
+        raise errors[question](question)
+    return {"answer": question.upper()}
+
+
+@pytest.fixture
+def bridge():
+    config = KafkaBridgeConfig()
+    broker, stop = InMemoryBroker(), threading.Event()
+    bridge = KafkaChatBridge(broker.producer(), broker.consumer(config.response_topic), config)
+    worker = threading.Thread(target=serve_requests,
+                              args=(answer, broker.consumer(config.request_topic, group_id="workers"),
+                                    broker.producer(), config.response_topic, stop.is_set, 10))
+    worker.start()
+    yield bridge
+    stop.set()
+    worker.join()
+    bridge.close()
+
+
+@pytest.mark.parametrize("question, error_type", [
+    ("overloaded", "overloaded"),
+    ("circuit", "unavailable"),
+    ("slow", "deadline"),
+    ("broken", "internal"),
+])
+def test_errors_are_replied_with_their_type(bridge, question, error_type):
+    reply = bridge.ask("session", question, timeout=2)
+    assert reply["errorType"] == error_type and reply["error"] == question
+
+
+def test_answers_are_replied(bridge):
+    reply = bridge.ask("session", "hello", timeout=2)
+    assert reply["answer"] == "HELLO" and "error" not in reply
@@ -0,0 +1,37 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.micro_batching import MicroBatcher
+
+
+def test_concurrent_items_share_batches_and_keep_their_results():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=8, max_wait_ms=20)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(batcher, range(32)))
+    batcher.close()
+    assert results == [item * 2 for item in range(32)]
+    assert batcher.batches < 32
+
+
+def test_batch_keeps_growing_while_every_worker_is_busy():
+    release = threading.Event()
+    sizes = []
+
+    def slow(items):
+        sizes.append(len(items))
+        if len(sizes) == 1:
+            release.wait(1)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=32, max_wait_ms=1, num_workers=1)
+    first = batcher.submit("first")
+    time.sleep(0.05)
+    waiting = [batcher.submit(i) for i in range(5)]
+    time.sleep(0.05)
+    release.set()
+
+    assert first.result(1) == "first"
+    assert [future.result(1) for future in waiting] == list(range(5))
+    batcher.close()
+    assert sizes == [1, 5]
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from src.utils.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded
+
+
+def slow():
+    time.sleep(0.2)
+
+
+def test_timeout_within_full_budget_counts_as_failure():
+    breaker = CircuitBreaker("test-full", failure_threshold=1, reset_seconds=60)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(slow, timeout=0.01, budget=0.01)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: None, timeout=1)
+
+
+def test_timeout_capped_by_request_deadline_is_not_counted():
+    breaker = CircuitBreaker("test-capped", failure_threshold=1, reset_seconds=60)
+    with pytest.raises(DeadlineExceeded) as raised:
+        breaker.call(slow, timeout=0.01, budget=5)
+    assert raised.value.stage == "test-capped"
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.call(lambda: "ok", timeout=1) == "ok"
+
+
+def test_capped_timeout_gives_back_the_half_open_trial():
+    breaker = CircuitBreaker("test-trial", failure_threshold=1, reset_seconds=0.05)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(slow, timeout=0.01, budget=0.01)
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(slow, timeout=0.01, budget=5)
+    assert breaker.state == "half_open"
+    assert breaker.call(lambda: "ok", timeout=1) == "ok"
+    assert breaker.state == "closed"
@@ -20,7 +20,9 @@ for message in consumer:
 
     answer = f"AI Response for: {question}"
 
+    # the correlation id lets the AI service's request/reply bridge match the answer to its request
     result = {
+        "correlationId": data.get("correlationId"),
         "sessionId": session_id,
         "answer": answer
     }